@@ -0,0 +1,153 @@
+""" Documentation Swagger servie à la demande
+
+Flasgger (et ses dépendances yaml, jsonschema, mistune) n'est importé qu'à
+la première visite de /api/docs ou /apispec.json, et non à chaque démarrage
+de worker. Seul un blueprint Flask ordinaire, pointant sur les gabarits et
+fichiers statiques de Flasgger, est enregistré au démarrage.
+
+La spec elle-même (parcours de url_map et analyse YAML de chaque docstring)
+n'est compilée qu'une fois par processus, ou à la construction avec
+`flask build-apispec` : /apispec.json sert ensuite un blob JSON précalculé,
+compressé en gzip et muni d'un ETag.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from importlib.util import find_spec
+
+from flask import Blueprint, Response, current_app, request
+
+from swagger_config import swagger_config, swagger_template
+
+_lock = threading.Lock()
+_spec_lock = threading.Lock()
+
+
+class CompiledSpec:
+    """Spec OpenAPI sérialisée : corps JSON, version gzip et leurs ETag."""
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9)
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        # ETag fort : un par représentation (octets différents)
+        self.gzip_etag = f'{self.etag}-gzip'
+
+
+def _flasgger_ui_folder(name):
+    # find_spec localise le paquet sans l'importer
+    package_dir = find_spec('flasgger').submodule_search_locations[0]
+    return os.path.join(package_dir, 'ui3', name)
+
+
+def get_swagger(app):
+    """
+    Objet Flasgger de l'application, construit au premier appel. Il n'est
+    pas attaché via init_app : les vues sont déjà enregistrées ci-dessous.
+    """
+    swagger = app.extensions.get('swagger')
+    if swagger is None:
+        with _lock:
+            swagger = app.extensions.get('swagger')
+            if swagger is None:
+                from flasgger import Swagger
+                swagger = Swagger(config=dict(swagger_config),
+                                  template=swagger_template)
+                swagger.app = app
+                swagger.load_config(app)
+                app.swag = swagger
+                app.extensions['swagger'] = swagger
+    return swagger
+
+
+def _apidocs():
+    from flasgger.base import APIDocsView
+    view = APIDocsView.as_view(
+        'apidocs', view_args=dict(config=get_swagger(current_app).config))
+    return view()
+
+
+def _oauth_redirect():
+    from flasgger.base import OAuthRedirect
+    return OAuthRedirect.as_view('oauth_redirect')()
+
+
+def _prebuilt_path(app, endpoint):
+    directory = app.config.get('APISPEC_PREBUILT_DIR')
+    return os.path.join(directory, f'{endpoint}.json') if directory else None
+
+
+def build_spec(app, endpoint):
+    """Compile la spec via Flasgger et la sérialise (JSON de l'application)."""
+    spec = get_swagger(app).get_apispecs(endpoint=endpoint)
+    return app.json.dumps(spec).encode('utf-8')
+
+
+def get_compiled_spec(app, endpoint):
+    """
+    Spec de `endpoint`, compilée au premier appel puis gardée en mémoire.
+    Un fichier écrit par `flask build-apispec` dans APISPEC_PREBUILT_DIR est
+    utilisé tel quel : Flasgger n'est alors jamais importé.
+    """
+    specs = app.extensions.setdefault('apispec', {})
+    compiled = specs.get(endpoint)
+    if compiled is None:
+        with _spec_lock:
+            compiled = specs.get(endpoint)
+            if compiled is None:
+                path = _prebuilt_path(app, endpoint)
+                if path and os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                else:
+                    body = build_spec(app, endpoint)
+                compiled = specs[endpoint] = CompiledSpec(body)
+    return compiled
+
+
+def write_prebuilt_specs(app, directory):
+    """Écrit chaque spec dans `directory` ; renvoie les chemins écrits."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for spec in swagger_config['specs']:
+        path = os.path.join(directory, f"{spec['endpoint']}.json")
+        with open(path, 'wb') as f:
+            f.write(build_spec(app, spec['endpoint']))
+        paths.append(path)
+    return paths
+
+
+def _apispec(endpoint):
+    compiled = get_compiled_spec(current_app, endpoint)
+    gzipped = bool(request.accept_encodings['gzip'])
+    etag = compiled.gzip_etag if gzipped else compiled.etag
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif gzipped:
+        response = Response(compiled.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(compiled.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_api_docs(app):
+    """Enregistre les routes de la documentation (équivalent de Swagger(app))."""
+    blueprint = Blueprint(
+        'flasgger', __name__,
+        template_folder=_flasgger_ui_folder('templates'),
+        static_folder=_flasgger_ui_folder('static'),
+        static_url_path=swagger_config['static_url_path'])
+
+    blueprint.add_url_rule(swagger_config['specs_route'], 'apidocs', _apidocs)
+    blueprint.add_url_rule('/oauth2-redirect.html', 'oauth_redirect',
+                           _oauth_redirect)
+    for spec in swagger_config['specs']:
+        blueprint.add_url_rule(
+            spec['route'], spec['endpoint'], _apispec,
+            defaults={'endpoint': spec['endpoint']})
+    app.register_blueprint(blueprint)
@@ -1,14 +1,12 @@
-import os
-from werkzeug.security import generate_password_hash
+import json
+
 from flask.cli import with_appcontext
 import click
-from flask import Flask, request
-from flasgger import Swagger
-from swagger_config import swagger_template, swagger_config
+from flask import Flask, current_app, request
 from dotenv import load_dotenv
 
 # Import des extensions Flask
-from config import db, jwt, migrate, cors, bcrypt
+from config import db, jwt, cors, bcrypt
 
 # Import des modèles
 from models import User, Ebook, Category, Loan
@@ -20,8 +18,21 @@ from routes.route_category import category_bp
 from routes.route_loan import loan_bp
 
 # Import des utilitaires
+from api_docs import init_api_docs, write_prebuilt_specs
+from utils.search import install_search_index, rebuild_search_index
+from utils.synthetic_data import seed_synthetic
+from utils.http_cache import bump_catalog_version
+from utils.catalog_cache import init_catalog_cache
+from utils.auth import init_auth
+from utils.password_hasher import init_password_hasher
+from utils.metrics import init_metrics
+from utils.query_budget import init_query_budget
 from utils.check_expired_loans import check_and_notify
-from utils.email_service import send_email
+from utils.outbox import OutboxDispatcher, outbox_counts
+from utils.scheduler import init_scheduler, job_status
+from utils.engine_profiles import engine_options, init_engine_profiles
+from utils.db_routing import init_db_routing
+from utils.serializers import FastJSONProvider
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -30,22 +41,44 @@ load_dotenv()
 # =====================================================
 # Configuration de l'application Flask
 # =====================================================
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
+    # JSON des réponses : orjson si disponible, dates ISO 8601
+    app.json = FastJSONProvider(app)
     app.config.from_object('config.Config')
+    # Surcharges (tests, scripts) appliquées avant l'init des extensions
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    # Profil du moteur selon la base (pool PostgreSQL, pragmas SQLite)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 
     # Initialisation des extensions
     db.init_app(app)
+    init_engine_profiles(app)
+    init_db_routing(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate (et alembic) ne sert qu'aux commandes `flask db` :
+    # en démarrage rapide, il n'est chargé que sous la CLI
+    if not app.config['FAST_STARTUP'] or click.get_current_context(silent=True):
+        from flask_migrate import Migrate
+        Migrate(app, db)
     bcrypt.init_app(app)
+    init_catalog_cache(app)
+    init_auth(app)
+    init_password_hasher(app)
+    init_metrics(app)
+    init_query_budget(app)
+    init_scheduler(app)
 
     # Configuration CORS
     cors.init_app(app, resources={
         r"/api/*": {
             "origins": ["http://localhost:5173", "http://127.0.0.1:5173", "https://capstone-frontend-elib.vercel.app/"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-DB-Primary-Until"],
+            # épinglage au primaire répété par le client (utils/db_routing.py)
+            "expose_headers": ["X-DB-Primary-Until"],
             "supports_credentials": True
         }
     })
@@ -57,12 +90,13 @@ def create_app():
         if origin in ['http://localhost:5173', 'http://127.0.0.1:5173', 'https://capstone-frontend-elib.vercel.app']:
             response.headers['Access-Control-Allow-Origin'] = origin
             response.headers['Access-Control-Allow-Credentials'] = 'true'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-DB-Primary-Until'
+            response.headers['Access-Control-Expose-Headers'] = 'X-DB-Primary-Until'
             response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS, PATCH'
         return response
 
-    # Swagger (documentation API)
-    Swagger(app, config=swagger_config, template=swagger_template)
+    # Swagger (documentation API), Flasgger chargé à la première visite
+    init_api_docs(app)
 
     # Route de test (affiche toutes les routes disponibles)
     @app.route('/')
@@ -81,9 +115,14 @@ def create_app():
     app.register_blueprint(category_bp, url_prefix='/api')
     app.register_blueprint(loan_bp, url_prefix='/api')
 
-    # Création des tables si elles n'existent pas
-    with app.app_context():
-        db.create_all()
+    # Création des tables si elles n'existent pas. En production le schéma
+    # relève de `flask db upgrade` : AUTO_CREATE_SCHEMA=0 évite à chaque
+    # worker l'inspection de toutes les tables au démarrage.
+    if app.config['AUTO_CREATE_SCHEMA']:
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                install_search_index(connection)
 
     # Enregistrement des commandes CLI
     register_commands(app)
@@ -104,26 +143,180 @@ def create_admin(email, password):
         click.echo(f"L'utilisateur {email} existe déjà.")
         return
 
-    hashed_password = generate_password_hash(password)
-    admin = User(email=email, password=hashed_password, is_admin=True)
+    admin = User(username=email, email=email,
+                 password=User.hash_password(password), is_admin=True)
     db.session.add(admin)
     db.session.commit()
     click.echo(f"Administrateur créé avec succès : {email}")
 
 
+# =====================================================
+# Commande personnalisée : flask rebuild-search-index
+# =====================================================
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Reconstruire l'index plein texte des ebooks."""
+    with db.engine.begin() as connection:
+        install_search_index(connection)
+        rebuild_search_index(connection)
+    click.echo("Index de recherche reconstruit.")
+
+
+# =====================================================
+# Commande personnalisée : flask build-apispec
+# =====================================================
+@click.command('build-apispec')
+@with_appcontext
+@click.argument('directory', required=False)
+def build_apispec_command(directory):
+    """Précompiler la spec OpenAPI (à servir via APISPEC_PREBUILT_DIR)."""
+    directory = directory or current_app.config['APISPEC_PREBUILT_DIR'] or 'apispec'
+    for path in write_prebuilt_specs(current_app, directory):
+        click.echo(f"Spec écrite : {path}")
+
+
+# =====================================================
+# Commande personnalisée : flask seed-synthetic
+# =====================================================
+@click.command('seed-synthetic')
+@with_appcontext
+@click.option('--users', default=1000, show_default=True)
+@click.option('--ebooks', default=10000, show_default=True)
+@click.option('--categories', default=20, show_default=True)
+@click.option('--loans', default=50000, show_default=True)
+@click.option('--seed', default=42, show_default=True,
+              help='Même graine, mêmes données.')
+@click.option('--skew', default=0.9, show_default=True,
+              help='Exposant de Zipf (popularité des livres, activité des lecteurs).')
+@click.option('--open-fraction', default=0.1, show_default=True,
+              help='Part des prêts en cours.')
+@click.option('--overdue-fraction', default=0.3, show_default=True,
+              help='Part des prêts en cours qui sont en retard.')
+@click.option('--password', default='password', show_default=True,
+              help='Mot de passe commun aux utilisateurs (user 1 = admin).')
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--reset', is_flag=True, help='Vider la base avant le chargement.')
+def seed_synthetic_command(users, ebooks, categories, loans, seed, skew,
+                           open_fraction, overdue_fraction, password,
+                           batch_size, reset):
+    """Charger une bibliothèque synthétique (tests de capacité)."""
+    if reset:
+        db.drop_all()
+        db.create_all()
+    elif any(db.session.query(model.id).first()
+             for model in (User, Ebook, Category, Loan)):
+        raise click.UsageError("La base n'est pas vide (utiliser --reset).")
+    db.session.close()
+
+    def progress(name, count, seconds):
+        rate = count / seconds if seconds else 0
+        click.echo(f"{name:15s} {count:>12,d}  {seconds:8.1f} s  {rate:>12,.0f} /s")
+
+    password_hash = User.hash_password(password)
+    with db.engine.begin() as connection:
+        seed_synthetic(connection, users=users, ebooks=ebooks,
+                       categories=categories, loans=loans, seed=seed,
+                       skew=skew, open_fraction=open_fraction,
+                       overdue_fraction=overdue_fraction,
+                       password_hash=password_hash, batch_size=batch_size,
+                       progress=progress)
+    # Caches et ETag du catalogue invalidés
+    bump_catalog_version()
+    db.session.commit()
+    click.echo("Bibliothèque synthétique chargée.")
+
+
+# =====================================================
+# Commande personnalisée : flask send-reminders
+# =====================================================
+@click.command('send-reminders')
+@with_appcontext
+@click.option('--days', default=2, show_default=True,
+              help="Rappel pour les échéances dans N jours (et les retards).")
+def send_reminders_command(days):
+    """Enfiler les rappels d'échéance (un mail par utilisateur)."""
+    stats = check_and_notify(days_before_deadline=days)
+    click.echo(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+# =====================================================
+# Commande personnalisée : flask outbox-dispatch
+# =====================================================
+@click.command('outbox-dispatch')
+@with_appcontext
+@click.option('--once', is_flag=True,
+              help='Envoyer les messages dus puis s\'arrêter.')
+def outbox_dispatch_command(once):
+    """Envoyer les mails de l'outbox (boucle, Ctrl-C pour arrêter)."""
+    with OutboxDispatcher.from_config(current_app) as dispatcher:
+        try:
+            if once:
+                dispatcher.drain()
+            else:
+                dispatcher.run_forever(current_app.config['OUTBOX_POLL_INTERVAL'])
+        except KeyboardInterrupt:
+            pass
+        stats = dispatcher.stats()
+    stats['outbox'] = outbox_counts()
+    click.echo(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+# =====================================================
+# Commande personnalisée : flask scheduler
+# =====================================================
+@click.command('scheduler')
+@with_appcontext
+@click.option('--once', is_flag=True,
+              help='Lancer les tâches dues puis s\'arrêter.')
+@click.option('--status', is_flag=True,
+              help='Afficher l\'état des tâches (durée, retard) sans rien lancer.')
+def scheduler_command(once, status):
+    """Lancer les tâches périodiques (rappels, outbox) ; Ctrl-C pour arrêter."""
+    scheduler = current_app.extensions['scheduler']
+    if once:
+        ran = scheduler.run_pending()
+        click.echo(f"Tâches lancées : {', '.join(ran) or 'aucune'}")
+    elif not status:
+        try:
+            scheduler.run_forever(current_app._get_current_object(),
+                                  current_app.config['SCHEDULER_POLL_INTERVAL'])
+        except KeyboardInterrupt:
+            pass
+    click.echo(json.dumps(job_status(), indent=2, ensure_ascii=False))
+
+
 def register_commands(app):
     """Enregistre les commandes CLI personnalisées."""
     app.cli.add_command(create_admin)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(build_apispec_command)
+    app.cli.add_command(seed_synthetic_command)
+    app.cli.add_command(send_reminders_command)
+    app.cli.add_command(outbox_dispatch_command)
+    app.cli.add_command(scheduler_command)
 
 
 # =====================================================
 # Instance globale pour Gunicorn (Render, etc.)
 # =====================================================
-app = create_app()  # ✅ Permet à Render de lancer gunicorn app:app
+_app = None
+
+
+def __getattr__(name):
+    # ✅ `gunicorn app:app` et `flask` trouvent toujours app.app, mais
+    # l'instance n'est construite qu'au premier accès : importer create_app
+    # (tests, scripts) n'ouvre plus la base de production.
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # =====================================================
 # Lancement local
 # =====================================================
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
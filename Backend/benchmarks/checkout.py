@@ -0,0 +1,193 @@
+""" Emprunts concurrents : ancien emprunt contre les vraies routes
+
+Compare, sur une base partagée (SQLite fichier par défaut, ou
+--database-uri), deux façons d'emprunter --titles livres à --copies
+exemplaires chacun :
+
+  - naive : l'ancien emprunt « lire, vérifier en Python, décrémenter,
+    commit », exécuté directement sur la session ;
+  - handler : les routes elles-mêmes, par le client de test — POST
+    /api/loans (create_loan) puis, avec --returns, PUT /api/loans/<id>
+    (update_loan) : JWT, UPDATE conditionnel du stock et de
+    Ebook.stock_version, ligne de stock_shards, sérialisation de la réponse.
+
+    python benchmarks/checkout.py --threads 16 --attempts 2000 --copies 500
+    python benchmarks/checkout.py --titles 16 --returns
+
+Chaque thread enchaîne ses tentatives sur le livre `index % --titles`
+(--titles 1 : tous sur le même titre). Le rapport JSON donne, par
+stratégie, les emprunts accordés, les copies survendues (prêts en cours
+au-delà du stock), l'écart de stock, les erreurs (verrou, réponse
+inattendue), la version du catalogue après la course (les emprunts n'y
+écrivent plus) et le débit. Le débit de `handler` comprend tout le
+traitement HTTP : il se compare d'un réglage à l'autre, pas à `naive`.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def naive_worker(app, ebook_id, user, args):
+    # Version d'origine : la décision repose sur une lecture déjà périmée
+    from config import db
+    from models import Ebook, Loan
+
+    def attempt():
+        ebook = db.session.get(Ebook, ebook_id)
+        if ebook.available_copies < 1:
+            db.session.rollback()
+            return False
+        ebook.available_copies -= 1
+        db.session.add(Loan(user_id=user.id, ebook_id=ebook_id,
+                            loan_date=datetime.utcnow(),
+                            due_date=datetime.utcnow() + timedelta(days=14)))
+        db.session.commit()
+        return True
+
+    def run(attempts):
+        granted = errors = 0
+        with app.app_context():
+            for _ in range(attempts):
+                try:
+                    granted += attempt()
+                except Exception:
+                    # « database is locked », sérialisation PostgreSQL...
+                    db.session.rollback()
+                    errors += 1
+            db.session.remove()
+        return granted, errors
+    return run
+
+
+def handler_worker(app, ebook_id, user, args):
+    # Même chemin qu'un client : routes create_loan et update_loan
+    from utils.auth import create_user_token
+
+    with app.test_request_context():
+        headers = {'Authorization': f'Bearer {create_user_token(user)}'}
+    client = app.test_client()
+
+    def run(attempts):
+        granted = errors = 0
+        for _ in range(attempts):
+            response = client.post('/api/loans', json={'ebook_id': ebook_id},
+                                   headers=headers)
+            if response.status_code == 201:
+                granted += 1
+                if args.returns:
+                    loan_id = response.get_json()['loan']['id']
+                    response = client.put(f'/api/loans/{loan_id}', headers=headers)
+                    errors += response.status_code != 200
+            elif response.status_code != 400:
+                # 400 : plus d'exemplaire ; autre chose : verrou, erreur
+                errors += 1
+        return granted, errors
+    return run
+
+
+STRATEGIES = {'naive': naive_worker, 'handler': handler_worker}
+
+
+def run(app, strategy, args):
+    from sqlalchemy import func, select
+
+    from config import db
+    from models import CatalogState, Ebook, Loan, User
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'u{i}', email=f'u{i}@bench.test', password='x')
+                 for i in range(args.threads)]
+        books = [Ebook(title=f'Populaire {i}', author='Bench',
+                       total_copies=args.copies, available_copies=args.copies)
+                 for i in range(args.titles)]
+        db.session.add_all(users + books)
+        db.session.commit()
+        ebook_ids = [book.id for book in books]
+        runners = [STRATEGIES[strategy](app, ebook_ids[i % args.titles], user, args)
+                   for i, user in enumerate(users)]
+        db.session.remove()
+
+    per_thread = args.attempts // args.threads
+    results = [None] * args.threads
+    barrier = threading.Barrier(args.threads + 1)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = runners[index](per_thread)
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        open_loans = dict(db.session.execute(
+            select(Loan.ebook_id, func.count()).where(Loan.return_date.is_(None))
+            .group_by(Loan.ebook_id)).all())
+        remaining = dict(db.session.execute(
+            select(Ebook.id, Ebook.available_copies)).all())
+        catalog_version = db.session.scalar(select(CatalogState.version)) or 0
+        db.session.remove()
+    granted = sum(g for g, _ in results)
+    return {
+        'attempts': per_thread * args.threads,
+        'granted': granted,
+        'open_loans': sum(open_loans.values()),
+        'oversold': sum(max(0, open_loans.get(i, 0) - args.copies) for i in ebook_ids),
+        'stock_drift': sum((args.copies - open_loans.get(i, 0)) - remaining[i]
+                           for i in ebook_ids),
+        'errors': sum(e for _, e in results),
+        'catalog_version': catalog_version,
+        'seconds': round(elapsed, 3),
+        'checkouts_per_second': round(granted / elapsed, 1),
+        'attempts_per_second': round(per_thread * args.threads / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-uri')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=2000)
+    parser.add_argument('--copies', type=int, default=500)
+    parser.add_argument('--titles', type=int, default=1)
+    parser.add_argument('--returns', action='store_true',
+                        help='rendre chaque emprunt accordé (handler seulement)')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'checkout.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri,
+                          'AUTO_CREATE_SCHEMA': False,
+                          'METRICS_ENABLED': False})
+        report = {'database': uri.split(':', 1)[0], 'threads': args.threads,
+                  'titles': args.titles, 'copies': args.copies,
+                  'returns': args.returns}
+        for strategy in STRATEGIES:
+            report[strategy] = run(app, strategy, args)
+        with app.app_context():
+            from config import db
+            db.engine.dispose()
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
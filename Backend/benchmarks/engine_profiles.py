@@ -0,0 +1,195 @@
+""" Lectures et écritures concurrentes sur SQLite : profil par défaut contre WAL
+
+Charge une bibliothèque synthétique dans un fichier SQLite, copié pour
+chaque profil, puis fait tourner pendant --seconds secondes :
+
+  - --readers processus qui lisent les prêts d'un utilisateur (page de
+    GET /api/users/<id>/loans) et la fiche d'un livre ;
+  - --writers processus qui empruntent et rendent des livres (UPDATE
+    conditionnel du stock, INSERT / UPDATE du prêt, commit).
+
+Profils comparés :
+
+  - default : SQLITE_PRAGMAS vide (journal rollback, FULL, cache de 2 Mo) ;
+  - tuned : SQLITE_PRAGMAS de config.Config (WAL, busy_timeout,
+    synchronous=NORMAL, mmap, cache de 64 Mo).
+
+    python benchmarks/engine_profiles.py --readers 8 --writers 2 --seconds 10
+
+Le rapport JSON donne, par profil, les pragmas effectifs, le débit et les
+latences (p50 / p95 / p99, ms) des lectures et des écritures, et les
+erreurs « database is locked ».
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99),
+            'max': round(samples[-1] * 1000, 2)}
+
+
+def worker(kind, uri, pragmas, seed, user_ids, ebook_ids, barrier, seconds,
+           results):
+    # un processus par lecteur ou écrivain, comme des workers gunicorn :
+    # le GIL d'un seul processus masquerait le verrouillage de SQLite
+    from sqlalchemy import update
+
+    from app import create_app
+    from config import db
+    from models import Ebook, Loan
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SQLITE_PRAGMAS': pragmas,
+                      'AUTO_CREATE_SCHEMA': False, 'METRICS_ENABLED': False})
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+
+    def read():
+        (Loan.query.filter_by(user_id=rng.choice(user_ids))
+         .order_by(Loan.due_date, Loan.id).limit(20).all())
+        db.session.get(Ebook, rng.choice(ebook_ids))
+        db.session.rollback()
+
+    def write():
+        ebook_id, now = rng.choice(ebook_ids), datetime.utcnow()
+        reserved = db.session.execute(
+            update(Ebook)
+            .where(Ebook.id == ebook_id, Ebook.available_copies > 0)
+            .values(available_copies=Ebook.available_copies - 1)
+            .execution_options(synchronize_session=False)).rowcount
+        if reserved:
+            loan = Loan(user_id=rng.choice(user_ids), ebook_id=ebook_id,
+                        loan_date=now, due_date=now + timedelta(days=14))
+            db.session.add(loan)
+            db.session.flush()
+            loan.return_date, loan.is_returned = now, True
+            db.session.execute(
+                update(Ebook).where(Ebook.id == ebook_id)
+                .values(available_copies=Ebook.available_copies + 1)
+                .execution_options(synchronize_session=False))
+        db.session.commit()
+
+    operation = read if kind == 'read' else write
+    with app.app_context():
+        # connexion ouverte (pragmas appliqués) avant le départ commun
+        db.session.execute(db.select(Ebook.id).limit(1))
+        db.session.rollback()
+        barrier.wait()
+        stop_at = time.time() + seconds
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                operation()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                # « database is locked » au-delà de busy_timeout
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+        db.engine.dispose()
+    results.put((kind, latencies, errors))
+
+
+def run(uri, pragmas, args, user_ids, ebook_ids):
+    from app import create_app
+    from config import db
+    from utils.engine_profiles import sqlite_settings
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    kinds = ['read'] * args.readers + ['write'] * args.writers
+    barrier = context.Barrier(len(kinds))
+    processes = [context.Process(target=worker, args=(
+        kind, uri, pragmas, index, user_ids, ebook_ids, barrier, args.seconds,
+        results)) for index, kind in enumerate(kinds)]
+    for process in processes:
+        process.start()
+    latencies = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    for _ in processes:
+        kind, samples, failed = results.get()
+        latencies[kind] += samples
+        errors[kind] += failed
+    for process in processes:
+        process.join()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SQLITE_PRAGMAS': pragmas,
+                      'AUTO_CREATE_SCHEMA': False, 'METRICS_ENABLED': False})
+    with app.app_context():
+        report = {'pragmas': sqlite_settings(db.engine)}
+        db.engine.dispose()
+    for kind in ('read', 'write'):
+        report[kind] = {
+            'operations': len(latencies[kind]),
+            'per_second': round(len(latencies[kind]) / args.seconds, 1),
+            'errors': errors[kind],
+            'latency_ms': percentiles(latencies[kind]),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--ebooks', type=int, default=5000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    from app import create_app
+    from config import Config, db
+    from models import Ebook, User
+    from utils.synthetic_data import seed_synthetic
+
+    profiles = {'default': {}, 'tuned': Config.SQLITE_PRAGMAS}
+    overrides = {'AUTO_CREATE_SCHEMA': False, 'METRICS_ENABLED': False}
+    report = {'readers': args.readers, 'writers': args.writers,
+              'seconds': args.seconds}
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, 'seed.db')
+        app = create_app(dict(overrides, SQLALCHEMY_DATABASE_URI=f'sqlite:///{seeded}',
+                              SQLITE_PRAGMAS={}))
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed_synthetic(connection, users=args.users, ebooks=args.ebooks,
+                               loans=args.loans, seed=args.seed, password_hash='x')
+            user_ids = [i for i, in db.session.query(User.id)]
+            ebook_ids = [i for i, in db.session.query(Ebook.id)]
+            db.session.remove()
+            db.engine.dispose()
+
+        for name, pragmas in profiles.items():
+            path = os.path.join(tmp, f'{name}.db')
+            shutil.copyfile(seeded, path)
+            report[name] = run(f'sqlite:///{path}', pragmas, args,
+                               user_ids, ebook_ids)
+
+    report['read_speedup'] = round(report['tuned']['read']['per_second']
+                                   / max(report['default']['read']['per_second'], 0.1), 2)
+    report['write_speedup'] = round(report['tuned']['write']['per_second']
+                                    / max(report['default']['write']['per_second'], 0.1), 2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
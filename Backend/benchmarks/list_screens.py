@@ -0,0 +1,132 @@
+""" Écrans de liste : réponses complètes contre ?fields= et ?include=
+
+Charge une bibliothèque synthétique dans un fichier SQLite, puis rejoue
+par le client de test (sans cache du catalogue) deux écrans du frontend :
+
+  - loans : « Mes emprunts » de l'emprunteur le plus actif. Avant : la page
+    de ses prêts, puis toutes les pages de GET /api/ebooks pour retrouver
+    titre et auteur. Après : une seule requête
+    ?include=ebook&fields[ebook]=id,title,author ;
+  - catalog : une page de GET /api/ebooks (cartes du catalogue), complète
+    puis réduite à ?fields=id,title,author,available_copies.
+
+    python benchmarks/list_screens.py --ebooks 10000 --loans 50000
+
+Le rapport JSON donne, par écran et par variante, le nombre de requêtes
+HTTP et de requêtes SQL, les octets reçus et la durée (meilleur de
+--repeat essais).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def replay(client, urls, headers):
+    """Enchaîne les requêtes ; (url, True) suit next_cursor jusqu'à la fin."""
+    requests, size = 0, 0
+    for url, follow in urls:
+        page = url
+        while page:
+            response = client.get(page, headers=headers)
+            assert response.status_code == 200, (page, response.get_data())
+            requests += 1
+            size += len(response.get_data())
+            cursor = response.get_json().get('next_cursor')
+            page = follow and cursor and f'{url}&cursor={cursor}'
+    return requests, size
+
+
+def measure(app, client, urls, headers, repeat):
+    from sqlalchemy import event
+
+    from config import db
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+    timings = []
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            started = time.perf_counter()
+            requests, size = replay(client, urls, headers)
+            timings.append(time.perf_counter() - started)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return {'http_requests': requests, 'sql_queries': len(statements),
+            'bytes': size, 'best_ms': round(min(timings) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ebooks', type=int, default=10000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from sqlalchemy import func
+
+    from app import create_app
+    from config import db
+    from models import Loan, User
+    from utils.auth import create_user_token
+    from utils.synthetic_data import seed_synthetic
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            'METRICS_ENABLED': False, 'CATALOG_CACHE_ENABLED': False,
+            'QUERY_BUDGETS': {}})
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed_synthetic(connection, users=args.users, ebooks=args.ebooks,
+                               loans=args.loans, seed=args.seed, password_hash='x')
+            # l'emprunteur le plus actif : son écran est le plus chargé
+            user_id, count = (db.session.query(Loan.user_id, func.count())
+                              .group_by(Loan.user_id)
+                              .order_by(func.count().desc()).first())
+            with app.test_request_context():
+                token = create_user_token(db.session.get(User, user_id))
+            db.session.remove()
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        loans = f'/api/users/{user_id}/loans?limit=200'
+        screens = {
+            'loans': {
+                'before': [(loans, False), ('/api/ebooks?limit=200', True)],
+                'after': [(loans + '&include=ebook&fields[ebook]=id,title,author', False)],
+            },
+            'catalog': {
+                'before': [('/api/ebooks?limit=200', False)],
+                'after': [('/api/ebooks?limit=200&fields=id,title,author,available_copies',
+                           False)],
+            },
+        }
+        report = {'user_loans': count}
+        for screen, variants in screens.items():
+            report[screen] = {name: measure(app, client, urls, headers, args.repeat)
+                              for name, urls in variants.items()}
+            before, after = report[screen]['before'], report[screen]['after']
+            report[screen]['bytes_ratio'] = round(before['bytes'] / after['bytes'], 2)
+            report[screen]['speedup'] = round(before['best_ms'] / after['best_ms'], 2)
+        with app.app_context():
+            db.engine.dispose()
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+""" Listes de 10 000 lignes : entités ORM contre tuples de colonnes
+
+Charge --rows ebooks, utilisateurs et prêts dans une base SQLite en
+mémoire, puis mesure la lecture + sérialisation (dicts prêts pour jsonify)
+d'une liste complète par trois chemins :
+
+  - orm : Model.query.all() puis schema.dump_many (entités hydratées,
+    identity map, état d'instance) — ancien chemin des routes ;
+  - columns : schema.select() parcouru directement par dump_many
+    (tuples nommés, aucune entité) — chemin actuel ;
+  - columns_sparse : idem sans les grandes colonnes (Ebook.description),
+    comme une sélection ?fields= qui ne les demande pas.
+
+    python benchmarks/listings.py --rows 10000 --repeat 5
+
+Pour chaque chemin : meilleur temps sur --repeat essais (sans tracemalloc),
+puis, sous tracemalloc, pic mémoire et nombre / taille des allocations
+encore vivantes à la fin du chemin (session comprise).
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def measure(path, repeat):
+    from config import db
+
+    timings = []
+    for _ in range(repeat):
+        db.session.remove()
+        started = time.perf_counter()
+        path()
+        timings.append(time.perf_counter() - started)
+
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = path()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # allocations vivantes : dicts produits plus ce que la session retient
+    diff = after.compare_to(before, 'filename')
+    rows = len(result)
+    del result
+    return {
+        'best_ms': round(min(timings) * 1000, 2),
+        'rows_per_second': round(rows / min(timings)),
+        'peak_kib': round(peak / 1024),
+        'live_kib': round(sum(s.size_diff for s in diff) / 1024),
+        'live_blocks': sum(s.count_diff for s in diff),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from config import db
+    from models import Ebook, Loan, User
+    from schemas import ebook_schema, loan_schema, user_schema
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'METRICS_ENABLED': False, 'CATALOG_CACHE_ENABLED': False})
+    with app.app_context():
+        now = datetime(2026, 1, 31, 8, 0)
+        db.session.add_all(
+            User(id=i, username=f'lecteur{i}', email=f'lecteur{i}@example.test',
+                 password='x', created_at=now)
+            for i in range(1, args.rows + 1))
+        db.session.add_all(
+            Ebook(id=i, title=f'Titre {i}', author=f'Auteur {i % 500}',
+                  description='Résumé ' * 150, file_path=f'/books/{i}.pdf',
+                  total_copies=3, available_copies=i % 4,
+                  uploaded_at=now - timedelta(minutes=i))
+            for i in range(1, args.rows + 1))
+        db.session.add_all(
+            Loan(id=i, user_id=i, ebook_id=i, loan_date=now - timedelta(days=i % 30),
+                 due_date=now + timedelta(days=14 - i % 30),
+                 return_date=now if i % 3 == 0 else None, is_returned=i % 3 == 0)
+            for i in range(1, args.rows + 1))
+        db.session.commit()
+        db.session.remove()
+
+        sparse = [name for name in ebook_schema.fields if name != 'description']
+        cases = {
+            'ebooks': (Ebook, ebook_schema, sparse),
+            'users': (User, user_schema, None),
+            'loans': (Loan, loan_schema, None),
+        }
+        report = {'rows': args.rows}
+        for name, (model, schema, sparse_fields) in cases.items():
+            paths = {
+                'orm': lambda: schema.dump_many(model.query.all()),
+                'columns': lambda: schema.dump_many(schema.select()),
+            }
+            if sparse_fields:
+                paths['columns_sparse'] = lambda: schema.dump_many(
+                    schema.select(sparse_fields), fields=sparse_fields)
+            report[name] = {path: measure(func, args.repeat)
+                            for path, func in paths.items()}
+            orm, columns = report[name]['orm'], report[name]['columns']
+            report[name]['speedup'] = round(orm['best_ms'] / columns['best_ms'], 2)
+            report[name]['peak_ratio'] = round(orm['peak_kib'] / max(columns['peak_kib'], 1), 2)
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
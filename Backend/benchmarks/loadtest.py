@@ -0,0 +1,357 @@
+""" Test de charge local, reproductible
+
+Démarre l'application sous gunicorn contre une base SQLite (fichier
+temporaire) ou PostgreSQL locale, y charge une bibliothèque synthétique
+de taille configurable, puis rejoue à débit cible un mélange de trafic :
+navigation du catalogue, recherche, emprunt, retour et connexion.
+
+    python benchmarks/loadtest.py --ebooks 1000000 --users 200000 \\
+        --loans 5000000 --rate 200 --duration 60 --output run.json
+
+Le générateur est en boucle ouverte : les requêtes sont planifiées à
+intervalles réguliers et la latence est mesurée depuis l'instant prévu,
+si bien qu'un serveur saturé ne ralentit pas la cadence mesurée
+(pas d'« omission coordonnée »). Le rapport JSON donne, par type de
+requête, le débit et les latences p50 / p95 / p99 en millisecondes.
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.synthetic_data import WORDS, synthetic_email  # noqa: E402
+
+PASSWORD = 'loadtest'
+DEFAULT_MIX = 'browse=40,detail=15,search=20,checkout=10,return=8,login=7'
+
+
+# =====================================================
+# Jeu de données
+# =====================================================
+def prepare_database(uri, args):
+    """Bibliothèque synthétique déterministe (utils/synthetic_data.py)."""
+    from app import create_app
+    from config import db
+    from models import User
+    from utils.synthetic_data import seed_synthetic
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri,
+                      'AUTO_CREATE_SCHEMA': False,
+                      'BCRYPT_LOG_ROUNDS': args.bcrypt_rounds})
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            seed_synthetic(connection, users=args.users, ebooks=args.ebooks,
+                           loans=args.loans, seed=args.seed,
+                           password_hash=User.hash_password(PASSWORD))
+    return time.perf_counter() - started
+
+
+# =====================================================
+# Serveur
+# =====================================================
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(uri, port, args):
+    env = dict(os.environ, database_uri=uri, fast_startup='1',
+               bcrypt_log_rounds=str(args.bcrypt_rounds))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers),
+         '--threads', str(args.threads), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'app:app'],
+        cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/ebooks?limit=1')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn ne répond pas')
+
+
+# =====================================================
+# Génération de trafic
+# =====================================================
+class Client:
+    """Connexion HTTP persistante d'un thread du générateur."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port,
+                                                       timeout=30)
+            try:
+                self.conn.request(method, path, payload, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    return 0, b''
+
+
+class Workload:
+    """Choix et exécution des opérations du mélange de trafic."""
+
+    def __init__(self, args, tokens):
+        self.args = args
+        self.tokens = tokens        # [(user_id, token)]
+        self.open_loans = {}        # user_id -> [loan_id] créés pendant le test
+        self.lock = threading.Lock()
+
+    def run(self, client, rng, op):
+        """Exécute `op` ; renvoie (libellé, statut)."""
+        args = self.args
+        if op == 'browse':
+            # Première page ou page suivante, comme un défilement
+            status, data = client.request('GET', '/api/ebooks?limit=20')
+            if status == 200 and rng.random() < 0.5:
+                cursor = json.loads(data).get('next_cursor')
+                if cursor:
+                    status, _ = client.request(
+                        'GET', f'/api/ebooks?limit=20&cursor={cursor}')
+            return op, status
+        if op == 'detail':
+            return op, client.request(
+                'GET', f'/api/ebooks/{rng.randint(1, args.ebooks)}')[0]
+        if op == 'search':
+            return op, client.request(
+                'GET', f'/api/ebooks/search?q={rng.choice(WORDS)}')[0]
+        if op == 'login':
+            user_id = rng.randint(1, args.users)
+            return op, client.request('POST', '/api/login', {
+                'email': synthetic_email(user_id), 'password': PASSWORD})[0]
+
+        user_id, token = rng.choice(self.tokens)
+        if op == 'return':
+            with self.lock:
+                loans = self.open_loans.get(user_id)
+                loan_id = loans.pop() if loans else None
+            if loan_id is not None:
+                return op, client.request(
+                    'PUT', f'/api/loans/{loan_id}', token=token)[0]
+            op = 'checkout'     # rien à rendre : on emprunte
+        status, data = client.request(
+            'POST', '/api/loans', {'ebook_id': rng.randint(1, args.ebooks)},
+            token=token)
+        if status == 201:
+            with self.lock:
+                self.open_loans.setdefault(user_id, []).append(
+                    json.loads(data)['loan']['id'])
+        return op, status
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {'browse', 'detail', 'search', 'checkout', 'return',
+                          'login'}
+    if unknown:
+        raise SystemExit(f'opérations inconnues : {", ".join(sorted(unknown))}')
+    return mix
+
+
+def login_pool(port, users, size, rng):
+    client = Client(port)
+    tokens = []
+    for user_id in rng.sample(range(1, users + 1), min(size, users)):
+        status, data = client.request('POST', '/api/login', {
+            'email': synthetic_email(user_id), 'password': PASSWORD})
+        if status == 200:
+            tokens.append((user_id, json.loads(data)['access_token']))
+    if not tokens:
+        raise RuntimeError('connexion impossible des utilisateurs de test')
+    return tokens
+
+
+def run_load(port, args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    workload = Workload(args, login_pool(port, args.users, args.sessions, rng))
+
+    total = int(args.rate * args.duration)
+    schedule = queue.Queue()
+    results = []                # (op, statut, latence en s)
+    results_lock = threading.Lock()
+
+    def worker(index):
+        client = Client(port)
+        local_rng = random.Random(f'{args.seed}-{index}')
+        local = []
+        while True:
+            item = schedule.get()
+            if item is None:
+                break
+            planned, op = item
+            delay = planned - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            label, status = workload.run(client, local_rng, op)
+            local.append((label, status, time.perf_counter() - planned))
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True)
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    interval = 1.0 / args.rate
+    for i, op in enumerate(rng.choices(ops, weights, k=total)):
+        schedule.put((started + i * interval, op))
+    for _ in threads:
+        schedule.put(None)
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+# =====================================================
+# Rapport
+# =====================================================
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1,
+                       int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s[2] * 1000 for s in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status, _ in samples if status == 0 or status >= 500)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'status': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'p50': _round(percentile(latencies, 50)),
+            'p95': _round(percentile(latencies, 95)),
+            'p99': _round(percentile(latencies, 99)),
+            'max': _round(latencies[-1] if latencies else None),
+            'mean': _round(sum(latencies) / len(latencies) if latencies else None),
+        },
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def build_report(args, uri, results, elapsed, seed_seconds):
+    by_op = {}
+    for sample in results:
+        by_op.setdefault(sample[0], []).append(sample)
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'revision': revision,
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'config': {
+            'database': uri.split(':', 1)[0],
+            'ebooks': args.ebooks, 'users': args.users, 'loans': args.loans,
+            'rate': args.rate, 'duration': args.duration, 'mix': args.mix,
+            'workers': args.workers, 'threads': args.threads,
+            'concurrency': args.concurrency, 'seed': args.seed,
+            'bcrypt_rounds': args.bcrypt_rounds,
+        },
+        'seed_seconds': None if seed_seconds is None else round(seed_seconds, 2),
+        'elapsed_seconds': round(elapsed, 2),
+        'total': summarize(results, elapsed),
+        'endpoints': {op: summarize(samples, elapsed)
+                      for op, samples in sorted(by_op.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-uri',
+                        help='base PostgreSQL locale (défaut : SQLite temporaire)')
+    parser.add_argument('--reuse', action='store_true',
+                        help='ne pas recharger la base (déjà préparée)')
+    parser.add_argument('--ebooks', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate', type=float, default=100,
+                        help='requêtes par seconde visées')
+    parser.add_argument('--duration', type=float, default=30, help='secondes')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='workers gunicorn')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='threads par worker gunicorn')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='connexions simultanées du générateur')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12,
+                        help='coût bcrypt (les connexions dominent sinon)')
+    parser.add_argument('--sessions', type=int, default=50,
+                        help='utilisateurs connectés pour emprunter / rendre')
+    parser.add_argument('--output', help='fichier JSON (défaut : stdout)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        seed_seconds = None if args.reuse else prepare_database(uri, args)
+        port = _free_port()
+        server = start_gunicorn(uri, port, args)
+        try:
+            results, elapsed = run_load(port, args)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = build_report(args, uri, results, elapsed, seed_seconds)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+""" Tournée des rappels d'échéance contre un relais SMTP local
+
+Charge une bibliothèque synthétique dont une partie des prêts est en
+retard, démarre un relais SMTP local (utils/smtp_sink.py) qui simule la
+latence d'un vrai relais, puis compare :
+
+  - legacy : un mail par prêt, connexion + login à chaque message, en
+    séquence (ancien check_and_notify), mesuré sur --legacy-sample prêts
+    et extrapolé à la tournée complète ;
+  - pooled : check_and_notify enfile un récapitulatif par utilisateur
+    dans l'outbox, puis le dispatcher les envoie par --workers threads sur
+    autant de connexions réutilisées ;
+  - next_day : tournée incrémentale du lendemain (journal loan_reminders).
+
+    python benchmarks/reminders.py --loans 200000 --users 20000 \\
+        --handshake-ms 40 --message-ms 15
+
+Le rapport JSON donne le nombre de prêts concernés, les mails envoyés et,
+pour chaque mode, la durée, le débit et les latences d'envoi.
+"""
+import argparse
+import json
+import os
+import smtplib
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def legacy_run(sink, rows):
+    from utils.email_service import build_message
+
+    started = time.perf_counter()
+    for email, title in rows:
+        msg = build_message([email], f"Rappel : retour du livre '{title}'", title)
+        with smtplib.SMTP(sink.host, sink.port) as server:
+            server.login('elib', 'secret')
+            server.sendmail('elib@example.test', [email], msg.as_string())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-uri')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--ebooks', type=int, default=5000)
+    parser.add_argument('--loans', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--handshake-ms', type=float, default=40.0,
+                        help='Latence simulée de la connexion et du login.')
+    parser.add_argument('--message-ms', type=float, default=15.0,
+                        help='Latence simulée de chaque message.')
+    parser.add_argument('--legacy-sample', type=int, default=100)
+    args = parser.parse_args()
+
+    from app import create_app
+    from config import db
+    from models import Ebook, Loan, User
+    from utils.check_expired_loans import check_and_notify
+    from utils.email_service import SMTPConnectionPool
+    from utils.outbox import OutboxDispatcher
+    from utils.smtp_sink import SMTPSink
+    from utils.synthetic_data import seed_synthetic
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'reminders.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri,
+                          'AUTO_CREATE_SCHEMA': False,
+                          'METRICS_ENABLED': False})
+        report = {'database': uri.split(':', 1)[0]}
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                # la moitié des prêts est en cours, tous en retard
+                seed_synthetic(connection, users=args.users, ebooks=args.ebooks,
+                               loans=args.loans, seed=args.seed,
+                               open_fraction=0.5, overdue_fraction=1.0,
+                               password_hash='x')
+            report['seed_seconds'] = round(time.perf_counter() - started, 1)
+
+            due = (db.session.query(User.email, Ebook.title)
+                   .join(Loan, Loan.user_id == User.id)
+                   .join(Ebook, Ebook.id == Loan.ebook_id)
+                   .filter(Loan.return_date.is_(None)))
+            report['due_loans'] = due.count()
+            sample = due.limit(args.legacy_sample).all()
+
+            delays = dict(handshake_delay=args.handshake_ms / 1000,
+                          message_delay=args.message_ms / 1000)
+            with SMTPSink(**delays) as sink:
+                seconds = legacy_run(sink, sample)
+            rate = len(sample) / seconds
+            report['legacy'] = {
+                'sample': len(sample),
+                'messages_per_second': round(rate, 1),
+                'projected_seconds': round(report['due_loans'] / rate, 1),
+            }
+
+            started = time.perf_counter()
+            report['enqueue'] = check_and_notify(args.days)
+            report['enqueue']['seconds'] = round(time.perf_counter() - started, 3)
+
+            with SMTPSink(**delays) as sink:
+                pool = SMTPConnectionPool(sink.host, sink.port, username='elib',
+                                          password='secret', use_tls=False,
+                                          size=args.workers)
+                with OutboxDispatcher(pool, batch_size=args.batch_size,
+                                      workers=args.workers) as dispatcher:
+                    pooled = dispatcher.drain()
+            pooled.pop('errors')
+            report['pooled'] = pooled
+            report['speedup'] = round(report['legacy']['projected_seconds']
+                                      / pooled['seconds'], 1)
+
+            # tournée du lendemain : seuls les seuils franchis depuis la
+            # précédente sont lus, les rappels déjà envoyés sont au journal
+            started = time.perf_counter()
+            report['next_day'] = check_and_notify(
+                args.days, now=datetime.utcnow() + timedelta(days=1))
+            report['next_day']['seconds'] = round(time.perf_counter() - started, 3)
+            db.session.remove()
+            db.engine.dispose()
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
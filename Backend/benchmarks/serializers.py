@@ -0,0 +1,134 @@
+""" Sérialisation des listes de 10 000 lignes : avant / après les schémas compilés
+
+Charge --rows ebooks et prêts (objets ORM, base SQLite en mémoire), puis
+mesure, hors requête SQL, la sérialisation d'une liste complète :
+
+  - before : dict construit champ par champ dans la route, puis jsonify
+    avec le DefaultJSONProvider de Flask (json, clés triées, dates RFC 822) ;
+  - after : schemas.py (fonction compilée) puis FastJSONProvider (orjson
+    s'il est installé, dates ISO 8601) ;
+  - after_sparse : idem avec ?fields=id,title (ou id,due_date).
+
+    python benchmarks/serializers.py --rows 10000 --repeat 7
+
+Le rapport JSON donne, par modèle et par variante, le meilleur temps sur
+--repeat essais pour construire les dicts (build), les encoder (encode) et
+au total, ainsi que le débit en lignes par seconde.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def legacy_ebook(ebook):
+    # ancienne construction de routes_ebook.get_ebooks
+    return {
+        'id': ebook.id,
+        'title': ebook.title,
+        'author': ebook.author,
+        'description': ebook.description,
+        'file_path': ebook.file_path,
+        'total_copies': ebook.total_copies,
+        'available_copies': ebook.available_copies,
+        'uploaded_at': ebook.uploaded_at
+    }
+
+
+def legacy_loan(loan):
+    # ancienne construction de route_loan._loan_listing
+    return {
+        'id': loan.id,
+        'user_id': loan.user_id,
+        'ebook_id': loan.ebook_id,
+        'loan_date': loan.loan_date,
+        'due_date': loan.due_date,
+        'return_date': loan.return_date,
+        'is_returned': loan.is_returned
+    }
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def measure(rows, build, provider, repeat, key):
+    build_seconds, payload = best_of(repeat, lambda: {key: build(rows)})
+    encode_seconds, body = best_of(
+        repeat, lambda: provider.response(payload).get_data())
+    total = build_seconds + encode_seconds
+    return {
+        'build_ms': round(build_seconds * 1000, 2),
+        'encode_ms': round(encode_seconds * 1000, 2),
+        'total_ms': round(total * 1000, 2),
+        'rows_per_second': round(len(rows) / total),
+        'bytes': len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+
+    from app import create_app
+    from config import db
+    from models import Ebook, Loan, User
+    from schemas import ebook_schema, loan_schema
+    from utils import serializers
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'METRICS_ENABLED': False, 'CATALOG_CACHE_ENABLED': False})
+    with app.app_context():
+        now = datetime(2026, 1, 31, 8, 0)
+        db.session.add(User(id=1, username='bench', email='bench@example.test',
+                            password='x'))
+        db.session.add_all(
+            Ebook(id=i, title=f'Titre {i}', author=f'Auteur {i % 500}',
+                  description='Résumé ' * 20, file_path=f'/books/{i}.pdf',
+                  total_copies=3, available_copies=i % 4,
+                  uploaded_at=now - timedelta(minutes=i))
+            for i in range(1, args.rows + 1))
+        db.session.add_all(
+            Loan(id=i, user_id=1, ebook_id=i, loan_date=now - timedelta(days=i % 30),
+                 due_date=now + timedelta(days=14 - i % 30),
+                 return_date=now if i % 3 == 0 else None, is_returned=i % 3 == 0)
+            for i in range(1, args.rows + 1))
+        db.session.commit()
+        ebooks, loans = Ebook.query.all(), Loan.query.all()
+
+        before, after = DefaultJSONProvider(app), app.json
+        report = {'rows': args.rows, 'orjson': serializers.orjson is not None}
+        for name, rows, legacy, schema, sparse, key in (
+                ('ebooks', ebooks, legacy_ebook, ebook_schema, ['id', 'title'], 'ebooks'),
+                ('loans', loans, legacy_loan, loan_schema, ['id', 'due_date'], 'loans')):
+            report[name] = {
+                'before': measure(rows, lambda objs: [legacy(o) for o in objs],
+                                  before, args.repeat, key),
+                'after': measure(rows, schema.dump_many, after, args.repeat, key),
+                'after_sparse': measure(
+                    rows, lambda objs: schema.dump_many(objs, fields=sparse),
+                    after, args.repeat, key),
+            }
+            report[name]['speedup'] = round(report[name]['before']['total_ms']
+                                            / report[name]['after']['total_ms'], 2)
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
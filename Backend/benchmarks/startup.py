@@ -0,0 +1,83 @@
+""" Mesure du démarrage à froid d'un worker
+
+Chaque mesure tourne dans un interpréteur neuf (comme un worker gunicorn
+qui démarre) : temps d'import du module app, de create_app(), puis latence
+de la première requête sur le catalogue et sur la documentation Swagger.
+Les modes « défaut » et « rapide » (fast_startup=1) sont comparés sur une
+même base SQLite temporaire dont le schéma est créé au préalable.
+
+    python benchmarks/startup.py [--runs 5]
+
+Le résultat (médianes, en millisecondes) est écrit en JSON sur stdout.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans le processus enfant
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+client = app.test_client()
+status = client.get('/api/ebooks').status_code
+t3 = time.perf_counter()
+docs_status = client.get('/apispec.json').status_code
+t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'first_apispec_ms': (t4 - t3) * 1000,
+    'ready_ms': (t3 - t0) * 1000,
+    'status': [status, docs_status],
+}))
+"""
+
+MODES = {
+    'default': {'fast_startup': '0'},
+    'fast': {'fast_startup': '1'},
+}
+
+
+def _probe(env):
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ, database_uri=f"sqlite:///{tmp}/bench.db")
+        # Schéma créé une fois, comme après un `flask db upgrade`
+        _probe(dict(base_env, fast_startup='0'))
+
+        report = {'runs': args.runs, 'modes': {}}
+        for mode, extra in MODES.items():
+            samples = [_probe(dict(base_env, **extra))
+                       for _ in range(args.runs)]
+            report['modes'][mode] = {
+                key: round(statistics.median(s[key] for s in samples), 2)
+                for key in samples[0] if key.endswith('_ms')}
+            report['modes'][mode]['status'] = samples[-1]['status']
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,105 @@
 import os
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 
+from utils.db_routing import RoutingSession
+
 
 class Config:
     SECRET_KEY = os.getenv('secret_key', 'supersecret')
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'database_uri', 'sqlite:///bibliotheque.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Répliques en lecture (utils/db_routing.py) : binds servant les GET,
+    # une URI par réplique dans replica_database_uris (séparées par des
+    # virgules). Après une écriture, son auteur lit sur le primaire pendant
+    # REPLICA_PIN_SECONDS (retard de réplication toléré)
+    SQLALCHEMY_BINDS = {
+        f'replica_{i}': uri.strip() for i, uri in enumerate(
+            filter(None, os.getenv('replica_database_uris', '').split(',')), 1)}
+    REPLICA_BINDS = None  # None : toutes les clés 'replica*' des binds
+    REPLICA_PIN_SECONDS = float(os.getenv('replica_pin_seconds', '5'))
+    # Profils du moteur par base (utils/engine_profiles.py), sauf si
+    # SQLALCHEMY_ENGINE_OPTIONS est fourni explicitement.
+    # SQLite : pragmas appliqués à chaque connexion. WAL : les lectures ne
+    # sont plus bloquées par les écritures (prêts, retours) ; NORMAL reste
+    # sûr en WAL (seul le dernier commit peut être perdu en cas de coupure)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': int(os.getenv('sqlite_busy_timeout', '5000')),  # ms
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.getenv('sqlite_mmap_size', str(256 * 1024 ** 2))),
+        'cache_size': -int(os.getenv('sqlite_cache_kib', '65536')),  # KiB
+    }
+    # PostgreSQL : un pool par processus gunicorn, dimensionné sur ses
+    # threads (gunicorn.conf.py lit les mêmes variables), le total des
+    # workers restant sous DB_MAX_CONNECTIONS (part du serveur réservée à
+    # l'application)
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '2'))
+    GUNICORN_THREADS = int(os.getenv('gunicorn_threads', '4'))
+    DB_MAX_CONNECTIONS = int(os.getenv('db_max_connections', '40'))
+    DB_POOL_TIMEOUT = float(os.getenv('db_pool_timeout', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('db_pool_recycle', '1800'))
     JWT_SECRET_KEY = os.getenv('jwt_secret_key', 'jwtsecret')
+    # Délai max (s) avant qu'un worker voie la révocation d'un token
+    TOKEN_VERSION_CACHE_TTL = int(os.getenv('token_version_cache_ttl', '30'))
+    # bcrypt : facteur de coût (re-hachage à la connexion s'il change) et
+    # pool dédié borné pour ne pas bloquer les autres requêtes
+    BCRYPT_LOG_ROUNDS = int(os.getenv('bcrypt_log_rounds', '12'))
+    PASSWORD_HASH_CONCURRENCY = int(os.getenv('password_hash_concurrency', '2'))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('password_hash_queue_size', '16'))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('password_hash_queue_timeout', '5'))
+    # Démarrage rapide des workers : Flask-Migrate chargé seulement sous la
+    # CLI, et pas de db.create_all() (schéma géré par les migrations)
+    FAST_STARTUP = os.getenv('fast_startup', '0') == '1'
+    AUTO_CREATE_SCHEMA = os.getenv(
+        'auto_create_schema', '0' if FAST_STARTUP else '1') == '1'
+    # Middleware de mesure (latences, SQL, pool) et route /metrics
+    METRICS_ENABLED = os.getenv('metrics_enabled', '1') == '1'
+    # Dev / tests : journal SQL par requête, détection des N+1 (forme de
+    # requête répétée QUERY_N1_THRESHOLD fois) et budgets par endpoint,
+    # ex. {'loan_bp.update_loan': 6}
+    QUERY_DEBUG = os.getenv('query_debug', '0') == '1'
+    QUERY_N1_THRESHOLD = int(os.getenv('query_n1_threshold', '2'))
+    QUERY_BUDGETS = {}
+    QUERY_BUDGET_DEFAULT = None
+    # Spec OpenAPI précompilée (`flask build-apispec`) ; vide = compilée à
+    # la première requête sur /apispec.json
+    APISPEC_PREBUILT_DIR = os.getenv('apispec_prebuilt_dir', '')
     UPLOAD_FOLDER = 'static/uploads'
+    # Cache en mémoire des lectures du catalogue (par processus). Le TTL
+    # borne le retard sur les écritures et emprunts des autres workers
+    CATALOG_CACHE_ENABLED = os.getenv('catalog_cache_enabled', '1') == '1'
+    CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('catalog_cache_max_entries', '1024'))
+    CATALOG_CACHE_TTL = int(os.getenv('catalog_cache_ttl', '10'))
+    # Import en masse : lignes par transaction, erreurs détaillées au plus
+    IMPORT_BATCH_SIZE = int(os.getenv('import_batch_size', '1000'))
+    IMPORT_MAX_ERRORS = int(os.getenv('import_max_errors', '1000'))
+    # Outbox des mails (utils/outbox.py) : taille des lots, envois
+    # simultanés (= connexions SMTP), reprises à backoff exponentiel
+    # (base, plafond en secondes) avant l'état dead, bail d'un lot réservé
+    OUTBOX_BATCH_SIZE = int(os.getenv('outbox_batch_size', '100'))
+    OUTBOX_WORKERS = int(os.getenv('outbox_workers', '8'))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('outbox_max_attempts', '8'))
+    OUTBOX_BACKOFF_BASE = float(os.getenv('outbox_backoff_base', '30'))
+    OUTBOX_BACKOFF_MAX = float(os.getenv('outbox_backoff_max', '21600'))
+    OUTBOX_LEASE_SECONDS = float(os.getenv('outbox_lease_seconds', '300'))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('outbox_poll_interval', '5'))
+    # Tâches périodiques (utils/scheduler.py) : boucle dans chaque worker
+    # gunicorn si activée (sinon `flask scheduler`), jamais dans les
+    # commandes CLI ; une seule instance par tâche et par intervalle grâce
+    # aux baux de la table job_leases
+    SCHEDULER_ENABLED = os.getenv('scheduler_enabled', '0') == '1'
+    SCHEDULER_POLL_INTERVAL = float(os.getenv('scheduler_poll_interval', '5'))
+    SCHEDULER_LEASE_SECONDS = float(os.getenv('scheduler_lease_seconds', '600'))
+    REMINDER_INTERVAL = float(os.getenv('reminder_interval', '3600'))
+    REMINDER_DAYS_BEFORE = int(os.getenv('reminder_days_before', '2'))
 
 
-db = SQLAlchemy()
+# Les SELECT des requêtes en lecture peuvent partir sur une réplique
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
-migrate = Migrate()
 cors = CORS()
 bcrypt = Bcrypt()
@@ -0,0 +1,19 @@
+# Configuration gunicorn (Procfile : `gunicorn -c gunicorn.conf.py app:app`).
+# Mêmes variables que config.Config : le pool PostgreSQL de chaque worker
+# est dimensionné sur ces valeurs (utils/engine_profiles.py).
+import os
+
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Workers à threads : bcrypt (utils/password_hasher.py) et les E/S base
+# relâchent le GIL, les autres requêtes du worker continuent d'être servies
+# et le pool de hachage borne réellement les calculs simultanés
+worker_class = 'gthread'
+threads = int(os.getenv('gunicorn_threads', '4'))
+
+
+def post_worker_init(worker):
+    # Tâches périodiques (SCHEDULER_ENABLED) : le thread part dans chaque
+    # worker, une fois l'app chargée, jamais depuis create_app (commandes
+    # CLI, tests, processus maître avec --preload)
+    from utils.scheduler import start_scheduler
+    start_scheduler(worker.wsgi)
@@ -0,0 +1,93 @@
+"""initial schema
+
+Schéma d'origine, tel que créé jusqu'ici par db.create_all(). Les tables
+déjà présentes sont laissées telles quelles, si bien qu'une base existante
+peut être mise sous migrations avec un simple `flask db upgrade`.
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table):
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _missing('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=100), nullable=False),
+            sa.Column('email', sa.String(length=100), nullable=False),
+            sa.Column('password', sa.String(length=200), nullable=False),
+            sa.Column('is_admin', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('username'),
+        )
+    if _missing('ebooks'):
+        op.create_table(
+            'ebooks',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=40), nullable=True),
+            sa.Column('author', sa.String(length=70), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('cover_image', sa.String(length=200), nullable=True),
+            sa.Column('file_path', sa.String(length=200), nullable=True),
+            sa.Column('total_copies', sa.Integer(), nullable=True),
+            sa.Column('available_copies', sa.Integer(), nullable=True),
+            sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if _missing('categories'):
+        op.create_table(
+            'categories',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name'),
+        )
+    if _missing('ebook_category'):
+        op.create_table(
+            'ebook_category',
+            sa.Column('ebook_id', sa.Integer(), nullable=True),
+            sa.Column('category_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+            sa.ForeignKeyConstraint(['ebook_id'], ['ebooks.id']),
+        )
+    if _missing('loans'):
+        op.create_table(
+            'loans',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('ebook_id', sa.Integer(), nullable=False),
+            sa.Column('loan_date', sa.DateTime(), nullable=True),
+            sa.Column('due_date', sa.DateTime(), nullable=False),
+            sa.Column('return_date', sa.DateTime(), nullable=True),
+            sa.Column('is_returned', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['ebook_id'], ['ebooks.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('loans')
+    op.drop_table('ebook_category')
+    op.drop_table('categories')
+    op.drop_table('ebooks')
+    op.drop_table('users')
@@ -0,0 +1,44 @@
+"""indexes for paginated loan listings
+
+Index des listes de prêts filtrées et paginées (GET /api/loans,
+GET /api/users/<id>/loans) :
+  - tri et filtres par échéance (?sort=due_date, ?due_before/?due_after,
+    ?status=returned) sur l'ensemble des prêts ;
+  - tri par date d'emprunt (?sort=-loan_date, tableaux de bord admin) ;
+  - prêts d'un utilisateur par échéance (?status=overdue).
+La dernière colonne est l'id, pour la pagination par curseur.
+
+Revision ID: 5b8e2f6a1c47
+Revises: d27a9e0f4c81
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f6a1c47'
+down_revision = 'd27a9e0f4c81'
+branch_labels = None
+depends_on = None
+
+
+def _create_index(name, table, columns, **kw):
+    # index éventuellement déjà créé par db.create_all()
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name not in existing:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade():
+    _create_index('ix_loans_due_date_id', 'loans', ['due_date', 'id'])
+    _create_index('ix_loans_loan_date_id', 'loans', ['loan_date', 'id'])
+    _create_index('ix_loans_user_id_due_date_id', 'loans',
+                  ['user_id', 'due_date', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_loans_user_id_due_date_id', table_name='loans')
+    op.drop_index('ix_loans_loan_date_id', table_name='loans')
+    op.drop_index('ix_loans_due_date_id', table_name='loans')
@@ -0,0 +1,46 @@
+"""job leases
+
+Table job_leases : une ligne par tâche périodique (utils/scheduler.py),
+avec le bail de l'instance qui l'exécute, la prochaine échéance, le point
+de reprise JSON et la durée / le retard de la dernière exécution.
+
+Revision ID: 7d2b4e9f1a06
+Revises: a3f5d8e1c962
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2b4e9f1a06'
+down_revision = 'a3f5d8e1c962'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # table éventuellement déjà créée par db.create_all()
+    if sa.inspect(op.get_bind()).has_table('job_leases'):
+        return
+    op.create_table(
+        'job_leases',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('owner', sa.String(length=100), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('next_run_at', sa.DateTime(), nullable=False),
+        sa.Column('checkpoint', sa.Text(), nullable=True),
+        sa.Column('runs', sa.Integer(), nullable=False),
+        sa.Column('failures', sa.Integer(), nullable=False),
+        sa.Column('last_started_at', sa.DateTime(), nullable=True),
+        sa.Column('last_success_at', sa.DateTime(), nullable=True),
+        sa.Column('last_duration', sa.Float(), nullable=True),
+        sa.Column('last_lag', sa.Float(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade():
+    op.drop_table('job_leases')
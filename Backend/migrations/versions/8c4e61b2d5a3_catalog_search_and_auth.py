@@ -0,0 +1,66 @@
+"""catalog version, full-text search, token version
+
+Rattrape les ajouts faits au modèle : pagination par curseur des ebooks,
+index plein texte, table catalog_state (ETag) et users.token_version
+(révocation des tokens).
+
+Revision ID: 8c4e61b2d5a3
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.search import (POSTGRES_DROP_DDL, SQLITE_DROP_DDL,
+                          install_search_index)
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e61b2d5a3'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+# Comme pour la révision initiale, les objets déjà créés par
+# db.create_all() sont conservés.
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # La pagination par curseur suppose une date de mise en ligne
+    op.execute("UPDATE ebooks SET uploaded_at = CURRENT_TIMESTAMP "
+               "WHERE uploaded_at IS NULL")
+    if 'ix_ebooks_uploaded_at_id' not in {
+            i['name'] for i in inspector.get_indexes('ebooks')}:
+        op.create_index('ix_ebooks_uploaded_at_id', 'ebooks',
+                        ['uploaded_at', 'id'])
+
+    if not inspector.has_table('catalog_state'):
+        op.create_table(
+            'catalog_state',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'token_version' not in {
+            c['name'] for c in inspector.get_columns('users')}:
+        op.add_column('users', sa.Column('token_version', sa.Integer(),
+                                         nullable=False, server_default='0'))
+
+    install_search_index(op.get_bind())
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    drop_ddl = {'sqlite': SQLITE_DROP_DDL,
+                'postgresql': POSTGRES_DROP_DDL}.get(dialect, [])
+    for statement in drop_ddl:
+        op.execute(statement)
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
+    op.drop_table('catalog_state')
+    op.drop_index('ix_ebooks_uploaded_at_id', table_name='ebooks')
@@ -0,0 +1,43 @@
+"""loan reminder ledger
+
+Table loan_reminders : (prêt, type de rappel, date d'envoi), un rappel de
+chaque type au plus par prêt. check_and_notify ne sélectionne plus que
+les prêts ayant franchi un seuil depuis la dernière tournée.
+
+Revision ID: a3f5d8e1c962
+Revises: e4a7c93b2d15
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f5d8e1c962'
+down_revision = 'e4a7c93b2d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # table éventuellement déjà créée par db.create_all()
+    if sa.inspect(op.get_bind()).has_table('loan_reminders'):
+        return
+    op.create_table(
+        'loan_reminders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('loan_id', 'kind',
+                            name='uq_loan_reminders_loan_id_kind'),
+    )
+    op.create_index('ix_loan_reminders_sent_at', 'loan_reminders', ['sent_at'])
+
+
+def downgrade():
+    op.drop_index('ix_loan_reminders_sent_at', table_name='loan_reminders')
+    op.drop_table('loan_reminders')
@@ -0,0 +1,39 @@
+"""per-ebook stock version
+
+Version du stock de chaque ebook (ebooks.stock_version), incrémentée par
+les emprunts et les retours dans l'UPDATE conditionnel du stock. Les ETag
+et le cache du catalogue en tiennent compte sans écrire dans la ligne
+unique de catalog_state, qui sérialisait tous les emprunts.
+
+Revision ID: b9d3f0a2c6e4
+Revises: 7d2b4e9f1a06
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d3f0a2c6e4'
+down_revision = '7d2b4e9f1a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # colonne et index éventuellement déjà créés par db.create_all()
+    if 'stock_version' not in {
+            c['name'] for c in inspector.get_columns('ebooks')}:
+        op.add_column('ebooks', sa.Column('stock_version', sa.Integer(),
+                                          nullable=False, server_default='0'))
+    if 'ix_ebooks_stock_version' not in {
+            i['name'] for i in inspector.get_indexes('ebooks')}:
+        op.create_index('ix_ebooks_stock_version', 'ebooks', ['stock_version'])
+
+
+def downgrade():
+    op.drop_index('ix_ebooks_stock_version', table_name='ebooks')
+    with op.batch_alter_table('ebooks') as batch_op:
+        batch_op.drop_column('stock_version')
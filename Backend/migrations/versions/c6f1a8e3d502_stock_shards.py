@@ -0,0 +1,42 @@
+"""stock shards
+
+Version du stock des listes du catalogue répartie sur quelques lignes
+(stock_shards) : un emprunt ou un retour incrémente la ligne
+ebook_id % STOCK_SHARDS, l'ETag des listes et de la recherche lit la somme
+de ces lignes au lieu de SUM(ebooks.stock_version) sur toute la table.
+L'index ix_ebooks_stock_version, qui ne servait qu'à cette somme, est
+supprimé.
+
+Revision ID: c6f1a8e3d502
+Revises: b9d3f0a2c6e4
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1a8e3d502'
+down_revision = 'b9d3f0a2c6e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # table éventuellement déjà créée par db.create_all()
+    if 'stock_shards' not in inspector.get_table_names():
+        op.create_table(
+            'stock_shards',
+            sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'))
+    if 'ix_ebooks_stock_version' in {
+            i['name'] for i in inspector.get_indexes('ebooks')}:
+        op.drop_index('ix_ebooks_stock_version', table_name='ebooks')
+
+
+def downgrade():
+    op.create_index('ix_ebooks_stock_version', 'ebooks', ['stock_version'])
+    op.drop_table('stock_shards')
@@ -0,0 +1,53 @@
+"""indexes for loans and ebook_category
+
+Index des chemins chauds, jusque-là parcourus en table scan :
+  - prêts d'un utilisateur (route_loan : filter_by(user_id=...)) ;
+  - prêts d'un ebook (clé étrangère, suppression d'un ebook) ;
+  - prêts non rendus par échéance (utils/check_expired_loans.py), en
+    index partiel puisque seuls les prêts en cours sont concernés ;
+  - table d'association ebook_category dans les deux sens.
+
+Revision ID: d27a9e0f4c81
+Revises: 8c4e61b2d5a3
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27a9e0f4c81'
+down_revision = '8c4e61b2d5a3'
+branch_labels = None
+depends_on = None
+
+
+def _create_index(name, table, columns, **kw):
+    # index éventuellement déjà créé par db.create_all()
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name not in existing:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade():
+    _create_index('ix_loans_user_id_is_returned', 'loans',
+                  ['user_id', 'is_returned'])
+    _create_index('ix_loans_ebook_id', 'loans', ['ebook_id'])
+    _create_index('ix_loans_open_due_date', 'loans', ['due_date'],
+                  sqlite_where=sa.text('return_date IS NULL'),
+                  postgresql_where=sa.text('return_date IS NULL'))
+    _create_index('ix_ebook_category_ebook_id_category_id',
+                  'ebook_category', ['ebook_id', 'category_id'])
+    _create_index('ix_ebook_category_category_id_ebook_id',
+                  'ebook_category', ['category_id', 'ebook_id'])
+
+
+def downgrade():
+    op.drop_index('ix_ebook_category_category_id_ebook_id',
+                  table_name='ebook_category')
+    op.drop_index('ix_ebook_category_ebook_id_category_id',
+                  table_name='ebook_category')
+    op.drop_index('ix_loans_open_due_date', table_name='loans')
+    op.drop_index('ix_loans_ebook_id', table_name='loans')
+    op.drop_index('ix_loans_user_id_is_returned', table_name='loans')
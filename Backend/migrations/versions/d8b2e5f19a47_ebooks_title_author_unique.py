@@ -0,0 +1,46 @@
+"""unique ebooks (title, author)
+
+Index unique sur la clé naturelle de l'import en masse : la recherche des
+existants d'un lot lit l'index au lieu de parcourir la table, et l'upsert
+(INSERT ... ON CONFLICT (title, author) DO UPDATE) empêche deux imports
+simultanés, ou un import et un POST /ebooks, de créer le même ebook.
+
+Les doublons déjà présents doivent être fusionnés avant la migration
+(les prêts les référencent) : elle s'arrête en les listant.
+
+Revision ID: d8b2e5f19a47
+Revises: c6f1a8e3d502
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b2e5f19a47'
+down_revision = 'c6f1a8e3d502'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # index éventuellement déjà créé par db.create_all()
+    if 'uq_ebooks_title_author' in {
+            i['name'] for i in sa.inspect(bind).get_indexes('ebooks')}:
+        return
+    duplicates = bind.execute(sa.text(
+        "SELECT title, author, count(*) FROM ebooks "
+        "WHERE title IS NOT NULL AND author IS NOT NULL "
+        "GROUP BY title, author HAVING count(*) > 1 LIMIT 20")).all()
+    if duplicates:
+        raise RuntimeError(
+            "Ebooks en double (titre, auteur, nombre) à fusionner avant "
+            f"la migration : {duplicates}")
+    op.create_index('uq_ebooks_title_author', 'ebooks', ['title', 'author'],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_ebooks_title_author', table_name='ebooks')
@@ -0,0 +1,52 @@
+"""email outbox
+
+Table email_outbox : mails enfilés dans la transaction de l'appelant
+(rappels, notifications) et envoyés par le dispatcher de utils/outbox.py,
+avec reprises espacées, état dead et clé d'idempotence unique.
+
+Revision ID: e4a7c93b2d15
+Revises: 5b8e2f6a1c47
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c93b2d15'
+down_revision = '5b8e2f6a1c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # table éventuellement déjà créée par db.create_all()
+    if sa.inspect(op.get_bind()).has_table('email_outbox'):
+        return
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=False),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('body_text', sa.Text(), nullable=False),
+        sa.Column('body_html', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(length=32), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key'),
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox',
+                    ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt_at',
+                  table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,44 @@
+"""indexes for the default loan listing sort
+
+Tri par défaut des listes de prêts (?sort=id, ou sort absent) :
+  - ?status=active|overdue : index partiel sur id des prêts en cours
+    (return_date IS NULL), lus dans l'ordre des id sans parcourir les prêts
+    rendus ni trier. Partiel comme ix_loans_open_due_date : un index
+    (return_date, id) serait préféré à celui-ci par les rappels, qui
+    filtrent l'échéance ;
+  - GET /api/users/<id>/loans : (user_id, id) lit les prêts de
+    l'utilisateur dans l'ordre des id.
+
+Revision ID: f3a9c1d6b284
+Revises: d8b2e5f19a47
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d6b284'
+down_revision = 'd8b2e5f19a47'
+branch_labels = None
+depends_on = None
+
+
+def _create_index(name, table, columns, **kw):
+    # index éventuellement déjà créé par db.create_all()
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name not in existing:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade():
+    _create_index('ix_loans_open_id', 'loans', ['id'],
+                  sqlite_where=sa.text('return_date IS NULL'),
+                  postgresql_where=sa.text('return_date IS NULL'))
+    _create_index('ix_loans_user_id_id', 'loans', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_loans_user_id_id', table_name='loans')
+    op.drop_index('ix_loans_open_id', table_name='loans')
@@ -1,5 +1,5 @@
 from config import db
-from flask_jwt_extended import get_jwt_identity
+from flask_jwt_extended import get_jwt, get_jwt_identity
 from datetime import datetime
 
 # table d association entre les livre et categories
@@ -7,7 +7,12 @@ ebook_category = db.Table('ebook_category',
                           db.Column('ebook_id', db.Integer,
                                     db.ForeignKey('ebooks.id')),
                           db.Column('category_id', db.Integer,
-                                    db.ForeignKey('categories.id'))
+                                    db.ForeignKey('categories.id')),
+                          # jointures dans les deux sens
+                          db.Index('ix_ebook_category_ebook_id_category_id',
+                                   'ebook_id', 'category_id'),
+                          db.Index('ix_ebook_category_category_id_ebook_id',
+                                   'category_id', 'ebook_id')
                           )
 
 # Creation des models(tables)
@@ -24,31 +29,32 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # incrementee pour revoquer les tokens deja emis (claim `tv`)
+    token_version = db.Column(db.Integer, nullable=False, default=0,
+                              server_default='0')
 
     # relation one to many entre user et loan
     loans = db.relationship('Loan', back_populates='user', lazy=True)
 
     @staticmethod
     def current_is_admin(user_id=None):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return False
+        # lu dans les claims du token, sans requete sur la table users
+        is_admin = bool(get_jwt().get('is_admin'))
         if user_id is None:
-            return user.is_admin
-        return user.is_admin or current_user_id == user_id
+            return is_admin
+        return is_admin or get_jwt_identity() == user_id
 
-    # Hash  un mot de passe
+    # Hash  un mot de passe (pool bcrypt borne, voir utils/password_hasher)
     @staticmethod
     def hash_password(password):
-        from config import bcrypt
-        return bcrypt.generate_password_hash(password).decode('utf-8')
+        from utils.password_hasher import get_password_hasher
+        return get_password_hasher().hash(password)
 
     # verifier un mot de passe
     @staticmethod
     def check_password(password, hashed_password):
-        from config import bcrypt
-        return bcrypt.check_password_hash(hashed_password, password)
+        from utils.password_hasher import get_password_hasher
+        return get_password_hasher().verify(password, hashed_password)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -56,6 +62,12 @@ class User(db.Model):
 
 class Ebook(db.Model):
     __tablename__ = 'ebooks'
+    # clé de la pagination par curseur de GET /api/ebooks
+    __table_args__ = (
+        db.Index('ix_ebooks_uploaded_at_id', 'uploaded_at', 'id'),
+        # cle naturelle de l import (upsert ON CONFLICT) : pas de doublon
+        db.Index('uq_ebooks_title_author', 'title', 'author', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(40))
     author = db.Column(db.String(70))
@@ -67,6 +79,10 @@ class Ebook(db.Model):
     total_copies = db.Column(db.Integer, default=1)
     # nombre d'exemplaire disponible
     available_copies = db.Column(db.Integer, default=1)
+    # incrementee avec available_copies par les emprunts et retours, dans
+    # la meme instruction (ETag d un ebook) ; les listes lisent stock_shards
+    stock_version = db.Column(db.Integer, nullable=False, default=0,
+                              server_default='0')
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     categories = db.relationship('Category', secondary=ebook_category,
@@ -91,6 +107,25 @@ class Category(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        # prets d'un utilisateur (routes des prets), actifs ou non
+        db.Index('ix_loans_user_id_is_returned', 'user_id', 'is_returned'),
+        db.Index('ix_loans_ebook_id', 'ebook_id'),
+        # prets non rendus par echeance (rappels, retards) : index partiel
+        db.Index('ix_loans_open_due_date', 'due_date',
+                 sqlite_where=db.text('return_date IS NULL'),
+                 postgresql_where=db.text('return_date IS NULL')),
+        # listes paginees des prets (?sort=due_date|loan_date, ?due_before...)
+        db.Index('ix_loans_due_date_id', 'due_date', 'id'),
+        db.Index('ix_loans_loan_date_id', 'loan_date', 'id'),
+        db.Index('ix_loans_user_id_due_date_id', 'user_id', 'due_date', 'id'),
+        # tri par defaut (id) des prets en cours et des prets d un
+        # utilisateur ; partiel pour laisser les rappels sur l echeance
+        db.Index('ix_loans_open_id', 'id',
+                 sqlite_where=db.text('return_date IS NULL'),
+                 postgresql_where=db.text('return_date IS NULL')),
+        db.Index('ix_loans_user_id_id', 'user_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     ebook_id = db.Column(db.Integer, db.ForeignKey(
@@ -107,3 +142,106 @@ class Loan(db.Model):
 
     def __repr__(self):
         return f'<Loan User {self.user_id} - Ebook {self.ebook_id}>'
+
+
+class LoanReminder(db.Model):
+    # journal des rappels envoyes : un rappel d un type donne (seuil
+    # d echeance franchi) part au plus une fois par pret
+    __tablename__ = 'loan_reminders'
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'kind',
+                            name='uq_loan_reminders_loan_id_kind'),
+        # date de la derniere tournee (requete incrementale)
+        db.Index('ix_loan_reminders_sent_at', 'sent_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # supprime avec le pret par la base (pas de chargement cote ORM)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id', ondelete='CASCADE'),
+                        nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LoanReminder Loan {self.loan_id} {self.kind}>'
+
+
+class CatalogState(db.Model):
+    # ligne unique (id=1) : version du catalogue incrémentée à chaque
+    # écriture sur les ebooks ou les catégories (ETag / Last-Modified) ;
+    # les emprunts et retours passent par Ebook.stock_version
+    __tablename__ = 'catalog_state'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogState v{self.version}>'
+
+
+class StockShard(db.Model):
+    # version du stock des listes du catalogue, repartie sur quelques
+    # lignes (ebook_id % STOCK_SHARDS, utils/http_cache.py) : un emprunt
+    # incremente sa ligne, l ETag des listes lit la somme des lignes
+    __tablename__ = 'stock_shards'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StockShard {self.id} v{self.version}>'
+
+
+class EmailOutbox(db.Model):
+    # mails a envoyer, inseres dans la transaction de l appelant puis
+    # envoyes par le dispatcher (utils/outbox.py) : statut pending -> sent,
+    # ou dead apres trop d echecs / refus definitif du relais
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # prochains messages a envoyer (lot du dispatcher)
+        db.Index('ix_email_outbox_status_next_attempt_at',
+                 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # un meme rappel enfile deux fois n est envoye qu une fois
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=False)
+    recipients = db.Column(db.Text, nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body_text = db.Column(db.Text, nullable=False)
+    body_html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # prochaine tentative ; sert aussi de bail pendant un envoi en cours
+    next_attempt_at = db.Column(db.DateTime, nullable=False,
+                                default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.status}>'
+
+
+class JobLease(db.Model):
+    # une ligne par tache periodique (utils/scheduler.py) : bail de
+    # l instance qui l execute, prochaine echeance, point de reprise et
+    # bilan de la derniere execution (duree, retard)
+    __tablename__ = 'job_leases'
+    name = db.Column(db.String(100), primary_key=True)
+    # instance titulaire du bail (NULL : libre), jusqu a lease_expires_at
+    owner = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    next_run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # etat JSON de la tache, conserve d une execution a l autre
+    checkpoint = db.Column(db.Text, nullable=True)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_success_at = db.Column(db.DateTime, nullable=True)
+    # secondes : duree de la derniere execution, retard de son demarrage
+    last_duration = db.Column(db.Float, nullable=True)
+    last_lag = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<JobLease {self.name} {self.owner}>'
@@ -1,22 +1,17 @@
 from flask import Blueprint, request, jsonify
-from models import Category, User, db
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Category, db
+from utils.auth import admin_required
+from utils.http_cache import bump_catalog_version, catalog_conditional
+from utils.catalog_cache import catalog_cached, invalidate_catalog
+from schemas import category_schema
+from utils.serializers import UnknownFields
 
 category_bp = Blueprint('category_bp', __name__)
 
 
-# Check if user is admin
-def _require_admin():
-    """Vérifie si l'utilisateur est administrateur"""
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
-        return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
-    return None
-
-
 # Create new category
 @category_bp.route('/categories', methods=['POST'])
-@jwt_required()
+@admin_required()
 def create_category():
     """
     creer une nouvelle catégorie
@@ -45,10 +40,6 @@ def create_category():
             403:
                 description: Accès interdit, vous n'êtes pas administrateur
     """
-    err = _require_admin()
-    if err:
-        return err
-
     data = request.get_json()
     name = data.get('name')
     description = data.get('description')
@@ -58,20 +49,20 @@ def create_category():
 
     new_category = Category(name=name, description=description or "")
     db.session.add(new_category)
+    bump_catalog_version()
     db.session.commit()
+    invalidate_catalog('categories')
 
     return jsonify({
         "msg": "Catégorie créée",
-        "category": {
-            "id": new_category.id,
-            "name": new_category.name,
-            "description": new_category.description
-        }
+        "category": category_schema.dump(new_category)
     }), 201
 
 
 # List all categories
 @category_bp.route('/categories', methods=['GET'])
+@catalog_conditional
+@catalog_cached('categories')
 def get_categories():
     """
     Récupérer toutes les catégories
@@ -81,21 +72,23 @@ def get_categories():
     responses:
         200:
             description: Liste des catégories récupérées
+        400:
+            description: Champs inconnus dans ?fields=
         404:
             description: Aucune catégorie trouvée
     """
-    categories = Category.query.all()
-    return jsonify({'categories': [
-        {
-            'id': c.id,
-            'name': c.name,
-            'description': c.description or ""
-        } for c in categories
-    ]}), 200
+    try:
+        fields, _ = category_schema.selection(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
+    categories = category_schema.select(fields)
+    return jsonify({'categories': category_schema.dump_many(categories, fields)}), 200
 
 
 # Get specific category
 @category_bp.route('/categories/<int:category_id>', methods=['GET'])
+@catalog_conditional
+@catalog_cached('category:{category_id}')
 def get_category(category_id):
     """
     Récupérer une catégorie par son ID
@@ -112,20 +105,22 @@ def get_category(category_id):
     responses:
         200:
             description: Catégorie récupérée
+        400:
+            description: Champs inconnus dans ?fields=
         404:
             description: Catégorie non trouvée
     """
+    try:
+        fields, _ = category_schema.selection(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
     category = Category.query.get_or_404(category_id)
-    return jsonify({
-        'id': category.id,
-        'name': category.name,
-        'description': category.description or ""
-    }), 200
+    return jsonify(category_schema.dump(category, fields)), 200
 
 
 # Update category
 @category_bp.route('/categories/<int:category_id>', methods=['PUT'])
-@jwt_required()
+@admin_required()
 def update_category(category_id):
     """
     Mettre à jour une catégorie par son ID
@@ -155,30 +150,24 @@ def update_category(category_id):
         404:
             description: Catégorie non trouvée
     """
-    err = _require_admin()
-    if err:
-        return err
-
     category = Category.query.get_or_404(category_id)
     data = request.get_json()
 
     category.name = data.get('name', category.name)
     category.description = data.get('description', category.description or "")
+    bump_catalog_version()
     db.session.commit()
+    invalidate_catalog('categories', f'category:{category_id}')
 
     return jsonify({
         "msg": "Catégorie mise à jour",
-        "category": {
-            "id": category.id,
-            "name": category.name,
-            "description": category.description
-        }
+        "category": category_schema.dump(category)
     }), 200
 
 
 # Delete category
 @category_bp.route('/categories/<int:category_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required()
 def delete_category(category_id):
     """
     Supprimer une catégorie par son ID
@@ -197,12 +186,10 @@ def delete_category(category_id):
         200:
             description: Catégorie supprimée
     """
-    err = _require_admin()
-    if err:
-        return err
-
     category = Category.query.get_or_404(category_id)
     db.session.delete(category)
+    bump_catalog_version()
     db.session.commit()
+    invalidate_catalog('categories', f'category:{category_id}')
 
     return jsonify({"msg": "Catégorie supprimée"}), 200
@@ -1,19 +1,93 @@
-from flask import Blueprint, request, jsonify
-from models import Ebook, User, Loan
+from flask import Blueprint, abort, request, jsonify
+from sqlalchemy import update
+from models import Ebook, Loan
 from config import db
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
+from utils.auth import admin_required, current_user_is_admin
+from utils.catalog_cache import invalidate_catalog
+from utils.http_cache import bump_stock_version
+from utils.pagination import InvalidPageRequest, decode_cursor, keyset_page, parse_limit
+from schemas import loan_schema
+from utils.serializers import UnknownFields
 
 loan_bp = Blueprint('loan_bp', __name__)
 
+# Clés de tri acceptées par ?sort= (préfixe '-' : ordre décroissant). Chaque
+# clé se termine par Loan.id pour rester unique (pagination par curseur).
+LOAN_SORTS = {
+    'id': (Loan.id,),
+    'due_date': (Loan.due_date, Loan.id),
+    'loan_date': (Loan.loan_date, Loan.id),
+}
+LOAN_STATUSES = ('active', 'returned', 'overdue')
 
-# Check if user is admin
-def _require_admin():
-    """Vérifie si l'utilisateur est administrateur"""
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
-        return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
-    return None
+
+def _parse_date_param(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise InvalidPageRequest(
+            f"Le paramètre '{name}' doit être une date ISO 8601")
+
+
+def _loan_listing(*criteria):
+    """
+    Liste des prêts vérifiant `criteria`, filtrée, triée et paginée selon
+    la requête : status=active|returned|overdue, due_before, due_after,
+    sort, limit et cursor, plus fields et include. Tous les filtres sont
+    traduits en SQL (index sur l'échéance et sur l'utilisateur) : le
+    client ne reçoit jamais la table complète.
+    """
+    try:
+        fields, include = loan_schema.selection(request.args)
+        status = request.args.get('status')
+        if status and status not in LOAN_STATUSES:
+            raise InvalidPageRequest(
+                "Le paramètre 'status' doit valoir active, returned ou overdue")
+        due_before = _parse_date_param('due_before')
+        due_after = _parse_date_param('due_after')
+
+        sort = request.args.get('sort') or 'id'
+        descending = sort.startswith('-')
+        columns = LOAN_SORTS.get(sort[1:] if descending else sort)
+        if columns is None:
+            raise InvalidPageRequest(
+                "Le paramètre 'sort' doit valoir id, due_date ou loan_date "
+                "(préfixe '-' pour l'ordre décroissant)")
+
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor = decode_cursor(
+                cursor, *(int if c.key == 'id' else datetime for c in columns))
+    except (InvalidPageRequest, UnknownFields) as e:
+        return jsonify({"msg": str(e)}), 400
+
+    # colonnes des champs demandés, de la clé de tri et des relations
+    query = loan_schema.select(fields, *columns, include=include).filter(*criteria)
+    # Un prêt est en cours tant que return_date est vide : même critère que
+    # l'index partiel ix_loans_open_due_date et les rappels
+    if status in ('active', 'overdue'):
+        query = query.filter(Loan.return_date.is_(None))
+    elif status == 'returned':
+        query = query.filter(Loan.return_date.isnot(None))
+    if status == 'overdue':
+        query = query.filter(Loan.due_date < datetime.utcnow())
+    if due_before is not None:
+        query = query.filter(Loan.due_date < due_before)
+    if due_after is not None:
+        query = query.filter(Loan.due_date >= due_after)
+
+    loans, next_cursor = keyset_page(query, columns, limit, cursor or None,
+                                     descending=descending)
+    return jsonify({
+        'loans': loan_schema.dump_many(loans, fields, include),
+        'next_cursor': next_cursor
+    }), 200
 
 
 # Create loan
@@ -51,31 +125,45 @@ def create_loan():
     if not data.get('ebook_id'):
         return jsonify({"msg": "L'identifiant du livre est requis"}), 400
 
-    ebook = Ebook.query.get_or_404(data['ebook_id'])
-
-    if ebook.available_copies < 1:
+    ebook_id = data['ebook_id']
+
+    # Réservation atomique d'une copie : le test de disponibilité et la
+    # décrémentation forment une seule instruction, sans lecture préalable.
+    # Deux emprunts simultanés du dernier exemplaire ne peuvent donc pas
+    # réussir tous les deux, et sous SQLite le verrou d'écriture est pris
+    # dès la première instruction de cette transaction courte.
+    reserved = db.session.execute(
+        update(Ebook)
+        .where(Ebook.id == ebook_id, Ebook.available_copies > 0)
+        .values(available_copies=Ebook.available_copies - 1,
+                stock_version=Ebook.stock_version + 1)
+        .execution_options(synchronize_session=False)).rowcount
+    if not reserved:
+        db.session.rollback()
+        if db.session.query(Ebook.id).filter_by(id=ebook_id).first() is None:
+            abort(404)
         return jsonify({"msg": "Aucune copie disponible pour ce livre"}), 400
 
     new_loan = Loan(
         user_id=user_id,
-        ebook_id=ebook.id,
+        ebook_id=ebook_id,
         loan_date=datetime.utcnow(),
         due_date=datetime.utcnow() + timedelta(days=14)
     )
-
-    ebook.available_copies -= 1
     db.session.add(new_loan)
+    # ETag des listes : une ligne de stock_shards parmi STOCK_SHARDS, pas
+    # catalog_state, que tous les emprunts de tous les livres se disputeraient
+    bump_stock_version(ebook_id)
+    # réponse construite avant le commit, qui expire l'instance
+    db.session.flush()
+    loan = loan_schema.dump(new_loan)
     db.session.commit()
+    # cache de ce worker ; les autres voient le stock à l'expiration (TTL)
+    invalidate_catalog('ebooks', f'ebook:{ebook_id}')
 
     return jsonify({
         "msg": "Emprunt créé avec succès",
-        "loan": {
-            'id': new_loan.id,
-            'user_id': new_loan.user_id,
-            'ebook_id': new_loan.ebook_id,
-            'loan_date': new_loan.loan_date,
-            'due_date': new_loan.due_date
-        }
+        "loan": loan
     }), 201
 
 
@@ -84,35 +172,70 @@ def create_loan():
 @jwt_required()
 def get_loans():
     """
-    Récupérer tous les prêts
-
+    Récupérer les prêts (tous pour un admin), filtrés et paginés
+    ---
     tags:
         - Emprunts
+    security:
+      - jwt: []
+    parameters:
+      - name: status
+        in: query
+        type: string
+        enum: [active, returned, overdue]
+        required: false
+        description: Prêts en cours, rendus, ou en cours et échus
+      - name: due_before
+        in: query
+        type: string
+        format: date-time
+        required: false
+        description: Échéance strictement antérieure à cette date
+      - name: due_after
+        in: query
+        type: string
+        format: date-time
+        required: false
+        description: Échéance postérieure ou égale à cette date
+      - name: sort
+        in: query
+        type: string
+        enum: [id, -id, due_date, -due_date, loan_date, -loan_date]
+        required: false
+        description: Ordre de la liste (id par défaut)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Nombre de prêts par page (50 par défaut, 200 maximum)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Curseur opaque renvoyé dans `next_cursor` par la page précédente
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Champs à renvoyer, ex. id,due_date (seules ces colonnes sont lues)
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: Relations à intégrer (ebook, user) ; champs via fields[ebook]=id,title
     responses:
         200:
-            description: Liste des prêts récupérés
+            description: Une page de prêts et le curseur de la page suivante
+        400:
+            description: Filtre, tri, pagination, champs ou relations invalides
     """ 
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
     # Si l'utilisateur est admin, afficher tous les prêts
-    if user.is_admin:
-        loans = Loan.query.all()
-    else:
-        # Sinon, afficher seulement les prêts de l'utilisateur
-        loans = Loan.query.filter_by(user_id=user_id).all()
-
-    return jsonify({'loans': [
-        {
-            'id': loan.id,
-            'user_id': loan.user_id,
-            'ebook_id': loan.ebook_id,
-            'loan_date': loan.loan_date,
-            'due_date': loan.due_date,
-            'return_date': loan.return_date,
-            'is_returned': loan.is_returned
-        } for loan in loans
-    ]}), 200
+    if current_user_is_admin():
+        return _loan_listing()
+    # Sinon, afficher seulement les prêts de l'utilisateur
+    return _loan_listing(Loan.user_id == user_id)
 
 
 # Get specific loan
@@ -130,26 +253,34 @@ def get_loan(loan_id):
           required: true
           schema:
             type: integer
+        - in: query
+          name: fields
+          required: false
+          schema:
+            type: string
+        - in: query
+          name: include
+          required: false
+          schema:
+            type: string
+          description: Relations à intégrer (ebook, user)
     responses:
         200:
             description: prêt récupéré
+        400:
+            description: Champs ou relations invalides
     """
+    try:
+        fields, include = loan_schema.selection(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
     loan = Loan.query.get_or_404(loan_id)
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
-    if not user.is_admin and loan.user_id != user_id:
+    if not current_user_is_admin() and loan.user_id != user_id:
         return jsonify({"msg": "Accès interdit"}), 403
 
-    return jsonify({
-        'id': loan.id,
-        'user_id': loan.user_id,
-        'ebook_id': loan.ebook_id,
-        'loan_date': loan.loan_date,
-        'due_date': loan.due_date,
-        'return_date': loan.return_date,
-        'is_returned': loan.is_returned
-    }), 200
+    return jsonify(loan_schema.dump(loan, fields, include)), 200
 
 
 # Update loan (return)
@@ -177,25 +308,43 @@ def update_loan(loan_id):
         400:
             description: Ce prêt a déjà été retourné
     """
-    loan = Loan.query.get_or_404(loan_id)
+    # L'ebook est chargé avec le prêt (titre de la réponse)
+    loan = Loan.query.options(db.joinedload(Loan.ebook)).get_or_404(loan_id)
 
     if loan.user_id != get_jwt_identity():
         return jsonify({"msg": "Accès interdit, vous n'êtes pas propriétaire de ce prêt"}), 403
 
-    if loan.is_returned:
+    # Comme pour l'emprunt : le prêt n'est marqué rendu qu'une fois (deux
+    # retours simultanés ne rendent pas deux copies), puis la copie est
+    # rendue par incrément en base, sans relire le compteur.
+    return_date = datetime.utcnow()
+    returned = db.session.execute(
+        update(Loan)
+        .where(Loan.id == loan_id, Loan.is_returned.isnot(True))
+        .values(is_returned=True, return_date=return_date)
+        .execution_options(synchronize_session=False)).rowcount
+    if not returned:
+        db.session.rollback()
         return jsonify({"msg": "Ce prêt a déjà été retourné"}), 400
 
-    loan.is_returned = True
-    loan.return_date = datetime.utcnow()
-    loan.ebook.available_copies += 1
+    db.session.execute(
+        update(Ebook)
+        .where(Ebook.id == loan.ebook_id)
+        .values(available_copies=Ebook.available_copies + 1,
+                stock_version=Ebook.stock_version + 1)
+        .execution_options(synchronize_session=False))
+    bump_stock_version(loan.ebook_id)
+    # lus avant le commit, qui expire le prêt et son ebook
+    ebook_id, title = loan.ebook_id, loan.ebook.title
     db.session.commit()
+    invalidate_catalog('ebooks', f'ebook:{ebook_id}')
 
     return jsonify({
-        "msg": f"Prêt du livre {loan.ebook.title} retourné avec succès",
+        "msg": f"Prêt du livre {title} retourné avec succès",
         "loan": {
-            'id': loan.id,
-            'return_date': loan.return_date,
-            'is_returned': loan.is_returned
+            'id': loan_id,
+            'return_date': return_date,
+            'is_returned': True
         }
     }), 200
 
@@ -205,7 +354,7 @@ def update_loan(loan_id):
 @jwt_required()
 def get_user_loans(user_id):
     """
-    Récupérer les prêts d'un utilisateur
+    Récupérer les prêts d'un utilisateur, filtrés et paginés
     ---
     tags:
       - Emprunts
@@ -218,34 +367,68 @@ def get_user_loans(user_id):
         schema:
           type: integer
         description: ID de l'utilisateur pour lequel récupérer les prêts
+      - name: status
+        in: query
+        type: string
+        enum: [active, returned, overdue]
+        required: false
+        description: Prêts en cours, rendus, ou en cours et échus
+      - name: due_before
+        in: query
+        type: string
+        format: date-time
+        required: false
+        description: Échéance strictement antérieure à cette date
+      - name: due_after
+        in: query
+        type: string
+        format: date-time
+        required: false
+        description: Échéance postérieure ou égale à cette date
+      - name: sort
+        in: query
+        type: string
+        enum: [id, -id, due_date, -due_date, loan_date, -loan_date]
+        required: false
+        description: Ordre de la liste (id par défaut)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Nombre de prêts par page (50 par défaut, 200 maximum)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Curseur opaque renvoyé dans `next_cursor` par la page précédente
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Champs à renvoyer, ex. id,due_date (seules ces colonnes sont lues)
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: Relations à intégrer (ebook, user) ; champs via fields[ebook]=id,title
     responses:
         200:
-            description: Liste des prêts de l'utilisateur récupérée
+            description: Une page de prêts de l'utilisateur et le curseur suivant
+        400:
+            description: Filtre, tri, pagination, champs ou relations invalides
     """
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
 
     # Vérifier si l'utilisateur peut accéder à ces prêts
-    if not current_user.is_admin and current_user_id != user_id:
+    if not current_user_is_admin() and current_user_id != user_id:
         return jsonify({"msg": "Accès interdit"}), 403
 
-    loans = Loan.query.filter_by(user_id=user_id).all()
-    return jsonify({'loans': [
-        {
-            'id': loan.id,
-            'user_id': loan.user_id,
-            'ebook_id': loan.ebook_id,
-            'loan_date': loan.loan_date,
-            'due_date': loan.due_date,
-            'return_date': loan.return_date,
-            'is_returned': loan.is_returned
-        } for loan in loans
-    ]}), 200
+    return _loan_listing(Loan.user_id == user_id)
 
 
 # Delete loan
 @loan_bp.route('/loans/<int:loan_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required()
 def delete_loan(loan_id):
     """
     Supprimer un prêt
@@ -264,10 +447,6 @@ def delete_loan(loan_id):
         200:
             description: prêt supprimé avec succès
     """
-    err = _require_admin()
-    if err:
-        return err
-
     loan = Loan.query.get_or_404(loan_id)
     db.session.delete(loan)
     db.session.commit()
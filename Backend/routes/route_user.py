@@ -1,38 +1,21 @@
 from flask import Blueprint, request, jsonify
-from models import User
+from sqlalchemy import delete, func, select, update
+from models import Ebook, EmailOutbox, Loan, LoanReminder, User
 from config import db
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import timedelta
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from utils.auth import (admin_required, create_user_token, current_user_is_admin,
+                        forget_token_version, revoke_user_tokens)
+from utils.catalog_cache import invalidate_catalog
+from utils.http_cache import bump_stock_version
+from utils.outbox import PENDING
+from utils.password_hasher import get_password_hasher
+from schemas import user_schema
+from utils.serializers import UnknownFields
 
 # Blueprint for user routes
 user_bp = Blueprint('user_bp', __name__)
 
 
-# Check if user is admin
-def _require_admin(user_id=None):
-    """
-    Vérifie si l'utilisateur est administrateur.
-
-    securite:
-    - Si user_id est None, vérifie si l'utilisateur actuel est admin.
-      jwt: [ ]
-      response: 403 
-       description: Accès interdit, vous n'êtes pas administrateur
-      response: 200
-        description: Accès autorisé
-    """
-    user = User.query.get(get_jwt_identity())
-    if not user:
-        return jsonify({"msg": "Utilisateur non trouvé"}), 404
-    if user_id is None:
-        if not user.is_admin:
-            return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
-    else:
-        if not (user.is_admin or get_jwt_identity() == user_id):
-            return jsonify({"msg": "Accès interdit, vous n'êtes pas propriétaire du compte ou administrateur"}), 403
-    return None
-
-
 # Create user
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -71,6 +54,11 @@ def create_user():
     if not data.get('username') or not data.get('email') or not data.get('password'):
         return jsonify({"msg": "Nom d'utilisateur, email et mot de passe sont requis"}), 400
 
+    # Vérifié avant le hachage bcrypt, coûteux
+    if User.query.filter((User.email == data['email']) |
+                         (User.username == data['username'])).first():
+        return jsonify({"msg": "Nom d'utilisateur ou email déjà utilisé"}), 400
+
     new_user = User(
         username=data['username'],
         email=data['email'],
@@ -82,18 +70,13 @@ def create_user():
 
     return jsonify({
         "msg": "Utilisateur créé avec succès",
-        "user": {
-            "id": new_user.id,
-            "username": new_user.username,
-            "email": new_user.email,
-            "is_admin": new_user.is_admin
-        }
+        "user": user_schema.dump(new_user)
     }), 201
 
 
 # Get all users
 @user_bp.route('/users', methods=['GET'])
-@jwt_required()
+@admin_required()
 def get_users():
     """ 
     liste tous les utilisateurs (administrateur requis)
@@ -105,29 +88,23 @@ def get_users():
     responses:
         200:
             description: Liste des utilisateurs
+        400:
+            description: Champs inconnus dans ?fields=
         403:
             description: Accès interdit, vous n'êtes pas administrateur
     
     """
-    err = _require_admin()
-    if err:
-        return err
-
-    users = User.query.all()
-    return jsonify({'users': [
-        {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'is_admin': user.is_admin,
-            'created_at': user.created_at
-        } for user in users
-    ]}), 200
+    try:
+        fields, _ = user_schema.selection(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
+    users = user_schema.select(fields)
+    return jsonify({'users': user_schema.dump_many(users, fields)}), 200
 
 
 # Get specific user
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
-@jwt_required()
+@admin_required(owner_arg='user_id')
 def get_user(user_id):
     """ 
     afficher un utilisateur specifique (administrateur ou proprietaire requis)
@@ -143,23 +120,13 @@ def get_user(user_id):
             description: Accès interdit, vous n'êtes pas administrateur ou propriétaire du compte
     
     """
-    err = _require_admin(user_id)
-    if err:
-        return err
-
     user = User.query.get_or_404(user_id)
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'is_admin': user.is_admin,
-        'created_at': user.created_at
-    }), 200
+    return jsonify(user_schema.dump(user)), 200
 
 
 # Update user
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
-@jwt_required()
+@admin_required(owner_arg='user_id')
 def update_user(user_id):
     """
     Mettre à jour un utilisateur (administrateur ou propriétaire requis)
@@ -191,35 +158,40 @@ def update_user(user_id):
       403:
         description: Accès interdit
     """
-    err = _require_admin(user_id)
-    if err:
-        return err
-
     user = User.query.get_or_404(user_id)
     data = request.get_json()
 
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
+    revoke = False
     if 'password' in data:
         user.password = User.hash_password(data['password'])
-    user.is_admin = data.get('is_admin', user.is_admin)
-
+        revoke = True
+    is_admin = data.get('is_admin', user.is_admin)
+    if is_admin != user.is_admin:
+        if not current_user_is_admin():
+            return jsonify({"msg": "Accès interdit, seul un administrateur peut changer le rôle"}), 403
+        user.is_admin = is_admin
+        revoke = True
+    # Les tokens émis avec l'ancien rôle / mot de passe ne sont plus valides
+    if revoke:
+        revoke_user_tokens(user)
+
+    # réponse construite avant le commit, qui expire l'instance
+    dumped = user_schema.dump(user)
     db.session.commit()
+    if revoke:
+        forget_token_version(user_id)
 
     return jsonify({
         "msg": "Utilisateur mis à jour avec succès",
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "is_admin": user.is_admin
-        }
+        "user": dumped
     }), 200
 
 
 # Delete user
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required(owner_arg='user_id')
 def delete_user(user_id):
     """
     suprimmer un tilisateur (administrateur ou proprietaire requis)
@@ -239,15 +211,53 @@ def delete_user(user_id):
             description: Utilisateur supprimé avec succès
         403:
             description: Accès interdit, vous n'êtes pas administrateur ou propriétaire du compte
+        409:
+            description: L'utilisateur a un historique d'emprunts
     
     """
-    err = _require_admin(user_id)
-    if err:
-        return err
-
     user = User.query.get_or_404(user_id)
+    # L'historique des emprunts rendus est conservé : il bloque la suppression
+    if db.session.scalar(select(Loan.id).where(
+            Loan.user_id == user_id, Loan.return_date.isnot(None)).limit(1)):
+        return jsonify({"msg": "Impossible de supprimer un utilisateur "
+                               "ayant un historique d'emprunts"}), 409
+
+    # Les emprunts en cours sont annulés : leurs exemplaires sont rendus au
+    # stock en une instruction (même écriture que les retours), sans
+    # charger les prêts ni les ebooks
+    open_loans = (Loan.user_id == user_id, Loan.return_date.is_(None))
+    ebook_ids = db.session.scalars(
+        select(Loan.ebook_id).where(*open_loans).distinct()).all()
+    db.session.execute(
+        update(Ebook)
+        .where(Ebook.id.in_(ebook_ids))
+        .values(available_copies=Ebook.available_copies + (
+                    select(func.count(Loan.id))
+                    .where(Loan.ebook_id == Ebook.id, *open_loans)
+                    .scalar_subquery()),
+                stock_version=Ebook.stock_version + 1)
+        .execution_options(synchronize_session=False))
+    bump_stock_version(*ebook_ids)
+    # Journal des rappels de ces prêts et rappels encore en attente d'envoi,
+    # supprimés explicitement : la cascade de loan_reminders.loan_id n'existe
+    # qu'en base, et SQLite n'applique pas les clés étrangères
+    db.session.execute(
+        delete(LoanReminder)
+        .where(LoanReminder.loan_id.in_(select(Loan.id).where(*open_loans)))
+        .execution_options(synchronize_session=False))
+    db.session.execute(
+        delete(EmailOutbox)
+        .where(EmailOutbox.status == PENDING,
+               EmailOutbox.idempotency_key.like(f'loan-reminder:{user_id}:%'))
+        .execution_options(synchronize_session=False))
+    db.session.execute(delete(Loan).where(*open_loans)
+                       .execution_options(synchronize_session=False))
     db.session.delete(user)
     db.session.commit()
+    # Sans ligne en base, ses tokens sont refusés par le contrôle de révocation
+    forget_token_version(user_id)
+    if ebook_ids:
+        invalidate_catalog('ebooks', *(f'ebook:{ebook_id}' for ebook_id in ebook_ids))
 
     return jsonify({"msg": "Utilisateur supprimé avec succès"}), 200
 
@@ -270,13 +280,7 @@ def get_current_user():
     """
     user_id = get_jwt_identity()
     user = User.query.get_or_404(user_id)
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'is_admin': user.is_admin,
-        'created_at': user.created_at
-    }), 200
+    return jsonify(user_schema.dump(user)), 200
 
 
 # User login
@@ -316,8 +320,15 @@ def login():
     user = User.query.filter_by(email=data['email']).first()
 
     if user and User.check_password(data['password'], user.password):
-        access_token = create_access_token(
-            identity=user.id, expires_delta=timedelta(hours=1))
+        # Facteur de coût bcrypt modifié : on re-hache avec le mot de passe
+        # en clair disponible ici (sans révoquer les tokens existants)
+        hasher = get_password_hasher()
+        # token émis avant le commit du re-hachage, qui expire l'instance
+        access_token = create_user_token(user)
+        if hasher.needs_rehash(user.password):
+            user.password = hasher.hash(data['password'])
+            db.session.commit()
+            hasher.record_rehash()
         return jsonify({'access_token': access_token}), 200
     else:
         return jsonify({"msg": "Email ou mot de passe incorrect"}), 401
@@ -1,24 +1,25 @@
 from config import db
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Ebook, User
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from models import Ebook
 from datetime import datetime
+from utils.auth import admin_required
+from utils.pagination import (InvalidPageRequest, decode_cursor, keyset_page,
+                              parse_limit)
+from utils.search import search_ebooks
+from utils.http_cache import STOCK_ALL, bump_catalog_version, catalog_conditional
+from utils.catalog_cache import catalog_cached, invalidate_catalog
+from utils.ebook_import import ImportFormatError, detect_format, import_ebooks
+from schemas import ebook_schema
+from utils.serializers import UnknownFields
 
 # Blueprint pour les routes ebook
 ebook_bp = Blueprint('ebook_bp', __name__)
 
 
-def _require_admin():
-    """Vérifie si l'utilisateur est administrateur"""
-    user = User.query.get(get_jwt_identity())
-    if not user or not user.is_admin:
-        return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
-    return None
-
-
 # Créer un ebook
 @ebook_bp.route('/ebooks', methods=['POST'])
-@jwt_required()
+@admin_required()
 def create_ebook():
     """
     Créer un nouvel ebook (Admin requis)
@@ -44,11 +45,9 @@ def create_ebook():
     responses:
       201:
         description: Ebook créé avec succès
+      409:
+        description: Un ebook de ce titre et de cet auteur existe déjà
     """
-    err = _require_admin()
-    if err:
-        return err
-
     data = request.get_json()
 
     title = data.get('title')
@@ -73,57 +72,202 @@ def create_ebook():
         )
 
         db.session.add(new_ebook)
+        bump_catalog_version()
+        # réponse construite avant le commit, qui expire l'instance
+        db.session.flush()
+        ebook = ebook_schema.dump(new_ebook)
         db.session.commit()
+        invalidate_catalog('ebooks')
 
         return jsonify({
             "msg": "Ebook créé avec succès",
-            "ebook": {
-                'id': new_ebook.id,
-                'title': new_ebook.title,
-                'author': new_ebook.author,
-                'description': new_ebook.description,
-                'file_path': new_ebook.file_path,
-                'total_copies': new_ebook.total_copies,
-                'available_copies': new_ebook.available_copies,
-                'uploaded_at': new_ebook.uploaded_at
-            }
+            "ebook": ebook
         }), 201
 
+    except IntegrityError:
+        # (title, author) unique : uq_ebooks_title_author
+        db.session.rollback()
+        return jsonify({"msg": "Un ebook de ce titre et de cet auteur existe déjà"}), 409
     except Exception as e:
         db.session.rollback()
         print("Erreur création ebook:", e)
         return jsonify({"msg": "Erreur interne du serveur"}), 500
 
 
+# Import en masse d'ebooks (CSV / JSON Lines)
+@ebook_bp.route('/ebooks/import', methods=['POST'])
+@admin_required()
+def import_ebooks_route():
+    """
+    Importer des ebooks en masse (Admin requis)
+    ---
+    tags:
+      - Ebooks
+    security:
+      - jwt: []
+    consumes:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [csv, jsonl]
+        required: false
+        description: Format du flux si le Content-Type ne l'indique pas
+      - in: body
+        name: body
+        description: >
+          Une ligne par ebook (title, author, description, cover_image,
+          file_path, total_copies, available_copies). Les ebooks existants
+          (même titre et même auteur) sont mis à jour ; leur stock
+          disponible est recalculé (total_copies - prêts en cours).
+        schema:
+          type: string
+    responses:
+      200:
+        description: Bilan de l'import avec les erreurs ligne par ligne
+      400:
+        description: Format de flux inconnu
+    """
+    try:
+        fmt = detect_format(request.content_type, request.args.get('format'))
+    except ImportFormatError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    try:
+        report = import_ebooks(
+            request.stream, fmt,
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+            max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 1000))
+    except UnicodeDecodeError:
+        return jsonify({"msg": "Le flux doit être encodé en UTF-8"}), 400
+    except Exception as e:
+        print("Erreur import ebooks:", e)
+        return jsonify({"msg": "Erreur interne du serveur"}), 500
+
+    return jsonify(dict(msg="Import terminé", **report.to_dict())), 200
+
+
 # Récupérer tous les ebooks
 @ebook_bp.route('/ebooks', methods=['GET'])
+@catalog_conditional(stock=STOCK_ALL)
+@catalog_cached('ebooks', stock=STOCK_ALL)
 def get_ebooks():
     """
-    Récupérer la liste de tous les ebooks
+    Récupérer la liste des ebooks (pagination par curseur)
+    ---
+    tags:
+      - Ebooks
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Nombre d'ebooks par page (50 par défaut, 200 maximum)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Curseur opaque renvoyé dans `next_cursor` par la page précédente
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Champs à renvoyer, ex. id,title,available_copies (seules ces colonnes sont lues)
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: Relations à intégrer (categories) ; champs via fields[categories]=id,name
+    responses:
+      200:
+        description: Une page d'ebooks et le curseur de la page suivante
+      400:
+        description: Paramètres de pagination, champs ou relations invalides
+    """
+    try:
+        fields, include = ebook_schema.selection(request.args)
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor = decode_cursor(cursor, datetime, int)
+    except (InvalidPageRequest, UnknownFields) as e:
+        return jsonify({"msg": str(e)}), 400
+
+    key = (Ebook.uploaded_at, Ebook.id)
+    ebooks, next_cursor = keyset_page(
+        ebook_schema.select(fields, *key, include=include), key, limit, cursor)
+    return jsonify({
+        'ebooks': ebook_schema.dump_many(ebooks, fields, include),
+        'next_cursor': next_cursor
+    }), 200
+
+
+# Recherche plein texte
+@ebook_bp.route('/ebooks/search', methods=['GET'])
+@catalog_conditional(stock=STOCK_ALL)
+@catalog_cached('ebooks', stock=STOCK_ALL)
+def search_ebooks_route():
+    """
+    Rechercher des ebooks par titre, auteur et description
     ---
     tags:
       - Ebooks
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Termes recherchés (correspondance par préfixe)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+      - name: cursor
+        in: query
+        type: string
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+      - name: include
+        in: query
+        type: string
+        required: false
     responses:
       200:
-        description: Une liste d'ebooks
+        description: Résultats classés par pertinence (BM25 sur SQLite)
+      400:
+        description: Requête de recherche manquante, pagination, champs ou relations invalides
     """
-    ebooks = Ebook.query.all()
-    return jsonify({'ebooks': [
-        {
-            'id': ebook.id,
-            'title': ebook.title,
-            'author': ebook.author,
-            'description': ebook.description,
-            'file_path': ebook.file_path,
-            'total_copies': ebook.total_copies,
-            'available_copies': ebook.available_copies,
-            'uploaded_at': ebook.uploaded_at
-        } for ebook in ebooks
-    ]}), 200
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"msg": "Le paramètre 'q' est requis"}), 400
+
+    try:
+        fields, include = ebook_schema.selection(request.args)
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor = decode_cursor(cursor, float, int)
+    except (InvalidPageRequest, UnknownFields) as e:
+        return jsonify({"msg": str(e)}), 400
+
+    ebooks, scores, next_cursor = search_ebooks(q, limit, cursor, fields, include)
+    dumped = ebook_schema.dump_many(ebooks, fields, include)
+    return jsonify({
+        'ebooks': [dict(data, score=-scores[ebook.id])
+                   for ebook, data in zip(ebooks, dumped)],
+        'next_cursor': next_cursor
+    }), 200
 
 
 # Récupérer un ebook par ID
 @ebook_bp.route('/ebooks/<int:ebook_id>', methods=['GET'])
+@catalog_conditional(stock='ebook_id')
+@catalog_cached('ebook:{ebook_id}', stock='ebook_id')
 def get_ebook(ebook_id):
     """
     Récupérer un ebook par son ID
@@ -136,26 +280,32 @@ def get_ebook(ebook_id):
         type: integer
         required: true
         description: ID de l'ebook à récupérer
+      - name: fields
+        in: query
+        type: string
+        required: false
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: Relations à intégrer (categories)
     responses:
       200:
         description: Détails de l'ebook
+      400:
+        description: Champs ou relations invalides
     """
+    try:
+        fields, include = ebook_schema.selection(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
     ebook = Ebook.query.get_or_404(ebook_id)
-    return jsonify({
-        'id': ebook.id,
-        'title': ebook.title,
-        'author': ebook.author,
-        'description': ebook.description,
-        'file_path': ebook.file_path,
-        'total_copies': ebook.total_copies,
-        'available_copies': ebook.available_copies,
-        'uploaded_at': ebook.uploaded_at
-    }), 200
+    return jsonify(ebook_schema.dump(ebook, fields, include)), 200
 
 
 # Mettre à jour un ebook
 @ebook_bp.route('/ebooks/<int:ebook_id>', methods=['PUT'])
-@jwt_required()
+@admin_required()
 def update_ebook(ebook_id):
     """
     Mettre à jour un ebook (Admin requis)
@@ -183,11 +333,9 @@ def update_ebook(ebook_id):
     responses:
       200:
         description: Ebook mis à jour avec succès
+      409:
+        description: Un ebook de ce titre et de cet auteur existe déjà
     """
-    err = _require_admin()
-    if err:
-        return err
-
     ebook = Ebook.query.get_or_404(ebook_id)
     data = request.get_json()
 
@@ -201,20 +349,18 @@ def update_ebook(ebook_id):
     ebook.uploaded_at = data.get('uploaded_at', ebook.uploaded_at)
 
     try:
+        bump_catalog_version()
+        # réponse construite avant le commit, qui expire l'instance
+        dumped = ebook_schema.dump(ebook)
         db.session.commit()
+        invalidate_catalog('ebooks', f'ebook:{ebook_id}')
         return jsonify({
             "msg": "Ebook mis à jour avec succès",
-            "ebook": {
-                'id': ebook.id,
-                'title': ebook.title,
-                'author': ebook.author,
-                'description': ebook.description,
-                'file_path': ebook.file_path,
-                'total_copies': ebook.total_copies,
-                'available_copies': ebook.available_copies,
-                'uploaded_at': ebook.uploaded_at
-            }
+            "ebook": dumped
         }), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "Un ebook de ce titre et de cet auteur existe déjà"}), 409
     except Exception as e:
         db.session.rollback()
         print("Erreur mise à jour ebook:", e)
@@ -223,7 +369,7 @@ def update_ebook(ebook_id):
 
 # Supprimer un ebook
 @ebook_bp.route('/ebooks/<int:ebook_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required()
 def delete_ebook(ebook_id):
     """
     Supprimer un ebook (Admin requis)
@@ -241,15 +387,13 @@ def delete_ebook(ebook_id):
       200:
         description: Ebook supprimé avec succès
     """
-    err = _require_admin()
-    if err:
-        return err
-
     ebook = Ebook.query.get_or_404(ebook_id)
 
     try:
         db.session.delete(ebook)
+        bump_catalog_version()
         db.session.commit()
+        invalidate_catalog('ebooks', f'ebook:{ebook_id}')
         return jsonify({"msg": "Ebook supprimé avec succès"}), 200
     except Exception as e:
         db.session.rollback()
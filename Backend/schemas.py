@@ -0,0 +1,21 @@
+from models import Category, Ebook, Loan, User
+from utils.serializers import Field, Schema
+
+# Representation JSON de chaque modele dans les reponses de l API
+# (utils/serializers.py : fonctions compilees, ?fields=, ?include=, dates ISO)
+
+category_schema = Schema(Category, 'id', 'name',
+                         Field('description', default=''))
+
+# jamais le hash du mot de passe ni token_version
+user_schema = Schema(User, 'id', 'username', 'email', 'is_admin',
+                     'created_at')
+
+ebook_schema = Schema(Ebook, 'id', 'title', 'author', 'description',
+                      'file_path', 'total_copies', 'available_copies',
+                      'uploaded_at',
+                      includes={'categories': category_schema})
+
+loan_schema = Schema(Loan, 'id', 'user_id', 'ebook_id', 'loan_date',
+                     'due_date', 'return_date', 'is_returned',
+                     includes={'ebook': ebook_schema, 'user': user_schema})
@@ -7,15 +7,38 @@ from app import create_app
 from config import db 
 from models import User, Ebook, Category, Loan 
 
+# Nombre maximal de requêtes SQL par endpoint : un dépassement (N+1, relecture
+# après commit...) fait échouer le test concerné (QueryBudgetExceeded).
+# ?include= ajoute une requête par relation, quelle que soit la page
+QUERY_BUDGETS = {
+    'user_bp.login': 2,
+    'user_bp.get_users': 2,
+    'user_bp.update_user': 3,
+    'ebook_bp.get_ebooks': 2 + 1,
+    'ebook_bp.get_ebook': 2 + 1,
+    'ebook_bp.search_ebooks_route': 3 + 1,
+    'ebook_bp.create_ebook': 4,
+    'ebook_bp.update_ebook': 5,
+    'category_bp.get_categories': 2,
+    'loan_bp.get_loans': 2 + 2,
+    'loan_bp.get_loan': 2 + 2,
+    'loan_bp.get_user_loans': 2 + 2,
+    'loan_bp.create_loan': 5,
+    'loan_bp.update_loan': 6,
+}
+
 class TestBackend(unittest.TestCase):
     """Tests complets pour le backend E-Lib""" 
     
     def setUp(self):
         """Configuration initiale pour chaque test""" 
-        self.app = create_app() 
-        self.app.config['TESTING'] = True 
-        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:' 
-        self.app.config['WTF_CSRF_ENABLED'] = False 
+        self.app = create_app({
+            'TESTING': True, 
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 
+            'WTF_CSRF_ENABLED': False, 
+            'BCRYPT_LOG_ROUNDS': 4,
+            'QUERY_BUDGETS': QUERY_BUDGETS,
+        }) 
         self.client = self.app.test_client() 
         with self.app.app_context():
             db.create_all() 
@@ -176,6 +199,222 @@ class TestBackend(unittest.TestCase):
         data = json.loads(response.data) 
         self.assertEqual(len(data['ebooks']), 2) 
     
+    def test_get_books_cursor_pagination(self):
+        """Test: Pagination par curseur de la liste des livres"""
+        response = self.client.get('/api/ebooks?limit=1')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(data['ebooks']), 1)
+        self.assertIsNotNone(data['next_cursor'])
+        first_id = data['ebooks'][0]['id']
+
+        response = self.client.get(f"/api/ebooks?limit=1&cursor={data['next_cursor']}")
+        data = json.loads(response.data)
+        self.assertEqual(len(data['ebooks']), 1)
+        self.assertNotEqual(data['ebooks'][0]['id'], first_id)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_get_books_invalid_cursor(self):
+        """Test: Curseur de pagination invalide"""
+        response = self.client.get('/api/ebooks?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/ebooks?limit=abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_books(self):
+        """Test: Recherche plein texte sur titre, auteur et description"""
+        response = self.client.get('/api/ebooks/search?q=another')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([b['title'] for b in data['ebooks']], ['Test Book 2'])
+
+        response = self.client.get('/api/ebooks/search?q=test&limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(len(data['ebooks']), 1)
+        response = self.client.get(f"/api/ebooks/search?q=test&limit=1&cursor={data['next_cursor']}")
+        data = json.loads(response.data)
+        self.assertEqual(len(data['ebooks']), 1)
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get('/api/ebooks/search')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_index_follows_writes(self):
+        """Test: L'index de recherche suit les créations, mises à jour et suppressions"""
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        self.client.put('/api/ebooks/1',
+            data=json.dumps({'title': 'Zoologie marine'}),
+            content_type='application/json',
+            headers=headers
+        )
+        data = json.loads(self.client.get('/api/ebooks/search?q=zoolog').data)
+        self.assertEqual([b['id'] for b in data['ebooks']], [1])
+
+        self.client.delete('/api/ebooks/1', headers=headers)
+        data = json.loads(self.client.get('/api/ebooks/search?q=zoologie').data)
+        self.assertEqual(data['ebooks'], [])
+
+    def test_autogenerate_keeps_search_index(self):
+        """Test: L'autogenerate d'alembic ne supprime pas les tables ebooks_fts"""
+        from alembic.autogenerate import compare_metadata
+        from alembic.migration import MigrationContext
+        from utils.search import include_migration_object
+        with self.app.app_context(), db.engine.connect() as connection:
+            tables = {name for name, in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertIn('ebooks_fts_data', tables)
+            removed = lambda context: [
+                op[1].name for op in compare_metadata(context, db.metadata)
+                if op[0] == 'remove_table']
+            self.assertIn('ebooks_fts', removed(MigrationContext.configure(connection)))
+            self.assertEqual(removed(MigrationContext.configure(connection, opts={
+                'include_object': include_migration_object})), [])
+
+    def test_catalog_conditional_get(self):
+        """Test: ETag / If-None-Match sur le catalogue"""
+        response = self.client.get('/api/ebooks/1')
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+        response = self.client.get('/api/ebooks/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Une écriture sur le catalogue invalide l'ETag
+        token = self.get_auth_token()
+        self.client.put('/api/ebooks/1',
+            data=json.dumps({'title': 'Nouveau titre'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response = self.client.get('/api/ebooks/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+        # Last-Modified pour les vues sans stock seulement
+        self.assertIsNone(response.headers.get('Last-Modified'))
+        self.assertIsNotNone(self.client.get('/api/categories').headers.get('Last-Modified'))
+
+    def test_catalog_etag_changes_on_loan(self):
+        """Test: Un emprunt modifie available_copies, donc l'ETag du catalogue"""
+        etag = self.client.get('/api/ebooks').headers.get('ETag')
+        token = self.get_auth_token('user1@elib.com', 'user123')
+        self.client.post('/api/loans',
+            data=json.dumps({'ebook_id': 1}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response = self.client.get('/api/ebooks', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_revalidation_does_not_scan_ebooks(self):
+        """Test: Le 304 des listes : aucune requête en cache, stock_shards sinon"""
+        from sqlalchemy import event
+        etags = {url: self.client.get(url).headers['ETag']
+                 for url in ('/api/ebooks', '/api/ebooks/search?q=test')}
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            for url, etag in etags.items():
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304, url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        # réponses en cache : 304 validé en mémoire, sans requête
+        self.assertEqual(statements, [])
+
+        # sans cache : le valideur lit stock_shards, jamais la table ebooks
+        self.app.extensions['catalog_cache'].clear()
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            for url, etag in etags.items():
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304, url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertTrue(statements)
+        self.assertFalse([s for s in statements if 'ebooks' in s])
+
+    def test_loan_updates_stock_version_not_catalog_state(self):
+        """Test: Emprunt et retour ne changent que le stock de leur livre"""
+        from models import CatalogState
+        self.client.get('/api/ebooks/2')
+        etags = {url: self.client.get(url).headers['ETag']
+                 for url in ('/api/ebooks', '/api/ebooks/1', '/api/ebooks/2', '/api/categories')}
+        with self.app.app_context():
+            state = db.session.query(CatalogState.version).scalar()
+
+        token = self.get_auth_token('user1@elib.com', 'user123')
+        headers = {'Authorization': f'Bearer {token}'}
+        loan_id = self.client.post('/api/loans', json={'ebook_id': 1},
+                                   headers=headers).get_json()['loan']['id']
+        with self.app.app_context():
+            self.assertEqual(db.session.query(CatalogState.version).scalar(), state)
+            self.assertEqual(db.session.get(Ebook, 1).stock_version, 1)
+            from models import StockShard
+            self.assertEqual(db.session.query(db.func.sum(StockShard.version)).scalar(), 1)
+
+        for url, fresh in (('/api/ebooks', False), ('/api/ebooks/1', False),
+                           ('/api/ebooks/2', True), ('/api/categories', True)):
+            response = self.client.get(url, headers={'If-None-Match': etags[url]})
+            self.assertEqual(response.status_code, 304 if fresh else 200, url)
+        # l'entrée en cache de l'ebook 2 reste valable, celle de l'ebook 1 non
+        self.assertEqual(self.client.get('/api/ebooks/2').headers['X-Cache'], 'HIT')
+        response = self.client.get('/api/ebooks/1')
+        self.assertEqual(response.get_json()['available_copies'], 4)
+
+        etag = response.headers['ETag']
+        self.client.put(f'/api/loans/{loan_id}', headers=headers)
+        response = self.client.get('/api/ebooks/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['available_copies'], 5)
+        with self.app.app_context():
+            self.assertEqual(db.session.query(CatalogState.version).scalar(), state)
+
+    def test_catalog_read_cache(self):
+        """Test: Cache des lectures du catalogue et invalidation à l'écriture"""
+        self.assertEqual(self.client.get('/api/ebooks/1').headers['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/ebooks/1').headers['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/api/ebooks/2').headers['X-Cache'], 'MISS')
+
+        token = self.get_auth_token()
+        self.client.put('/api/ebooks/1',
+            data=json.dumps({'title': 'Titre en cache'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response = self.client.get('/api/ebooks/1')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.data)['title'], 'Titre en cache')
+
+        stats = self.app.extensions['catalog_cache'].stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['invalidations'], 1)
+
+    def test_catalog_cache_lru_eviction(self):
+        """Test: Le cache du catalogue reste borné"""
+        from utils.catalog_cache import CatalogCache
+        cache = CatalogCache(max_entries=2, ttl=60)
+        cache.set('a', 'A', ('ebooks',))
+        cache.set('b', 'B', ('ebooks',))
+        cache.get('a')
+        cache.set('c', 'C', ('categories',))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'A')
+        cache.invalidate('categories')
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        # invalidé pendant le calcul de la valeur : pas mis en cache
+        generations = cache.generations(('ebooks',))
+        cache.invalidate('ebooks')
+        cache.set('d', 'D', ('ebooks',), generations)
+        self.assertIsNone(cache.get('d'))
+        token = self.get_auth_token()
+        text = self.client.get('/metrics', headers={'Authorization': f'Bearer {token}'}).data.decode()
+        self.assertIn('catalog_cache_evictions_total 0', text)
+
     def test_get_single_book(self):
         """Test: Récupération d'un livre spécifique""" 
         response = self.client.get('/api/ebooks/1') 
@@ -247,6 +486,132 @@ class TestBackend(unittest.TestCase):
         response = self.client.get('/api/ebooks/1') 
         self.assertEqual(response.status_code, 404) 
     
+    def test_import_books_csv(self):
+        """Test: Import en masse CSV avec upsert et rapport d'erreurs"""
+        self.app.config['IMPORT_BATCH_SIZE'] = 2
+        token = self.get_auth_token()
+        feed = (
+            "title,author,description,total_copies\n"
+            "Nouveau Livre,Auteur A,Premier,4\n"
+            "Test Book 1,Author 1,Description importée,7\n"
+            ",Sans Titre,,1\n"
+            "Autre Livre,Auteur B,,abc\n"
+            "Dernier Livre,Auteur C,,2\n"
+        )
+        response = self.client.post('/api/ebooks/import',
+            data=feed,
+            content_type='text/csv',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['created'], data['updated'], data['failed']), (2, 1, 2))
+        self.assertEqual([e['line'] for e in data['errors']], [4, 5])
+
+        with self.app.app_context():
+            self.assertEqual(Ebook.query.count(), 4)
+            book = Ebook.query.get(1)
+            self.assertEqual(book.description, 'Description importée')
+            self.assertEqual(book.total_copies, 7)
+
+    def test_import_books_jsonl(self):
+        """Test: Import en masse JSON Lines"""
+        token = self.get_auth_token()
+        feed = (
+            '{"title": "Livre JSON", "author": "Auteur J", "total_copies": 2}\n'
+            'pas du json\n'
+        )
+        response = self.client.post('/api/ebooks/import',
+            data=feed,
+            content_type='application/x-ndjson',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual((data['created'], data['failed']), (1, 1))
+        data = json.loads(self.client.get('/api/ebooks/search?q=json').data)
+        self.assertEqual(data['ebooks'][0]['available_copies'], 2)
+
+    def test_import_books_keeps_open_loans(self):
+        """Test: L'import recalcule le stock d'un existant à partir des prêts en cours"""
+        with self.app.app_context():
+            book = Ebook.query.get(1)
+            book.available_copies -= 2
+            for user_id in (1, 2):
+                db.session.add(Loan(user_id=user_id, ebook_id=1,
+                                    due_date=datetime.utcnow() + timedelta(days=14)))
+            db.session.commit()
+        token = self.get_auth_token()
+        feed = (
+            "title,author,total_copies,available_copies\n"
+            "Test Book 1,Author 1,5,5\n"
+            "Test Book 2,Author 2,,9\n"
+        )
+        response = self.client.post('/api/ebooks/import',
+            data=feed,
+            content_type='text/csv',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual((data['updated'], data['failed']), (2, 0))
+        with self.app.app_context():
+            book = Ebook.query.get(1)
+            self.assertEqual((book.total_copies, book.available_copies), (5, 3))
+            self.assertEqual(book.stock_version, 1)
+            # sans total_copies, available_copies du flux est ignoré
+            self.assertEqual(Ebook.query.get(2).available_copies, 2)
+
+        # moins d'exemplaires que de prêts en cours : ligne rejetée
+        response = self.client.post('/api/ebooks/import',
+            data="title,author,total_copies\nTest Book 1,Author 1,1\n",
+            content_type='text/csv',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual((data['updated'], data['failed']), (0, 1))
+        self.assertIn('prêts en cours', data['errors'][0]['errors'][0])
+        with self.app.app_context():
+            self.assertEqual(Ebook.query.get(1).total_copies, 5)
+
+    def test_import_lookup_uses_natural_key_index(self):
+        """Test: (title, author) unique et indexé : pas de doublon, pas de parcours"""
+        from sqlalchemy import select, text, tuple_
+        with self.app.app_context():
+            lookup = (select(Ebook.id)
+                      .where(tuple_(Ebook.title, Ebook.author).in_([('Test Book 1', 'Author 1')]))
+                      .compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(row[-1] for row in db.session.execute(
+                text(f'EXPLAIN QUERY PLAN {lookup}')))
+            self.assertIn('uq_ebooks_title_author', plan)
+            self.assertNotIn('SCAN ebooks', plan)
+
+            # ligne créée entre la recherche et l'écriture : mise à jour, pas de doublon
+            from utils.ebook_import import _UPSERT
+            db.session.execute(_UPSERT, [{
+                'title': 'Test Book 1', 'author': 'Author 1', 'description': None,
+                'cover_image': None, 'file_path': None, 'total_copies': 4,
+                'available_copies': None, 'uploaded_at': datetime.utcnow()}])
+            db.session.commit()
+            self.assertEqual(Ebook.query.filter_by(title='Test Book 1').count(), 1)
+            book = db.session.get(Ebook, 1)
+            self.assertEqual((book.total_copies, book.available_copies, book.description),
+                             (4, 4, 'A test book'))
+
+        token = self.get_auth_token()
+        response = self.client.post('/api/ebooks',
+            json={'title': 'Test Book 1', 'author': 'Author 1'},
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_import_books_requires_admin(self):
+        """Test: L'import en masse est réservé aux administrateurs"""
+        token = self.get_auth_token('user1@elib.com', 'user123')
+        response = self.client.post('/api/ebooks/import',
+            data='title,author\nA,B\n',
+            content_type='text/csv',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 403)
+
     # Category tests 
     def test_get_all_categories(self):
         """Test: Récupération de toutes les catégories""" 
@@ -353,8 +718,336 @@ class TestBackend(unittest.TestCase):
         response = self.client.get('/api/loans', headers=headers) 
         self.assertEqual(response.status_code, 200) 
         data = json.loads(response.data) 
-        self.assertGreaterEqual(len(data['loans']), 1) 
-    
+        self.assertGreaterEqual(len(data['loans']), 1)
+
+    def add_loans(self):
+        """Ajoute un prêt rendu et un prêt échu à l'utilisateur 2"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            db.session.add_all([
+                Loan(user_id=2, ebook_id=1, loan_date=now - timedelta(days=30),
+                     due_date=now - timedelta(days=16), return_date=now - timedelta(days=20),
+                     is_returned=True),
+                Loan(user_id=2, ebook_id=1, loan_date=now - timedelta(days=20),
+                     due_date=now - timedelta(days=6), is_returned=False),
+            ])
+            db.session.commit()
+
+    def test_loan_listing_status_filters(self):
+        """Test: Filtres status / échéance des listes de prêts"""
+        self.add_loans()
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+
+        def ids(query, url='/api/loans'):
+            response = self.client.get(url + query, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            return [loan['id'] for loan in response.get_json()['loans']]
+
+        self.assertEqual(ids('?status=active'), [1, 3])
+        self.assertEqual(ids('?status=returned'), [2])
+        self.assertEqual(ids('?status=overdue'), [3])
+        due = (datetime.utcnow() - timedelta(days=10)).isoformat()
+        self.assertEqual(ids(f'?due_before={due}'), [2])
+        self.assertEqual(ids(f'?due_after={due}&sort=-due_date'), [1, 3])
+        self.assertEqual(ids('?status=overdue', '/api/users/2/loans'), [3])
+        self.assertEqual(ids('?status=active', '/api/users/1/loans'), [])
+
+        for query in ('?status=late', '?sort=title', '?due_before=demain', '?limit=0'):
+            response = self.client.get('/api/loans' + query, headers=headers)
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_loan_listing_sort_and_cursor(self):
+        """Test: Tri et pagination par curseur des prêts"""
+        self.add_loans()
+        token = self.get_auth_token('user1@elib.com', 'user123')
+        headers = {'Authorization': f'Bearer {token}'}
+        seen = []
+        url = '/api/loans?sort=-loan_date&limit=2'
+        while url:
+            data = self.client.get(url, headers=headers).get_json()
+            seen += [loan['id'] for loan in data['loans']]
+            url = data['next_cursor'] and \
+                f"/api/loans?sort=-loan_date&limit=2&cursor={data['next_cursor']}"
+        self.assertEqual(seen, [1, 3, 2])
+
+        response = self.client.get('/api/users/2/loans?sort=due_date&limit=1', headers=headers)
+        data = response.get_json()
+        self.assertEqual([loan['id'] for loan in data['loans']], [2])
+        response = self.client.get(
+            f"/api/users/2/loans?sort=due_date&limit=1&cursor={data['next_cursor']}",
+            headers=headers)
+        self.assertEqual([loan['id'] for loan in response.get_json()['loans']], [3])
+
+    def test_loan_listing_queries_use_indexes(self):
+        """Test: Les filtres des listes de prêts sont servis par un index"""
+        with self.app.app_context():
+            plan = self.explain(Loan.query.filter(Loan.return_date.isnot(None))
+                                .order_by(Loan.due_date, Loan.id))
+            self.assertIn('ix_loans_due_date_id', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+            plan = self.explain(Loan.query.order_by(Loan.loan_date.desc(), Loan.id.desc()))
+            self.assertIn('ix_loans_loan_date_id', plan)
+            plan = self.explain(Loan.query.filter_by(user_id=2)
+                                .order_by(Loan.due_date, Loan.id))
+            self.assertIn('ix_loans_user_id_due_date_id', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+            # tri par défaut (id) des prêts en cours et des prêts d'un utilisateur
+            plan = self.explain(Loan.query.filter(Loan.return_date.is_(None))
+                                .order_by(Loan.id))
+            self.assertIn('ix_loans_open_id', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+            plan = self.explain(Loan.query.filter_by(user_id=2).order_by(Loan.id))
+            self.assertIn('ix_loans_user_id_id', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_sqlite_engine_profile_pragmas(self):
+        """Test: Les connexions SQLite reçoivent WAL, busy_timeout et caches"""
+        from utils.engine_profiles import sqlite_settings
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'wal.db')}",
+                              'AUTO_CREATE_SCHEMA': False, 'METRICS_ENABLED': False})
+            with app.app_context():
+                settings = sqlite_settings(db.engine)
+                db.engine.dispose()
+        self.assertEqual(settings['journal_mode'], 'wal')
+        self.assertEqual(settings['busy_timeout'], 5000)
+        self.assertEqual(settings['synchronous'], 1)  # NORMAL
+        self.assertEqual(settings['mmap_size'], 256 * 1024 ** 2)
+        self.assertEqual(settings['cache_size'], -65536)
+
+    def test_postgresql_pool_sized_from_workers(self):
+        """Test: Le pool PostgreSQL suit les threads par worker, sous le budget de connexions"""
+        from utils.engine_profiles import engine_options
+        config = dict(self.app.config, SQLALCHEMY_DATABASE_URI='postgresql://elib@db/elib',
+                      WEB_CONCURRENCY=4, GUNICORN_THREADS=8, DB_MAX_CONNECTIONS=40,
+                      SCHEDULER_ENABLED=True)
+        options = engine_options(config)
+        self.assertEqual((options['pool_size'], options['max_overflow']), (9, 1))
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['pool_recycle'], 1800)
+        # budget serré : 8 workers x 5 connexions au plus
+        config.update(WEB_CONCURRENCY=8, SCHEDULER_ENABLED=False)
+        options = engine_options(config)
+        self.assertEqual((options['pool_size'], options['max_overflow']), (5, 0))
+        self.assertEqual(engine_options(self.app.config), {})
+
+    def test_reads_go_to_replica_and_writers_read_their_writes(self):
+        """Test: GET sur la réplique, écritures et lectures qui suivent sur le primaire"""
+        import shutil
+        import time
+        from utils.db_routing import PIN_COOKIE, PIN_HEADER
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, replica = os.path.join(tmp, 'primary.db'), os.path.join(tmp, 'replica.db')
+            config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+                      'BCRYPT_LOG_ROUNDS': 4, 'CATALOG_CACHE_ENABLED': False,
+                      'METRICS_ENABLED': False}
+            seeded = create_app(config)
+            with seeded.app_context():
+                self.create_test_data()
+                db.engine.dispose()
+            # réplique figée à cet instant : tout ce qui suit n'existe qu'au primaire
+            shutil.copyfile(primary, replica)
+            app = create_app(dict(config, SQLALCHEMY_BINDS={'replica': f'sqlite:///{replica}'},
+                                  REPLICA_PIN_SECONDS=0.5))
+            # Flask-SQLAlchemy garde une metadata par clé de bind, partagée
+            # par les apps suivantes (drop_all du tearDown) ; le moteur est créé
+            db.metadatas.pop('replica', None)
+            with app.app_context():
+                db.session.get(Ebook, 1).title = 'Titre corrigé'
+                db.session.commit()
+
+            client = app.test_client(use_cookies=False)
+            self.assertEqual(client.get('/api/ebooks/1').get_json()['title'], 'Test Book 1')
+            # recherche : classement (text()) et lignes lus sur la réplique
+            self.assertEqual(client.get('/api/ebooks/search?q=corrig').get_json()['ebooks'], [])
+            hits = client.get('/api/ebooks/search?q=book&fields=id,title').get_json()['ebooks']
+            self.assertIn({'id': 1, 'title': 'Test Book 1'},
+                          [{k: hit[k] for k in ('id', 'title')} for hit in hits])
+
+            def login(email, password):
+                response = client.post('/api/login', json={'email': email, 'password': password})
+                return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+            user, admin = login('user1@elib.com', 'user123'), login('admin@elib.com', 'admin123')
+            response = client.post('/api/loans', json={'ebook_id': 1}, headers=user)
+            self.assertEqual(response.status_code, 201)
+            cookie = response.headers['Set-Cookie']
+            self.assertIn(PIN_COOKIE, cookie)
+            self.assertIn('SameSite=None', cookie)
+            self.assertIn('Secure', cookie)
+            pin = response.headers[PIN_HEADER]
+            loan_id = response.get_json()['loan']['id']
+
+            def loan_ids(headers):
+                response = client.get('/api/loans', headers=headers)
+                self.assertEqual(response.status_code, 200)
+                return [loan['id'] for loan in response.get_json()['loans']]
+
+            # l'auteur relit son prêt (en-tête d'épinglage répété)...
+            self.assertIn(loan_id, loan_ids(dict(user, **{PIN_HEADER: pin})))
+            # ...les autres lisent la réplique, sauf avec le cookie d'épinglage
+            self.assertNotIn(loan_id, loan_ids(user))
+            self.assertNotIn(loan_id, loan_ids(admin))
+            pinned = app.test_client()
+            pinned.set_cookie(PIN_COOKIE, pin)
+            self.assertIn(loan_id, [loan['id'] for loan in pinned.get(
+                '/api/loans', headers=admin).get_json()['loans']])
+            # échéance falsifiée (non signée) : ignorée
+            forged = {PIN_HEADER: str(time.time() + 60)}
+            self.assertNotIn(loan_id, loan_ids(dict(admin, **forged)))
+            # fin de la fenêtre : retour sur la réplique
+            time.sleep(0.6)
+            self.assertNotIn(loan_id, loan_ids(dict(user, **{PIN_HEADER: pin})))
+
+            with app.app_context():
+                # hors requête HTTP : toujours le primaire
+                self.assertEqual(db.session.get(Ebook, 1).title, 'Titre corrigé')
+                for engine in db.engines.values():
+                    engine.dispose()
+
+    def test_schema_compiles_sparse_serializers(self):
+        """Test: Schéma compilé, champs au choix, dates ISO et valeurs par défaut"""
+        from schemas import category_schema, loan_schema
+        from utils.serializers import UnknownFields
+        loan = Loan(id=7, user_id=2, ebook_id=1, loan_date=datetime(2026, 1, 31, 8, 0),
+                    due_date=datetime(2026, 2, 14, 8, 0, 0, 250000), is_returned=False)
+        self.assertEqual(loan_schema.dump(loan), {
+            'id': 7, 'user_id': 2, 'ebook_id': 1, 'loan_date': '2026-01-31T08:00:00Z',
+            'due_date': '2026-02-14T08:00:00.250000Z', 'return_date': None,
+            'is_returned': False})
+        # ordre du schéma, fonction compilée une seule fois par sélection
+        self.assertEqual(list(loan_schema.dump(loan, fields=['due_date', 'id'])),
+                         ['id', 'due_date'])
+        self.assertIs(loan_schema.serializer(['id', 'due_date']),
+                      loan_schema.serializer(['due_date', 'id']))
+        with self.assertRaises(UnknownFields):
+            loan_schema.serializer(['id', 'password'])
+        self.assertEqual(category_schema.dump(Category(id=1, name='Essais')),
+                         {'id': 1, 'name': 'Essais', 'description': ''})
+
+    def test_schema_select_reads_columns_without_entities(self):
+        """Test: Listes lues en tuples de colonnes, description lue seulement si demandée"""
+        from sqlalchemy import event
+        from schemas import ebook_schema
+        with self.app.app_context():
+            statements = []
+            listener = lambda conn, cursor, statement, *args: statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                rows = ebook_schema.select().order_by(Ebook.id).all()
+                self.assertEqual(len(db.session.identity_map), 0)
+                sparse = ebook_schema.select(['id', 'title'], Ebook.uploaded_at).all()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+            self.assertIn('description', statements[0])
+            self.assertNotIn('description', statements[1])
+            self.assertEqual(sparse[0]._fields, ('id', 'title', 'uploaded_at'))
+            self.assertEqual(ebook_schema.dump_many(rows),
+                             ebook_schema.dump_many(Ebook.query.order_by(Ebook.id)))
+
+        token = self.get_auth_token()
+        response = self.client.get('/api/loans?sort=-due_date&limit=1',
+                                   headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['loans']), 1)
+
+    def test_sparse_fields_narrow_the_select(self):
+        """Test: ?fields= limite les colonnes lues et la réponse, 400 si champ inconnu"""
+        from sqlalchemy import event
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get('/api/ebooks?fields=id,title,available_copies')
+        finally:
+            with self.app.app_context():
+                event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(response.status_code, 200)
+        ebooks = response.get_json()['ebooks']
+        self.assertEqual(list(ebooks[0]), ['id', 'title', 'available_copies'])
+        select = [s for s in statements if 'FROM ebooks' in s][0]
+        self.assertNotIn('description', select)
+        self.assertNotIn('file_path', select)
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        response = self.client.get('/api/users?fields=id,username', headers=headers)
+        self.assertEqual(response.get_json()['users'][0], {'id': 1, 'username': 'admin'})
+        for url in ('/api/ebooks?fields=id,password', '/api/ebooks?include=loans',
+                    '/api/loans?include=ebook&fields[ebook]=secret',
+                    '/api/categories?fields=nom'):
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('inconnu', response.get_json()['msg'])
+
+    def test_include_embeds_relations_with_one_query_each(self):
+        """Test: ?include= intègre ebook, user et categories, une requête par relation"""
+        from sqlalchemy import event
+        with self.app.app_context():
+            now = datetime.utcnow()
+            db.session.add_all(Loan(user_id=1 + i % 2, ebook_id=1 + i % 2, loan_date=now,
+                                    due_date=now + timedelta(days=i + 1))
+                               for i in range(6))
+            db.session.commit()
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get(
+                '/api/loans?include=ebook,user&fields[ebook]=id,title'
+                '&fields=id,due_date&sort=due_date', headers=headers)
+        finally:
+            with self.app.app_context():
+                event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(response.status_code, 200)
+        loans = response.get_json()['loans']
+        self.assertEqual(len(loans), 7)
+        # token_version du JWT, page des prêts, puis une requête IN par relation
+        self.assertEqual(len(statements), 1 + 1 + 2)
+        self.assertIn('ebooks.id IN', statements[2])
+        for loan in loans:
+            self.assertEqual(list(loan), ['id', 'due_date', 'ebook', 'user'])
+            self.assertEqual(list(loan['ebook']), ['id', 'title'])
+            self.assertTrue(loan['ebook']['title'].startswith('Test Book'))
+            self.assertNotIn('password', loan['user'])
+        self.assertEqual({loan['user']['username'] for loan in loans}, {'admin', 'user1'})
+
+        response = self.client.get('/api/loans/1?include=ebook', headers=headers)
+        self.assertEqual(response.get_json()['ebook']['title'], 'Test Book 2')
+
+        response = self.client.get('/api/ebooks?include=categories&fields[categories]=name')
+        ebooks = {ebook['title']: ebook for ebook in response.get_json()['ebooks']}
+        self.assertEqual(ebooks['Test Book 1']['categories'], [{'name': 'Fiction'}])
+        self.assertEqual(ebooks['Test Book 2']['categories'], [{'name': 'Science'}])
+        response = self.client.get('/api/ebooks/1?fields=title&include=categories')
+        self.assertEqual(response.get_json(), {
+            'title': 'Test Book 1',
+            'categories': [{'id': 1, 'name': 'Fiction', 'description': 'Fictional books'}]})
+
+    def test_json_provider_iso_dates_with_and_without_orjson(self):
+        """Test: Mêmes dates ISO avec orjson et avec json"""
+        from unittest import mock
+        import utils.serializers as serializers
+        payload = {'at': datetime(2026, 1, 31, 8, 0), 1: 'clé entière', 'nom': 'Élise'}
+        with self.app.app_context():
+            outputs = [json.loads(self.app.json.dumps(payload))]
+            with mock.patch.object(serializers, 'orjson', None):
+                outputs.append(json.loads(self.app.json.dumps(payload)))
+        for output in outputs:
+            self.assertEqual(output, {'at': '2026-01-31T08:00:00Z', '1': 'clé entière',
+                                      'nom': 'Élise'})
+
+        token = self.get_auth_token()
+        response = self.client.post('/api/loans', json={'ebook_id': 1},
+                                    headers={'Authorization': f'Bearer {token}'})
+        loan = response.get_json()['loan']
+        self.assertRegex(loan['due_date'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z$')
+        self.assertIsNone(loan['return_date'])
+
     # User management tests 
     def test_get_all_users_as_admin(self):
         """Test: Récupération de tous les utilisateurs par un admin""" 
@@ -388,7 +1081,685 @@ class TestBackend(unittest.TestCase):
         headers = {'Authorization': f'Bearer {token}'} 
         response = self.client.delete('/api/users/2', headers=headers) 
         self.assertEqual(response.status_code, 200) 
+        # son emprunt en cours est annulé et l'exemplaire rendu au stock
+        with self.app.app_context():
+            book = db.session.get(Ebook, 2)
+            self.assertEqual((book.available_copies, book.stock_version), (3, 1))
+            self.assertEqual(Loan.query.filter_by(user_id=2).count(), 0)
+
+    def test_delete_user_removes_reminder_ledger(self):
+        """Test: Les rappels des emprunts annulés sont supprimés avec eux"""
+        from models import EmailOutbox, LoanReminder
+        with self.app.app_context():
+            loan_id = Loan.query.filter_by(user_id=2).one().id
+            db.session.add(LoanReminder(loan_id=loan_id, kind='due_soon'))
+            db.session.add(EmailOutbox(idempotency_key='loan-reminder:2:abc',
+                                       recipients='user1@elib.com',
+                                       subject='Rappel', body_text='Rappel'))
+            db.session.add(EmailOutbox(idempotency_key='loan-reminder:2:old',
+                                       recipients='user1@elib.com',
+                                       subject='Rappel', body_text='Rappel',
+                                       status='sent'))
+            db.session.commit()
+        token = self.get_auth_token()
+        response = self.client.delete('/api/users/2',
+                                      headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(LoanReminder.query.count(), 0)
+            # seul l'historique des envois est conservé
+            self.assertEqual([m.idempotency_key for m in EmailOutbox.query],
+                             ['loan-reminder:2:old'])
+
+    def test_delete_user_keeps_loan_history(self):
+        """Test: Un utilisateur avec des emprunts rendus n'est pas supprimé"""
+        with self.app.app_context():
+            db.session.add(Loan(user_id=2, ebook_id=1, due_date=datetime.utcnow(),
+                                return_date=datetime.utcnow(), is_returned=True))
+            db.session.commit()
+        token = self.get_auth_token()
+        response = self.client.delete('/api/users/2',
+                                      headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 409)
+        with self.app.app_context():
+            self.assertIsNotNone(db.session.get(User, 2))
+            self.assertEqual(Loan.query.filter_by(user_id=2).count(), 2)
+            self.assertEqual(db.session.get(Ebook, 2).available_copies, 2)
     
+    def test_admin_check_uses_token_claims(self):
+        """Test: L'autorisation admin se fait sur les claims, sans lire users"""
+        from sqlalchemy import event
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        # Premier appel : la version de token est mise en cache
+        self.client.post('/api/categories',
+            data=json.dumps({'name': 'Histoire'}),
+            content_type='application/json', headers=headers)
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/api/categories',
+                data=json.dumps({'name': 'Poésie'}),
+                content_type='application/json', headers=headers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([s for s in statements if 'FROM users' in s])
+
+    def test_demoted_admin_token_revoked(self):
+        """Test: Un admin rétrogradé perd l'accès avec son ancien token"""
+        old_token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {old_token}'}
+        self.assertEqual(self.client.get('/api/users', headers=headers).status_code, 200)
+
+        response = self.client.put('/api/users/1',
+            data=json.dumps({'is_admin': False}),
+            content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/users', headers=headers).status_code, 401)
+
+        new_token = self.get_auth_token()
+        response = self.client.get('/api/users', headers={'Authorization': f'Bearer {new_token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_deleted_user_token_revoked(self):
+        """Test: Le token d'un utilisateur supprimé est refusé"""
+        user_token = self.get_auth_token('user1@elib.com', 'user123')
+        admin_token = self.get_auth_token()
+        self.client.delete('/api/users/2', headers={'Authorization': f'Bearer {admin_token}'})
+        response = self.client.get('/api/loans', headers={'Authorization': f'Bearer {user_token}'})
+        self.assertEqual(response.status_code, 401)
+        # L'exemplaire emprunté par l'utilisateur supprimé est rendu
+        data = json.loads(self.client.get('/api/ebooks/2').data)
+        self.assertEqual(data['available_copies'], 3)
+
+    def test_user_cannot_promote_self(self):
+        """Test: Un utilisateur ne peut pas se donner le rôle admin"""
+        token = self.get_auth_token('user1@elib.com', 'user123')
+        response = self.client.put('/api/users/2',
+            data=json.dumps({'is_admin': True}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_login_rehashes_on_cost_change(self):
+        """Test: Re-hachage transparent quand le facteur bcrypt change"""
+        import bcrypt
+        with self.app.app_context():
+            user = User.query.get(2)
+            user.password = bcrypt.hashpw(b'user123', bcrypt.gensalt(5)).decode()
+            db.session.commit()
+        self.get_auth_token('user1@elib.com', 'user123')
+        with self.app.app_context():
+            self.assertTrue(User.query.get(2).password.startswith('$2b$04$'))
+        self.assertEqual(self.app.extensions['password_hasher'].stats()['rehashed'], 1)
+
+    def test_password_hasher_rejects_when_saturated(self):
+        """Test: Le pool bcrypt refuse au lieu d'empiler quand il est plein"""
+        from utils.password_hasher import HashingBusy, PasswordHasher
+        hasher = PasswordHasher(rounds=4, max_concurrency=1, max_queue=0,
+                                queue_timeout=0.05)
+        self.assertTrue(hasher.verify('secret', hasher.hash('secret')))
+        hasher._admission.acquire()
+        with self.assertRaises(HashingBusy):
+            hasher.hash('secret')
+        self.assertEqual(hasher.stats()['rejected'], 1)
+
+    def test_login_returns_503_when_hasher_busy(self):
+        """Test: Connexion refusée proprement (503) sous saturation"""
+        hasher = self.app.extensions['password_hasher']
+        hasher.queue_timeout = 0.01
+        for _ in range(hasher.max_concurrency + hasher.max_queue):
+            hasher._admission.acquire()
+        response = self.client.post('/api/login',
+            data=json.dumps({'email': 'admin@elib.com', 'password': 'admin123'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    def explain(self, query):
+        """Plan SQLite (EXPLAIN QUERY PLAN) d'une requête SQLAlchemy"""
+        with self.app.app_context():
+            compiled = query.statement.compile(dialect=db.engine.dialect)
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            with db.engine.connect() as conn:
+                rows = conn.exec_driver_sql(
+                    'EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+        return ' | '.join(row[-1] for row in rows)
+
+    def test_loan_queries_use_indexes(self):
+        """Test: Les requêtes chaudes sur les prêts utilisent un index"""
+        with self.app.app_context():
+            # deux index commencent par user_id : l'un ou l'autre convient
+            plan = self.explain(Loan.query.filter_by(user_id=2))
+            self.assertRegex(plan, r'INDEX ix_loans_user_id_\w+ \(user_id=\?\)')
+            plan = self.explain(Loan.query.filter_by(user_id=2, is_returned=False))
+            self.assertIn('ix_loans_user_id_is_returned', plan)
+            plan = self.explain(Loan.query.filter_by(ebook_id=1))
+            self.assertIn('ix_loans_ebook_id', plan)
+            # Requête des rappels (utils/check_expired_loans.py)
+            plan = self.explain(Loan.query.filter(
+                Loan.return_date.is_(None),
+                Loan.due_date <= datetime.utcnow() + timedelta(days=2)))
+            self.assertIn('ix_loans_open_due_date', plan)
+
+    def test_ebook_category_queries_use_indexes(self):
+        """Test: La table d'association est indexée dans les deux sens"""
+        from models import ebook_category
+        with self.app.app_context():
+            plan = self.explain(db.session.query(ebook_category).filter_by(category_id=1))
+            self.assertIn('ix_ebook_category_category_id_ebook_id', plan)
+            plan = self.explain(db.session.query(ebook_category).filter_by(ebook_id=1))
+            self.assertIn('ix_ebook_category_ebook_id_category_id', plan)
+
+    def test_migrations_upgrade_and_downgrade(self):
+        """Test: La chaîne de migrations s'applique et se défait"""
+        from flask_migrate import downgrade, upgrade
+        from sqlalchemy import inspect
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'TESTING': True,
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'm.db'),
+            })
+            with app.app_context():
+                db.drop_all()
+                upgrade(directory=directory)
+                indexes = {i['name'] for i in inspect(db.engine).get_indexes('loans')}
+                self.assertIn('ix_loans_open_due_date', indexes)
+                downgrade(directory=directory, revision='base')
+                self.assertFalse(inspect(db.engine).has_table('loans'))
+                db.engine.dispose()
+
+    def test_seed_synthetic_command(self):
+        """Test: Chargement synthétique cohérent (copies, prêts, recherche)"""
+        from sqlalchemy import func
+        result = self.app.test_cli_runner().invoke(args=[
+            'seed-synthetic', '--reset', '--users', '50', '--ebooks', '200',
+            '--categories', '5', '--loans', '1000'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with self.app.app_context():
+            self.assertEqual(User.query.count(), 50)
+            self.assertEqual(Loan.query.count(), 1000)
+            self.assertTrue(db.session.get(User, 1).is_admin)
+            # copies disponibles = total - prêts en cours, pour chaque livre
+            open_loans = dict(db.session.query(Loan.ebook_id, func.count())
+                              .filter(Loan.return_date.is_(None))
+                              .group_by(Loan.ebook_id).all())
+            self.assertTrue(open_loans)
+            for ebook in Ebook.query.all():
+                self.assertEqual(ebook.available_copies,
+                                 ebook.total_copies - open_loans.get(ebook.id, 0))
+        response = self.client.get('/api/ebooks/search?q=atlas')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['ebooks'])
+
+        # Base non vide sans --reset : refus
+        result = self.app.test_cli_runner().invoke(args=['seed-synthetic'])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_synthetic_data_is_deterministic(self):
+        """Test: Même graine, mêmes lignes ; popularité non uniforme"""
+        import random
+        from collections import Counter
+        from utils.synthetic_data import generate_loans
+        now = datetime(2026, 1, 1)
+
+        def loans(seed):
+            return list(generate_loans(random.Random(seed), 2000, 100, [3] * 500,
+                                       now, 0.9, 0.1, 0.3, 365))
+        self.assertEqual(loans(1), loans(1))
+        self.assertNotEqual(loans(1), loans(2))
+        per_ebook = Counter(row[2] for row in loans(1)).most_common()
+        self.assertGreater(per_ebook[0][1], 10 * per_ebook[-1][1])
+
+    def test_reminders_digest_over_pooled_connections(self):
+        """Test: Un rappel par utilisateur, connexions SMTP réutilisées"""
+        from utils.check_expired_loans import check_and_notify
+        from utils.email_service import SMTPConnectionPool
+        from utils.outbox import OutboxDispatcher, outbox_counts
+        from utils.smtp_sink import SMTPSink
+        now = datetime.utcnow()
+        with self.app.app_context():
+            users = [User(username=f'r{i}', email=f'r{i}@elib.com', password='x')
+                     for i in range(30)]
+            db.session.add_all(users)
+            db.session.flush()
+            for user in users:
+                for days in (-3, 1):
+                    db.session.add(Loan(user_id=user.id, ebook_id=1, loan_date=now,
+                                        due_date=now + timedelta(days=days)))
+            # échéance lointaine : pas de rappel
+            db.session.add(Loan(user_id=users[0].id, ebook_id=2, loan_date=now,
+                                due_date=now + timedelta(days=10)))
+            db.session.commit()
+
+            # Enfilés sans SMTP, une seule fois
+            self.assertEqual(check_and_notify(2)['enqueued'], 30)
+            self.assertEqual(check_and_notify(2)['loans'], 0)
+
+            with SMTPSink() as sink:
+                pool = SMTPConnectionPool('127.0.0.1', sink.port, username='elib',
+                                          password='secret', use_tls=False, size=3)
+                with OutboxDispatcher(pool, batch_size=8, workers=6) as dispatcher:
+                    report = dispatcher.drain()
+            self.assertEqual(outbox_counts(), {'sent': 30})
+
+        # user1 (prêt du jeu de test à 14 jours) n'est pas concerné
+        self.assertEqual(report['sent'], 30)
+        self.assertEqual(report['failed'], 0)
+        self.assertEqual(len(sink.messages), 30)
+        self.assertLessEqual(sink.connections, 3)
+        self.assertEqual(sink.logins, sink.connections)
+        self.assertEqual(report['connections_opened'], sink.connections)
+        from email import message_from_bytes
+        from email.header import decode_header, make_header
+        digest = message_from_bytes(sink.messages[0][2])
+        self.assertEqual(str(make_header(decode_header(digest['Subject']))),
+                         'Rappel : 2 livres à rendre')
+        self.assertIn('en retard depuis le',
+                      digest.get_payload()[0].get_payload(decode=True).decode())
+        self.assertIsNotNone(report['latency_ms']['p95'])
+
+    def test_reminders_survive_closed_sessions_and_failures(self):
+        """Test: Sessions fermées par le relais renvoyées, échecs comptés"""
+        import socket
+        from utils.email_service import SMTPConnectionPool, build_message, deliver
+        from utils.smtp_sink import SMTPSink
+        messages = [([f'u{i}@elib.com'], build_message([f'u{i}@elib.com'], 'Rappel', 'x'))
+                    for i in range(20)]
+
+        # Le relais ferme chaque session après 3 messages (421)
+        with SMTPSink(max_messages=3) as sink:
+            with SMTPConnectionPool('127.0.0.1', sink.port, use_tls=False,
+                                    size=2) as pool:
+                report = deliver(iter(messages), pool, workers=2).to_dict()
+        self.assertEqual(report['sent'], 20)
+        self.assertEqual(len(sink.messages), 20)
+        self.assertGreater(report['reconnects'], 0)
+
+        # Aucun serveur : chaque envoi échoue sans interrompre la tournée
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        with SMTPConnectionPool('127.0.0.1', port, use_tls=False, timeout=1) as pool:
+            report = deliver(iter(messages), pool, workers=4).to_dict()
+        self.assertEqual((report['sent'], report['failed']), (0, 20))
+        self.assertEqual(len(report['errors']), 20)
+
+    def test_reminder_ledger_thresholds_sent_once(self):
+        """Test: Chaque seuil de rappel n'est envoyé qu'une fois par prêt"""
+        from models import EmailOutbox, LoanReminder
+        from utils.check_expired_loans import check_and_notify
+        now = datetime(2026, 3, 1, 2, 0)
+        with self.app.app_context():
+            Loan.query.delete()
+            db.session.add_all([
+                # échéance dans 36 h
+                Loan(id=10, user_id=2, ebook_id=1, loan_date=now - timedelta(days=12),
+                     due_date=now + timedelta(hours=36)),
+                # déjà 20 jours de retard : seul le rappel le plus avancé part
+                Loan(id=11, user_id=1, ebook_id=2, loan_date=now - timedelta(days=34),
+                     due_date=now - timedelta(days=20)),
+            ])
+            db.session.commit()
+
+            def kinds(day):
+                stats = check_and_notify(2, now=now + timedelta(days=day))
+                return stats['by_kind']
+
+            self.assertEqual(kinds(0), {'due_soon': 1, 'overdue': 1})
+            self.assertEqual(kinds(0.25), {})
+            self.assertEqual(kinds(1), {'due_today': 1})
+            self.assertEqual(kinds(2), {})
+            # tournées manquées : seul le seuil le plus avancé franchi part
+            self.assertEqual(kinds(12), {'overdue': 1})
+            self.assertEqual(kinds(40), {})
+
+            self.assertEqual(
+                sorted((r.loan_id, r.kind) for r in LoanReminder.query),
+                [(10, 'due_soon'), (10, 'due_today'), (10, 'overdue'), (11, 'overdue')])
+            self.assertEqual(EmailOutbox.query.count(), 4)
+
+            # journal vidé (ex. premier déploiement) : les retards en cours
+            # reçoivent un seul rappel, pas un par seuil déjà franchi
+            LoanReminder.query.delete()
+            db.session.commit()
+            self.assertEqual(kinds(41), {'overdue': 2})
+
+    def test_reminder_incremental_query_uses_index(self):
+        """Test: La tournée incrémentale lit l'index partiel des prêts en cours"""
+        from utils.check_expired_loans import reminder_query, reminder_thresholds
+        now = datetime.utcnow()
+        with self.app.app_context():
+            plan = self.explain(reminder_query(reminder_thresholds(), now,
+                                               now - timedelta(days=1)))
+        self.assertIn('ix_loans_open_due_date', plan)
+        self.assertIn('SEARCH loan_reminders USING INDEX', plan)
+
+    def test_scheduler_runs_each_job_once_per_interval(self):
+        """Test: Une seule instance exécute une tâche par intervalle"""
+        from models import JobLease
+        from utils.scheduler import Scheduler, job_status
+        calls = []
+        now = datetime.utcnow()
+        with self.app.app_context():
+            instances = [Scheduler(owner=owner) for owner in ('web-1', 'web-2')]
+            for scheduler in instances:
+                scheduler.register('tick', 60, lambda ctx: calls.append(
+                    (ctx.scheduler.owner, ctx.started_at, ctx.lag)))
+            web1, web2 = instances
+
+            self.assertEqual(web1.run_pending(now), ['tick'])
+            self.assertEqual(web2.run_pending(now), [])
+            self.assertEqual(web2.run_pending(now + timedelta(seconds=59)), [])
+            # échéance suivante de la grille, prise par la première instance
+            self.assertEqual(web2.run_pending(now + timedelta(seconds=75)), ['tick'])
+            self.assertEqual(web1.run_pending(now + timedelta(seconds=90)), [])
+            self.assertEqual([owner for owner, _, _ in calls], ['web-1', 'web-2'])
+            self.assertAlmostEqual(calls[1][2], 15, places=3)
+
+            # intervalles manqués : pas de rattrapage en rafale
+            self.assertEqual(web1.run_pending(now + timedelta(seconds=600)), ['tick'])
+            lease = db.session.query(JobLease.next_run_at, JobLease.owner).one()
+            self.assertEqual(lease.next_run_at, now + timedelta(seconds=660))
+            self.assertIsNone(lease.owner)
+
+            status = job_status(now + timedelta(seconds=700))['tick']
+            self.assertEqual(status['runs'], 3)
+            self.assertFalse(status['running'])
+            self.assertAlmostEqual(status['lag_seconds'], 40, places=3)
+            self.assertAlmostEqual(status['last_lag_seconds'], 480, places=3)
+            self.assertIsNotNone(status['last_duration_seconds'])
+
+    def test_scheduler_started_by_gunicorn_workers_only(self):
+        """Test: create_app (CLI, tests) ne lance pas la boucle, le hook gunicorn si"""
+        import runpy
+        from types import SimpleNamespace
+        from unittest import mock
+        from utils.scheduler import Scheduler
+        hooks = runpy.run_path(os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+        with mock.patch.object(Scheduler, 'start') as start:
+            app = create_app(dict(self.app.config, SCHEDULER_ENABLED=True,
+                                  SCHEDULER_POLL_INTERVAL=7))
+            start.assert_not_called()
+            hooks['post_worker_init'](SimpleNamespace(wsgi=app))
+            start.assert_called_once_with(app, 7)
+            # désactivé : les workers ne lancent rien non plus
+            hooks['post_worker_init'](SimpleNamespace(wsgi=self.app))
+            start.assert_called_once()
+
+    def test_scheduler_resumes_from_checkpoint_after_crash(self):
+        """Test: Après l'arrêt d'une instance, une autre reprend au point de reprise"""
+        from utils.scheduler import LeaseLost, Scheduler, job_status
+        processed = []
+
+        def job(ctx):
+            for item in range(ctx.checkpoint.get('next', 0), 5):
+                if item == 2 and ctx.scheduler.owner == 'web-1':
+                    raise SystemExit  # arrêt brutal : ni commit ni libération
+                processed.append((ctx.scheduler.owner, item))
+                ctx.save({'next': item + 1})
+
+        now = datetime.utcnow()
+        with self.app.app_context():
+            web1, web2 = Scheduler(owner='web-1', lease_seconds=300), Scheduler(owner='web-2')
+            for scheduler in (web1, web2):
+                scheduler.register('batch', 3600, job)
+            with self.assertRaises(SystemExit):
+                web1.run_pending(now)
+            db.session.rollback()
+            self.assertTrue(job_status(now)['batch']['running'])
+
+            # bail encore valide : personne ne reprend
+            self.assertEqual(web2.run_pending(now + timedelta(seconds=60)), [])
+            self.assertEqual(web2.run_pending(now + timedelta(seconds=400)), ['batch'])
+            self.assertEqual(processed, [('web-1', 0), ('web-1', 1), ('web-2', 2),
+                                         ('web-2', 3), ('web-2', 4)])
+
+            # l'instance arrêtée ne peut plus écrire : son bail est perdu
+            ctx = web1.acquire(web1.jobs['batch'], now + timedelta(seconds=400))
+            self.assertIsNone(ctx)
+            from utils.scheduler import JobContext
+            stale = JobContext(web1, web1.jobs['batch'], now, now, {})
+            with self.assertRaises(LeaseLost):
+                stale.save({'next': 0})
+
+    def test_scheduler_failure_is_retried_and_reported(self):
+        """Test: Une tâche en échec est relancée après le délai et signalée"""
+        from utils.scheduler import Scheduler, job_status
+        attempts = []
+
+        def flaky(ctx):
+            attempts.append(ctx.started_at)
+            if len(attempts) == 1:
+                raise RuntimeError('relais indisponible')
+
+        now = datetime.utcnow()
+        with self.app.app_context():
+            scheduler = Scheduler(owner='web-1')
+            scheduler.register('flaky', 3600, flaky, retry_seconds=30)
+            self.assertEqual(scheduler.run_pending(now), ['flaky'])
+            status = job_status(now)['flaky']
+            self.assertEqual(status['failures'], 1)
+            self.assertIn('relais indisponible', status['last_error'])
+            self.assertIsNone(status['last_success_at'])
+            self.assertEqual(scheduler.run_pending(now + timedelta(seconds=10)), [])
+            self.assertEqual(scheduler.run_pending(now + timedelta(seconds=31)), ['flaky'])
+            status = job_status(now)['flaky']
+            self.assertEqual((status['runs'], status['failures']), (2, 1))
+            self.assertIsNone(status['last_error'])
+
+        token = self.get_auth_token()
+        text = self.client.get('/metrics', headers={'Authorization': f'Bearer {token}'}).data.decode()
+        self.assertIn('scheduler_job_failures_total{job="flaky"} 1', text)
+        self.assertIn('scheduler_job_running{job="flaky"} 0', text)
+        self.assertIn('scheduler_job_last_duration_seconds{job="flaky"}', text)
+
+    def test_scheduled_reminders_resume_window(self):
+        """Test: La tâche des rappels part de la fin de la tournée précédente"""
+        from models import EmailOutbox
+        now = datetime.utcnow()
+        with self.app.app_context():
+            Loan.query.delete()
+            db.session.add(Loan(user_id=2, ebook_id=1, loan_date=now - timedelta(days=10),
+                                due_date=now + timedelta(days=5)))
+            db.session.commit()
+            scheduler = self.app.extensions['scheduler']
+            self.assertIn('loan-reminders', scheduler.run_pending(now))
+            self.assertEqual(EmailOutbox.query.count(), 0)
+            # fenêtre suivante : (now, now + 4 j], le seuil « 2 jours » y est franchi
+            self.assertIn('loan-reminders', scheduler.run_pending(now + timedelta(days=4)))
+            self.assertEqual(EmailOutbox.query.count(), 1)
+            self.assertNotIn('loan-reminders', scheduler.run_pending(now + timedelta(days=4)))
+
+    def test_outbox_enqueue_is_transactional_and_idempotent(self):
+        """Test: L'outbox suit la transaction de l'appelant, clés uniques"""
+        from models import EmailOutbox
+        from utils.outbox import enqueue_email
+        with self.app.app_context():
+            self.assertTrue(enqueue_email(['a@elib.com'], 'Sujet', 'x',
+                                          idempotency_key='k1'))
+            db.session.rollback()
+            self.assertEqual(EmailOutbox.query.count(), 0)
+
+            self.assertTrue(enqueue_email(['a@elib.com'], 'Sujet', 'x',
+                                          idempotency_key='k1'))
+            self.assertFalse(enqueue_email(['a@elib.com'], 'Sujet', 'y',
+                                           idempotency_key='k1'))
+            enqueue_email(['b@elib.com'], 'Sans clé', 'x')
+            db.session.commit()
+            self.assertEqual(EmailOutbox.query.count(), 2)
+            self.assertEqual(EmailOutbox.query.filter_by(idempotency_key='k1')
+                             .one().body_text, 'x')
+
+    def test_outbox_backoff_and_dead_letter(self):
+        """Test: Reprises espacées, puis dead ; refus définitif immédiat"""
+        import socket
+        from models import EmailOutbox
+        from utils.email_service import SMTPConnectionPool
+        from utils.outbox import OutboxDispatcher, backoff_delay, enqueue_email
+        from utils.smtp_sink import SMTPSink
+        self.assertEqual([backoff_delay(n, 30, 100, jitter=0) for n in (1, 2, 3, 4)],
+                         [30, 60, 100, 100])
+
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        with self.app.app_context():
+            enqueue_email(['a@elib.com'], 'Relais absent', 'x')
+            db.session.commit()
+            pool = SMTPConnectionPool('127.0.0.1', port, use_tls=False, timeout=1)
+            with OutboxDispatcher(pool, max_attempts=3, backoff_base=60) as dispatcher:
+                now = datetime.utcnow()
+                self.assertEqual(dispatcher.run_once(now), 1)
+                message = EmailOutbox.query.one()
+                self.assertEqual((message.status, message.attempts), ('pending', 1))
+                self.assertGreater(message.next_attempt_at, now + timedelta(seconds=40))
+                self.assertIn('ConnectionRefusedError', message.last_error)
+                # pas encore dû
+                self.assertEqual(dispatcher.run_once(now), 0)
+                later = now + timedelta(days=1)
+                dispatcher.run_once(later)
+                dispatcher.run_once(later + timedelta(days=1))
+                db.session.expire_all()
+                message = EmailOutbox.query.one()
+                self.assertEqual((message.status, message.attempts), ('dead', 3))
+                self.assertEqual(dispatcher.run_once(later + timedelta(days=2)), 0)
+                self.assertEqual(dispatcher.stats()['dead'], 1)
+
+            enqueue_email(['refuse@elib.com'], 'Refusé', 'x')
+            enqueue_email(['ok@elib.com'], 'Accepté', 'x')
+            db.session.commit()
+            with SMTPSink(rejected={'refuse@elib.com'}) as sink:
+                pool = SMTPConnectionPool('127.0.0.1', sink.port, use_tls=False)
+                with OutboxDispatcher(pool) as dispatcher:
+                    stats = dispatcher.drain()
+            self.assertEqual((stats['sent'], stats['dead'], stats['retried']), (1, 1, 0))
+            refused = EmailOutbox.query.filter_by(subject='Refusé').one()
+            self.assertEqual((refused.status, refused.attempts), ('dead', 1))
+
+    def test_fast_startup_skips_schema_creation(self):
+        """Test: En démarrage rapide, ni create_all ni Flask-Migrate"""
+        from sqlalchemy import inspect
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'TESTING': True,
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'f.db'),
+                'FAST_STARTUP': True,
+                'AUTO_CREATE_SCHEMA': False,
+            })
+            self.assertNotIn('migrate', app.extensions)
+            with app.app_context():
+                self.assertEqual(inspect(db.engine).get_table_names(), [])
+                db.engine.dispose()
+
+    def test_api_docs_loaded_on_demand(self):
+        """Test: Flasgger n'est construit qu'à la première visite"""
+        self.assertNotIn('swagger', self.app.extensions)
+        response = self.client.get('/apispec.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/ebooks', response.get_json()['paths'])
+        self.assertIn('swagger', self.app.extensions)
+        self.assertEqual(self.client.get('/api/docs').status_code, 200)
+
+    def test_apispec_compiled_once_gzip_and_etag(self):
+        """Test: /apispec.json précompilé, compressé et conditionnel"""
+        import gzip
+        from unittest import mock
+        import api_docs
+        with mock.patch('api_docs.build_spec', wraps=api_docs.build_spec) as build:
+            first = self.client.get('/apispec.json', headers={'Accept-Encoding': 'gzip'})
+            self.client.get('/apispec.json')
+            self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', first.headers['Vary'])
+        spec = json.loads(gzip.decompress(first.data))
+        self.assertIn('/api/ebooks', spec['paths'])
+
+        etag = first.headers['ETag']
+        response = self.client.get('/apispec.json', headers={
+            'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        # représentation non compressée : autre ETag, l'ancien ne la valide pas
+        response = self.client.get('/apispec.json', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        response = self.client.get('/apispec.json', headers={
+            'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_query_budget_exceeded_fails_loudly(self):
+        """Test: Dépassement du budget de requêtes SQL d'un endpoint"""
+        from utils.query_budget import QueryBudgetExceeded
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'QUERY_BUDGETS': {'ebook_bp.get_ebooks': 0},
+        })
+        with app.app_context():
+            db.create_all()
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            app.test_client().get('/api/ebooks')
+        self.assertIn('utils/pagination.py', str(ctx.exception))
+
+    def test_n_plus_one_detected_with_call_site(self):
+        """Test: Requête répétée dans une boucle signalée comme N+1"""
+        def loans_per_book():
+            return {'counts': [len(e.loans) for e in Ebook.query.all()]}
+        self.app.add_url_rule('/n-plus-one', 'n_plus_one', loans_per_book)
+
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            response = self.client.get('/n-plus-one')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('N+1 probable', logs.output[0])
+        self.assertIn('2 x SELECT loans', logs.output[0])
+        self.assertIn('test_backend.py', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        """Test: /metrics réservé aux administrateurs, format Prometheus"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        user_token = self.get_auth_token('user1@elib.com', 'user123')
+        response = self.client.get('/metrics', headers={'Authorization': f'Bearer {user_token}'})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.get('/api/ebooks')
+        token = self.get_auth_token()
+        response = self.client.get('/metrics', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode('utf-8')
+        self.assertIn('http_requests_total{method="GET",endpoint="ebook_bp.get_ebooks",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",endpoint="ebook_bp.get_ebooks"} 1', text)
+        self.assertIn('http_requests_in_flight 1', text)  # la requête /metrics elle-même
+        self.assertIn('db_pool_checkout_wait_seconds_count', text)
+        # La liste a exécuté au moins une requête SQL, comptée pour la route
+        count_line = next(line for line in text.splitlines() if line.startswith(
+            'http_request_db_queries_sum{method="GET",endpoint="ebook_bp.get_ebooks"}'))
+        self.assertGreaterEqual(float(count_line.split()[-1]), 1)
+
+    def test_apispec_served_from_prebuilt_file(self):
+        """Test: Spec écrite par build-apispec servie sans Flasgger"""
+        from api_docs import write_prebuilt_specs
+        with tempfile.TemporaryDirectory() as tmp, self.app.app_context():
+            write_prebuilt_specs(self.app, tmp)
+            app = create_app({
+                'TESTING': True,
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                'APISPEC_PREBUILT_DIR': tmp,
+            })
+            response = app.test_client().get('/apispec.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/api/ebooks', response.get_json()['paths'])
+            self.assertNotIn('swagger', app.extensions)
+
     # Validation tests 
     def test_required_fields_validation(self):
         """Test: Validation des champs requis""" 
@@ -435,9 +1806,74 @@ class TestBackend(unittest.TestCase):
     
     def test_concurrent_loan_attempts(self):
         """Test: Tentatives d'emprunt concurrentes""" 
-        # Ce test simulerait des tentatives d'emprunt simultanées 
-        # Dans un vrai test, on utiliserait des threads 
-        pass 
+        # Emprunts simultanés d'un livre à 3 copies par 24 threads, sur une
+        # base fichier partagée : jamais plus de 3 emprunts accordés
+        import threading
+        from utils.auth import create_user_token
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'TESTING': True,
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'c.db'),
+            })
+            with app.app_context():
+                users = [User(username=f'u{i}', email=f'u{i}@elib.com', password='x')
+                         for i in range(24)]
+                book = Ebook(title='Populaire', author='A', total_copies=3,
+                             available_copies=3)
+                db.session.add_all(users + [book])
+                db.session.commit()
+                tokens = [create_user_token(u) for u in users]
+                book_id = book.id
+
+            statuses = []
+            barrier = threading.Barrier(len(tokens))
+
+            def checkout(token):
+                client = app.test_client()
+                barrier.wait()
+                response = client.post('/api/loans', json={'ebook_id': book_id},
+                                       headers={'Authorization': f'Bearer {token}'})
+                statuses.append(response.status_code)
+
+            threads = [threading.Thread(target=checkout, args=(t,)) for t in tokens]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(statuses.count(201), 3)
+            self.assertEqual(statuses.count(400), len(tokens) - 3)
+            with app.app_context():
+                self.assertEqual(db.session.get(Ebook, book_id).available_copies, 0)
+                self.assertEqual(Loan.query.count(), 3)
+                loan = Loan.query.first()
+                owner_token = tokens[[u.id for u in users].index(loan.user_id)]
+
+            # Deux retours simultanés du même prêt : une seule copie rendue
+            returns = []
+            barrier = threading.Barrier(2)
+
+            def give_back():
+                client = app.test_client()
+                barrier.wait()
+                response = client.put(f'/api/loans/{loan.id}',
+                                      headers={'Authorization': f'Bearer {owner_token}'})
+                returns.append(response.status_code)
+
+            threads = [threading.Thread(target=give_back) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sorted(returns), [200, 400])
+            with app.app_context():
+                from models import CatalogState
+                book = db.session.get(Ebook, book_id)
+                self.assertEqual(book.available_copies, 1)
+                # 3 emprunts + 1 retour, sans écriture dans catalog_state
+                self.assertEqual(book.stock_version, 4)
+                self.assertIsNone(db.session.query(CatalogState.version).scalar())
+                db.engine.dispose()
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import (create_access_token, get_jwt,
+                                get_jwt_identity, verify_jwt_in_request)
+from sqlalchemy import select
+
+from config import db, jwt
+from models import User
+
+# L'autorisation se fait sur les claims du token émis par login() :
+#   is_admin : rôle au moment de la connexion
+#   tv       : version de token de l'utilisateur (User.token_version)
+# Rétrograder, changer le mot de passe ou supprimer un utilisateur
+# incrémente / fait disparaître sa version : ses tokens sont alors refusés
+# par le contrôle de révocation ci-dessous, sans lecture de la table
+# `users` à chaque requête.
+
+
+class TokenVersionCache:
+    """
+    Versions de token par utilisateur, mises en cache quelques secondes.
+    Un worker qui ne voit pas l'écriture (autre processus) refuse les
+    anciens tokens au plus tard `ttl` secondes après la modification.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._versions.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        version = db.session.execute(
+            select(User.token_version).where(User.id == user_id)).scalar()
+        with self._lock:
+            self._versions[user_id] = (version, now + self.ttl)
+        return version
+
+    def forget(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+def init_auth(app):
+    app.extensions['token_versions'] = TokenVersionCache(
+        ttl=app.config.get('TOKEN_VERSION_CACHE_TTL', 30))
+
+
+@jwt.token_in_blocklist_loader
+def _token_revoked(jwt_header, jwt_payload):
+    token_version = jwt_payload.get('tv')
+    if token_version is None:
+        # token émis avant l'ajout des claims : reconnexion nécessaire
+        return True
+    cache = current_app.extensions['token_versions']
+    return cache.get(jwt_payload['sub']) != token_version
+
+
+@jwt.revoked_token_loader
+def _revoked_token_response(jwt_header, jwt_payload):
+    return jsonify({"msg": "Session expirée, veuillez vous reconnecter"}), 401
+
+
+def create_user_token(user):
+    """Token d'accès portant les claims d'autorisation de l'utilisateur."""
+    return create_access_token(
+        identity=user.id,
+        additional_claims={'is_admin': bool(user.is_admin),
+                           'tv': user.token_version or 0},
+        expires_delta=timedelta(hours=1))
+
+
+def revoke_user_tokens(user):
+    """
+    Invalide tous les tokens déjà émis pour `user` (changement de rôle ou
+    de mot de passe). Effectif au commit ; appeler ensuite
+    forget_token_version() pour que ce worker en tienne compte tout de suite.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+
+def forget_token_version(user_id):
+    current_app.extensions['token_versions'].forget(user_id)
+
+
+def current_user_is_admin():
+    return bool(get_jwt().get('is_admin'))
+
+
+def admin_required(owner_arg=None):
+    """
+    Exige un token valide et le rôle administrateur, lu dans les claims.
+    Avec `owner_arg`, le propriétaire de la ressource (argument de route du
+    même nom égal à l'identité du token) est aussi autorisé.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if current_user_is_admin():
+                return view(*args, **kwargs)
+            if owner_arg is not None:
+                if get_jwt_identity() == kwargs.get(owner_arg):
+                    return view(*args, **kwargs)
+                return jsonify({"msg": "Accès interdit, vous n'êtes pas propriétaire du compte ou administrateur"}), 403
+            return jsonify({"msg": "Accès interdit, vous n'êtes pas administrateur"}), 403
+        return wrapper
+    return decorator
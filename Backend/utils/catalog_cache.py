@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, g, request
+
+from utils.http_cache import catalog_validator
+
+# Réponse en cache, avec le valideur (version du catalogue et du stock) et
+# la date lus avant son calcul : l'ETag d'un HIT est celui de son corps
+CachedResponse = namedtuple(
+    'CachedResponse', 'body status mimetype validator updated_at')
+
+
+class CatalogCache:
+    """
+    Cache LRU borné + TTL des réponses sérialisées du catalogue, propre au
+    processus. Un HIT est validé en mémoire, sans requête :
+      - chaque entrée porte des tags (ex. 'ebooks', 'ebook:3') ; une
+        écriture de ce processus invalide ses tags après commit, ce qui
+        incrémente leur génération. Une entrée dont une génération a changé
+        depuis le début de son calcul n'est jamais servie (écriture
+        concurrente du remplissage) ;
+      - les écritures des autres workers ne sont vues qu'à l'expiration
+        (TTL) : c'est la fraîcheur maximale d'une entrée.
+    """
+
+    def __init__(self, max_entries=1024, ttl=10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        # tag -> génération ; remis à zéro (nouvelle époque) s'il grossit trop
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generations(self, tags):
+        """Générations de `tags`, à lire avant de calculer la valeur à mettre en cache."""
+        with self._lock:
+            return (self._epoch,) + tuple(self._generations.get(tag, 0)
+                                          for tag in tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generations, expires_at, tags, value = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=(), generations=None):
+        with self._lock:
+            current = (self._epoch,) + tuple(self._generations.get(tag, 0)
+                                             for tag in tags)
+            if generations is not None and generations != current:
+                # invalidé pendant le calcul : valeur peut-être déjà périmée
+                return
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (current, time.monotonic() + self.ttl,
+                                  tags, value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            if len(self._generations) + len(tags) > 4 * self.max_entries:
+                # générations bornées : nouvelle époque, tout est invalidé
+                self._generations.clear()
+                self._epoch += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._discard(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _discard(self, key):
+        # appelé verrou tenu
+        _, _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def init_catalog_cache(app):
+    """Un cache par application (les tests créent une app par test)."""
+    if app.config.get('CATALOG_CACHE_ENABLED', True):
+        app.extensions['catalog_cache'] = CatalogCache(
+            max_entries=app.config.get('CATALOG_CACHE_MAX_ENTRIES', 1024),
+            ttl=app.config.get('CATALOG_CACHE_TTL', 10))
+
+
+def get_catalog_cache():
+    return current_app.extensions.get('catalog_cache')
+
+
+def invalidate_catalog(*tags):
+    """À appeler par les routes d'écriture, après le commit."""
+    cache = get_catalog_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def _cache_key(kwargs):
+    return (request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))))
+
+
+def catalog_cached(*tags, stock=None):
+    """
+    Met en cache la réponse 200 d'une vue du catalogue, par endpoint et
+    paramètres de requête. Les tags sont formatés avec les arguments de la
+    vue : @catalog_cached('ebooks', 'ebook:{ebook_id}'). `stock` : comme
+    pour @catalog_conditional, dont le valideur est mis en cache avec la
+    réponse. Sous @catalog_conditional, un HIT (304 compris) ne fait
+    aucune requête : la vue expose `catalog_cache_lookup`.
+    """
+    def decorator(view):
+        def lookup(kwargs):
+            cache = get_catalog_cache()
+            if cache is None:
+                return None
+            # recherche faite une fois par requête, reprise par wrapper
+            entry = g.catalog_cache_entry = cache.get(_cache_key(kwargs))
+            return entry
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_catalog_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+
+            key = _cache_key(kwargs)
+            if 'catalog_cache_entry' in g:
+                cached = g.pop('catalog_cache_entry')
+            else:
+                cached = cache.get(key)
+            if cached is not None:
+                response = current_app.response_class(
+                    cached.body, status=cached.status, mimetype=cached.mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            entry_tags = tuple(tag.format(**kwargs) for tag in tags)
+            generations = cache.generations(entry_tags)
+            # Valideur déjà lu par @catalog_conditional le cas échéant
+            validator = g.get('catalog_version')
+            if validator is None:
+                validator, updated_at = catalog_validator(stock, kwargs)
+            else:
+                updated_at = g.get('catalog_updated_at')
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(key, CachedResponse(
+                    response.get_data(), response.status_code,
+                    response.mimetype, validator, updated_at),
+                    entry_tags, generations)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        wrapper.catalog_cache_lookup = lookup
+        return wrapper
+    return decorator
@@ -1,31 +1,153 @@
+import hashlib
+from collections import Counter
 from datetime import datetime, timedelta
-from models import Loan, User, Ebook, db
-from utils.email_service import notify_loan_deadline
+from itertools import groupby
 
+from flask import current_app
+from sqlalchemy import and_, case, exists, func, insert, or_
 
-def check_and_notify(days_before_deadline: int = 2):
+from models import Loan, LoanReminder, User, Ebook, db
+from utils.email_service import loan_digest
+from utils.outbox import enqueue_email
+
+# Lignes du journal insérées par instruction
+LEDGER_BATCH_SIZE = 1000
+
+
+def reminder_thresholds(days_before_deadline: int = 2, overdue_days: int = 7):
+    """
+    Seuils de rappel (type, avance) : un prêt franchit un seuil quand
+    due_date <= maintenant + avance. Du plus avancé au moins avancé.
+    """
+    return (('overdue', timedelta(days=-overdue_days)),
+            ('due_today', timedelta(days=1)),
+            ('due_soon', timedelta(days=days_before_deadline)))
+
+
+def last_reminder_run():
+    """Date de la dernière tournée ayant envoyé un rappel (None : aucune)."""
+    return db.session.query(func.max(LoanReminder.sent_at)).scalar()
+
+
+def reminder_query(thresholds, now, since=None):
+    """
+    Prêts non rendus ayant franchi un seuil entre `since` et `now` sans
+    avoir reçu le rappel de ce type, triés par utilisateur.
+
+    Une seule requête pour tous les seuils : pour chacun, l'échéance est
+    cherchée dans la fenêtre (since + avance, now + avance] de l'index
+    partiel des prêts en cours. Le type retenu est le seuil le plus avancé
+    franchi (un prêt déjà en retard de 10 jours à la première tournée ne
+    reçoit que le rappel « overdue »).
+    """
+    windows = []
+    for _, lead in thresholds:
+        window = [Loan.due_date <= now + lead]
+        if since is not None:
+            window.append(Loan.due_date > since + lead)
+        windows.append(and_(*window))
+    kind = case(*[(Loan.due_date <= now + lead, name)
+                  for name, lead in thresholds])
+    already_sent = exists().where(LoanReminder.loan_id == Loan.id,
+                                  LoanReminder.kind == kind)
+
+    return (db.session.query(Loan.user_id, User.email, Loan.id, kind,
+                             Ebook.title, Loan.due_date)
+            .join(User, User.id == Loan.user_id)
+            .join(Ebook, Ebook.id == Loan.ebook_id)
+            .filter(Loan.return_date.is_(None), or_(*windows), ~already_sent)
+            .order_by(Loan.user_id, Loan.due_date))
+
+
+def due_reminders(thresholds, now, since=None, batch_size: int = 1000):
+    """
+    Génère un (user_id, email, [(loan_id, type, titre, échéance)]) par
+    utilisateur, à partir de reminder_query() lue par lots de `batch_size` :
+    un seul mail récapitulatif par utilisateur.
+    """
+    rows = reminder_query(thresholds, now, since).yield_per(batch_size)
+    for (user_id, email), loans in groupby(rows, key=lambda row: row[:2]):
+        yield user_id, email, [tuple(row[2:]) for row in loans]
+
+
+def check_and_notify(days_before_deadline: int = 2, now=None, since=None,
+                     overdue_days: int = 7):
     """
     Parcourt les prêts non encore retournés et envoie un mail
     de rappel `days_before_deadline` jours avant la date limite.
     (Supposons que la durée standard soit 14 jours, ajustable.)
+
+    Seuils : `days_before_deadline` jours avant l'échéance, dans les
+    24 heures, puis `overdue_days` jours de retard ; chaque rappel part
+    une seule fois (journal loan_reminders). Par défaut seuls les seuils
+    franchis depuis la dernière tournée sont examinés : le coût d'une
+    tournée suit le nombre de nouveaux rappels, pas le stock de retards.
+
+    Un mail récapitulatif par utilisateur, enfilé dans l'outbox ; mails et
+    journal sont écrits dans la même transaction (aucun appel SMTP ici,
+    le dispatcher de utils/outbox.py les envoie).
     """
-    deadline = datetime.utcnow() + timedelta(days=days_before_deadline)
-    loans = (db.session.query(Loan, User, Ebook)
-             .join(User, User.id == Loan.user_id)
-             .join(Ebook, Ebook.id == Loan.ebook_id)
-             .filter(Loan.return_date.is_(None),
-                     Loan.due_date <= deadline)
-             .all())
+    now = now or datetime.utcnow()
+    if since is None:
+        since = last_reminder_run()
+    thresholds = reminder_thresholds(days_before_deadline, overdue_days)
+    stats = {'since': since.isoformat() if since else None, 'loans': 0,
+             'users': 0, 'enqueued': 0, 'duplicates': 0, 'by_kind': Counter()}
 
-    for loan, user, ebook in loans:
-        try:
-            notify_loan_deadline(user.email, ebook.title, days_before_deadline)
-            print(f"[INFO] Rappel envoyé à {user.email} pour '{ebook.title}' "
-                  f"(échéance dans {days_before_deadline} jours)")
-        except Exception as e:
-            print(
-                f"[ERROR] Impossible d'envoyer le rappel à {user.email}: {str(e)}")
+    ledger = []
+    for user_id, email, loans in due_reminders(thresholds, now, since):
+        objet, corps = loan_digest([(title, due) for _, _, title, due in loans],
+                                   now=now)
+        # même contenu (prêts et seuils), même clé : jamais envoyé deux fois
+        key = hashlib.sha1(','.join(f'{loan_id}:{kind}' for loan_id, kind, _, _
+                                    in loans).encode()).hexdigest()
+        if enqueue_email([email], objet, corps,
+                         idempotency_key=f'loan-reminder:{user_id}:{key}'):
+            stats['enqueued'] += 1
+        else:
+            stats['duplicates'] += 1
+        stats['users'] += 1
+        for loan_id, kind, _, _ in loans:
+            stats['loans'] += 1
+            stats['by_kind'][kind] += 1
+            ledger.append({'loan_id': loan_id, 'kind': kind, 'sent_at': now})
+    # écrit après la lecture : la requête teste loan_reminders (NOT EXISTS)
+    for start in range(0, len(ledger), LEDGER_BATCH_SIZE):
+        db.session.execute(insert(LoanReminder.__table__),
+                           ledger[start:start + LEDGER_BATCH_SIZE])
+    db.session.commit()
+
+    stats['by_kind'] = dict(stats['by_kind'])
+    print(f"[INFO] {stats['enqueued']} rappel(s) enfilé(s) pour "
+          f"{stats['loans']} prêt(s) de {stats['users']} utilisateur(s)")
+    return stats
+
+
+def reminders_job(ctx):
+    """
+    Tâche périodique (utils/scheduler.py). La fenêtre de la tournée
+    (since, now) est enregistrée comme point de reprise avant l'envoi :
+    l'instance qui reprend une tournée interrompue rejoue la même fenêtre
+    (le journal loan_reminders évite les doublons), et la tournée suivante
+    part de la fin de la précédente, même si elle n'a rien envoyé.
+    """
+    window = ctx.checkpoint
+    if 'now' not in window:
+        since = window.get('until')
+        if since is None:
+            last = last_reminder_run()
+            since = last and last.isoformat()
+        window = ctx.save({'since': since, 'now': ctx.started_at.isoformat()})
+    stats = check_and_notify(
+        current_app.config['REMINDER_DAYS_BEFORE'],
+        now=datetime.fromisoformat(window['now']),
+        since=window['since'] and datetime.fromisoformat(window['since']))
+    ctx.save({'until': window['now']})
+    return stats
 
 
 if __name__ == "__main__":
-    check_and_notify(days_before_deadline=2)
+    from app import create_app
+
+    with create_app().app_context():
+        check_and_notify(days_before_deadline=2)
@@ -0,0 +1,104 @@
+import math
+import random
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.sql.expression import Select, TextualSelect
+
+# Lectures sur réplique, écritures sur le primaire (SQLALCHEMY_BINDS) :
+#   - une requête GET / HEAD lit sur une réplique tirée au hasard parmi
+#     REPLICA_BINDS, sauf si son auteur vient d'écrire ;
+#   - toute écriture (flush, INSERT / UPDATE / DELETE) va au primaire, et
+#     la suite de la requête y reste ; les text() aussi, sauf ceux déclarés
+#     SELECT (text().columns()) et liés à un modèle (bind_arguments mapper) ;
+#   - hors requête HTTP (CLI, ordonnanceur, scripts), tout va au primaire ;
+#   - après une requête d'écriture réussie, son auteur est épinglé au
+#     primaire REPLICA_PIN_SECONDS : l'échéance, signée avec SECRET_KEY, est
+#     renvoyée dans l'en-tête X-DB-Primary-Until (que le client répète sur
+#     ses requêtes suivantes) et dans un cookie SameSite=None; Secure. Aucun
+#     état côté worker : tous les workers voient l'épinglage, y compris
+#     pour le frontend servi depuis un autre site (XHR cross-site).
+#     Un prêt tout juste créé apparaît donc toujours dans /api/loans.
+
+READ_METHODS = ('GET', 'HEAD')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+PIN_COOKIE = 'db_primary_until'
+PIN_HEADER = 'X-DB-Primary-Until'
+
+
+class RoutingSession(Session):
+    """Session de db : choisit la réplique pour les SELECT des requêtes en lecture."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                if self._flushing or getattr(clause, 'is_dml', False):
+                    # la suite de la requête doit relire ses propres écritures
+                    g.db_replica = None
+                elif isinstance(clause, Select) or (
+                        mapper is not None and isinstance(clause, TextualSelect)):
+                    return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                **kwargs)
+
+
+def _signer():
+    return Signer(current_app.config['SECRET_KEY'], salt='db-primary-pin')
+
+
+def pin_value(until):
+    """Échéance d'épinglage signée (en-tête et cookie)."""
+    return _signer().sign(f'{until:.3f}').decode()
+
+
+def pinned_until(value):
+    """Échéance lue dans une valeur signée ; 0 si absente ou falsifiée."""
+    if not value:
+        return 0.0
+    try:
+        return float(_signer().unsign(value))
+    except (BadSignature, ValueError):
+        return 0.0
+
+
+def replica_binds(config):
+    """Clés des répliques : REPLICA_BINDS, sinon les binds 'replica*'."""
+    binds = config.get('REPLICA_BINDS')
+    if binds is None:
+        binds = [key for key in config.get('SQLALCHEMY_BINDS') or {}
+                 if key.startswith('replica')]
+    return list(binds)
+
+
+def _pinned_to_primary():
+    until = max(pinned_until(request.headers.get(PIN_HEADER)),
+                pinned_until(request.cookies.get(PIN_COOKIE)))
+    return until > time.time()
+
+
+def init_db_routing(app):
+    """Routage des lectures vers les répliques, si SQLALCHEMY_BINDS en déclare."""
+    binds = replica_binds(app.config)
+    if not binds:
+        return
+    seconds = app.config.get('REPLICA_PIN_SECONDS', 5.0)
+
+    @app.before_request
+    def _route_reads():
+        if request.method in READ_METHODS and not _pinned_to_primary():
+            g.db_replica = random.choice(binds)
+
+    @app.after_request
+    def _pin_writer(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            value = pin_value(time.time() + seconds)
+            response.headers[PIN_HEADER] = value
+            # frontend sur un autre site : le cookie n'accompagne ses XHR
+            # qu'avec SameSite=None, qui impose Secure
+            response.set_cookie(
+                PIN_COOKIE, value, max_age=math.ceil(seconds), httponly=True,
+                secure=True, samesite='None')
+        return response
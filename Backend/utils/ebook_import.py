@@ -0,0 +1,291 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import bindparam, func, insert, select, text, tuple_, update
+
+from config import db
+from models import Ebook, Loan
+from utils.catalog_cache import invalidate_catalog
+from utils.http_cache import bump_catalog_version, bump_stock_version
+
+# Champs acceptés dans un flux d'import et longueur maximale des colonnes
+IMPORT_FIELDS = {
+    'title': 40,
+    'author': 70,
+    'description': None,
+    'cover_image': 200,
+    'file_path': 200,
+}
+INT_FIELDS = ('total_copies', 'available_copies')
+
+
+class ImportFormatError(ValueError):
+    """Format de flux inconnu (réponse 400)."""
+
+
+def detect_format(content_type, explicit=None):
+    """csv ou jsonl, depuis ?format= ou l'en-tête Content-Type."""
+    fmt = (explicit or '').lower()
+    if not fmt:
+        content_type = (content_type or '').lower()
+        if 'csv' in content_type:
+            fmt = 'csv'
+        elif 'ndjson' in content_type or 'jsonl' in content_type:
+            fmt = 'jsonl'
+    if fmt not in ('csv', 'jsonl'):
+        raise ImportFormatError(
+            "Format inconnu : utilisez text/csv ou application/x-ndjson")
+    return fmt
+
+
+def iter_records(stream, fmt):
+    """
+    Lit le flux ligne à ligne, sans le charger en mémoire.
+    Produit des tuples (numéro de ligne, dict | None, erreur | None).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, "JSON invalide"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Chaque ligne doit être un objet JSON"
+            continue
+        yield line_no, record, None
+
+
+def validate_record(record):
+    """Retourne (valeurs normalisées, liste d'erreurs)."""
+    values = {}
+    errors = []
+
+    for field, max_length in IMPORT_FIELDS.items():
+        value = record.get(field)
+        if value is None or value == '':
+            continue
+        value = str(value).strip()
+        if max_length and len(value) > max_length:
+            errors.append(f"'{field}' dépasse {max_length} caractères")
+        values[field] = value
+
+    for field in INT_FIELDS:
+        value = record.get(field)
+        if value is None or value == '':
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            errors.append(f"'{field}' doit être un entier")
+            continue
+        if value < 0:
+            errors.append(f"'{field}' doit être positif")
+        values[field] = value
+
+    # Clé naturelle de l'upsert
+    if not values.get('title'):
+        errors.append("Le titre est requis")
+    if not values.get('author'):
+        errors.append("L'auteur est requis")
+
+    total = values.get('total_copies')
+    available = values.get('available_copies')
+    if total is not None and available is not None and available > total:
+        errors.append("'available_copies' dépasse 'total_copies'")
+    return values, errors
+
+
+class ImportReport:
+    """Bilan d'un import : compteurs et erreurs par ligne (bornées)."""
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_no, messages):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'errors': messages})
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def import_ebooks(stream, fmt, batch_size=1000, max_errors=1000):
+    """
+    Importe un flux CSV / JSON Lines d'ebooks par lots de `batch_size`
+    lignes, avec upsert sur la clé naturelle (title, author), unique en
+    base. Chaque lot est une transaction : une requête de recherche des
+    existants (index uq_ebooks_title_author), puis un INSERT ... ON
+    CONFLICT (title, author) DO UPDATE exécuté en executemany ; un import
+    concurrent ou un POST /ebooks simultané ne crée donc pas de doublon.
+
+    Pour un ebook existant, le stock tient compte des prêts en cours :
+    available_copies du flux est ignoré et recalculé à partir de
+    total_copies (total - prêts en cours) ; une ligne dont total_copies
+    est inférieur aux prêts en cours est rejetée.
+    """
+    report = ImportReport(max_errors=max_errors)
+    records = iter_records(stream, fmt)
+
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+
+        # Dernière occurrence d'une clé dans le lot gagnante
+        valid = {}
+        for line_no, record, error in chunk:
+            if error:
+                report.add_error(line_no, [error])
+                continue
+            values, errors = validate_record(record)
+            if errors:
+                report.add_error(line_no, errors)
+                continue
+            valid[(values['title'], values['author'])] = (line_no, values)
+
+        if valid:
+            _upsert_chunk(valid, report)
+    return report
+
+
+def _open_loans():
+    # prêts en cours de l'ebook de la requête englobante (sous-requête corrélée)
+    return (select(func.count(Loan.id))
+            .where(Loan.ebook_id == Ebook.id, Loan.return_date.is_(None))
+            .scalar_subquery())
+
+
+# Stock d'un ebook existant : disponible = total - prêts en cours, calculé
+# dans l'UPDATE même (un emprunt concurrent ne le fausse pas)
+_UPDATE_STOCK = (
+    update(Ebook.__table__)
+    .where(Ebook.__table__.c.id == bindparam('ebook_id'))
+    .values(total_copies=bindparam('total'),
+            available_copies=bindparam('total') - _open_loans(),
+            stock_version=Ebook.__table__.c.stock_version + 1))
+
+
+# Upsert d'une ligne du flux (PostgreSQL, SQLite >= 3.24), écrit en texte
+# comme l'outbox : les constructions des dialectes ne sont pas mises en
+# cache. Un champ absent du flux (paramètre NULL) garde la valeur en base ;
+# le stock d'un existant suit la même règle que _UPDATE_STOCK, et n'est
+# pas modifié si total_copies est inférieur aux prêts en cours (ligne
+# créée entre la recherche et l'upsert)
+_OPEN_LOANS_SQL = ("(SELECT count(loans.id) FROM loans WHERE loans.ebook_id = "
+                   "ebooks.id AND loans.return_date IS NULL)")
+_UPSERT = text(
+    "INSERT INTO ebooks (title, author, description, cover_image, file_path, "
+    "total_copies, available_copies, stock_version, uploaded_at) "
+    "VALUES (:title, :author, COALESCE(:description, ''), :cover_image, "
+    ":file_path, COALESCE(:total_copies, 1), "
+    "COALESCE(:available_copies, :total_copies, 1), 0, :uploaded_at) "
+    "ON CONFLICT (title, author) DO UPDATE SET "
+    "description = COALESCE(:description, ebooks.description), "
+    "cover_image = COALESCE(:cover_image, ebooks.cover_image), "
+    "file_path = COALESCE(:file_path, ebooks.file_path), "
+    "total_copies = COALESCE(:total_copies, ebooks.total_copies), "
+    "available_copies = CASE WHEN :total_copies IS NULL "
+    "THEN ebooks.available_copies "
+    f"ELSE :total_copies - {_OPEN_LOANS_SQL} END, "
+    "stock_version = ebooks.stock_version + 1 "
+    f"WHERE :total_copies IS NULL OR :total_copies >= {_OPEN_LOANS_SQL}")
+_UPSERT_FIELDS = ('description', 'cover_image', 'file_path', 'total_copies',
+                  'available_copies')
+
+
+def _upsert_chunk(valid, report):
+    existing = {
+        (row.title, row.author): (row.id, row.open_loans)
+        for row in db.session.execute(
+            select(Ebook.id, Ebook.title, Ebook.author,
+                   _open_loans().label('open_loans'))
+            .where(tuple_(Ebook.title, Ebook.author).in_(list(valid))))}
+
+    now = datetime.utcnow()
+    rows = []
+    updated = []
+    restocked = []
+    for key, (line_no, values) in valid.items():
+        ebook_id, open_loans = existing.get(key, (None, 0))
+        if ebook_id is not None:
+            # le stock d'un existant ne se fixe que par total_copies
+            values = dict(values, available_copies=None)
+            total = values.get('total_copies')
+            if total is not None and total < open_loans:
+                report.add_error(line_no, [
+                    f"'total_copies' inférieur aux prêts en cours ({open_loans})"])
+                continue
+            updated.append(ebook_id)
+            if total is not None:
+                restocked.append(ebook_id)
+        row = {field: values.get(field) for field in _UPSERT_FIELDS}
+        row.update(title=values['title'], author=values['author'],
+                   uploaded_at=now)
+        rows.append((ebook_id, row))
+
+    try:
+        if rows:
+            if db.session.get_bind(mapper=Ebook).dialect.name in (
+                    'postgresql', 'sqlite'):
+                db.session.execute(_UPSERT, [row for _, row in rows])
+            else:
+                _write_rows(rows)
+        bump_stock_version(*restocked)
+        bump_catalog_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report.created += len(rows) - len(updated)
+    report.updated += len(updated)
+    invalidate_catalog('ebooks', *(f'ebook:{ebook_id}' for ebook_id in updated))
+
+
+def _write_rows(rows):
+    # autres bases, sans ON CONFLICT : INSERT des nouveaux, UPDATE par clé
+    # primaire des existants (executemany), même règle de stock
+    to_insert, to_update, to_restock = [], [], []
+    for ebook_id, row in rows:
+        if ebook_id is None:
+            total = row['total_copies'] or 1
+            to_insert.append(dict(
+                row, description=row['description'] or '', total_copies=total,
+                available_copies=row['available_copies'] or total))
+            continue
+        total = row['total_copies']
+        if total is not None:
+            to_restock.append({'ebook_id': ebook_id, 'total': total})
+        to_update.append(dict(
+            {field: value for field, value in row.items()
+             if value is not None and field not in INT_FIELDS + ('uploaded_at',)},
+            id=ebook_id))
+    if to_insert:
+        db.session.execute(insert(Ebook), to_insert)
+    if to_update:
+        db.session.execute(update(Ebook), to_update)
+    if to_restock:
+        db.session.execute(_UPDATE_STOCK, to_restock)
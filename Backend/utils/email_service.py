@@ -1,4 +1,9 @@
+import queue
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from os import getenv
@@ -8,24 +13,37 @@ SMTP_SERVER = getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = getenv("SMTP_USERNAME")  # ton adresse mail
 SMTP_PASSWORD = getenv("SMTP_PASSWORD")  # mot de passe
+SMTP_USE_TLS = getenv("SMTP_USE_TLS", "1").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT = float(getenv("SMTP_TIMEOUT", "30"))
 
 
-def send_email(destinataires: List[str], sujet: str, corps_text: str, corps_html: str = None):
+def build_message(destinataires: List[str], sujet: str, corps_text: str,
+                  corps_html: str = None, expediteur: str = None):
     """
-    Envoie un mail simple (texte + html optionnel) via SMTP.
+    Construit un mail texte (+ html optionnel) prêt à être envoyé.
     """
-    if not SMTP_USERNAME or not SMTP_PASSWORD:
-        raise RuntimeError(
-            "Variables SMTP_USERNAME et/ou SMTP_PASSWORD non définies.")
-
     msg = MIMEMultipart("alternative")
     msg["Subject"] = sujet
-    msg["From"] = SMTP_USERNAME
+    msg["From"] = expediteur or SMTP_USERNAME or "no-reply@elib.local"
     msg["To"] = ", ".join(destinataires)
 
     msg.attach(MIMEText(corps_text, "plain", "utf-8"))
     if corps_html:
         msg.attach(MIMEText(corps_html, "html", "utf-8"))
+    return msg
+
+
+def send_email(destinataires: List[str], sujet: str, corps_text: str, corps_html: str = None):
+    """
+    Envoie un mail simple (texte + html optionnel) via SMTP.
+    Ouvre une connexion dédiée : pour des envois en nombre, passer par
+    SMTPConnectionPool et deliver().
+    """
+    if not SMTP_USERNAME or not SMTP_PASSWORD:
+        raise RuntimeError(
+            "Variables SMTP_USERNAME et/ou SMTP_PASSWORD non définies.")
+
+    msg = build_message(destinataires, sujet, corps_text, corps_html)
 
     with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
         server.starttls()
@@ -33,6 +51,230 @@ def send_email(destinataires: List[str], sujet: str, corps_text: str, corps_html
         server.sendmail(SMTP_USERNAME, destinataires, msg.as_string())
 
 
+def _is_stale(error):
+    # session fermée par le serveur (inactivité, quota de messages...) :
+    # le message n'a pas été accepté, on peut le renvoyer ailleurs
+    return (isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError))
+            or getattr(error, 'smtp_code', None) == 421)
+
+
+class _Connection:
+    def __init__(self, server):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Connexions SMTP authentifiées (STARTTLS + login une seule fois),
+    réutilisées d'un message à l'autre.
+
+    Au plus `size` connexions ouvertes ; un thread qui envoie en emprunte
+    une et la rend ensuite. Une connexion est renouvelée après
+    `max_messages` messages (limite usuelle des relais), vérifiée par NOOP
+    après `idle_check` secondes d'inactivité, et un message refusé parce
+    que le serveur a fermé la session est renvoyé une fois sur une
+    connexion neuve.
+    """
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, username=SMTP_USERNAME,
+                 password=SMTP_PASSWORD, use_tls=SMTP_USE_TLS, size=4,
+                 timeout=SMTP_TIMEOUT, max_messages=100, idle_check=30.0,
+                 sender=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.sender = sender or username or "no-reply@elib.local"
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self.opened += 1
+        return _Connection(server)
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if time.monotonic() - conn.last_used > self.idle_check:
+            try:
+                conn.server.noop()
+            except (smtplib.SMTPException, OSError):
+                self._discard(conn)
+                return self._connect()
+        return conn
+
+    def _checkin(self, conn):
+        conn.last_used = time.monotonic()
+        if conn.messages >= self.max_messages:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.server.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.server.close()
+
+    def send(self, destinataires, msg):
+        """Envoie `msg` (email.message.Message) via une connexion du pool."""
+        payload = msg.as_string()
+        with self._slots:
+            conn = self._checkout()
+            try:
+                try:
+                    conn.server.sendmail(self.sender, destinataires, payload)
+                except Exception as e:
+                    if not _is_stale(e):
+                        raise
+                    self._discard(conn)
+                    with self._lock:
+                        self.reconnects += 1
+                    conn = self._connect()
+                    conn.server.sendmail(self.sender, destinataires, payload)
+            except smtplib.SMTPRecipientsRefused:
+                # destinataire refusé : la session reste utilisable
+                conn.messages += 1
+                self._checkin(conn)
+                raise
+            except Exception:
+                self._discard(conn)
+                raise
+            conn.messages += 1
+            self._checkin(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DeliveryReport:
+    """Compteurs d'un envoi groupé (envoyés, échecs, latences)."""
+
+    MAX_ERRORS = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+        self.latencies = []
+        self.errors = []
+        self.seconds = 0.0
+        self.connections_opened = 0
+        self.reconnects = 0
+
+    def record(self, destinataires, latency, error=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if error is None:
+                self.sent += 1
+                return
+            self.failed += 1
+            if len(self.errors) < self.MAX_ERRORS:
+                self.errors.append(f"{', '.join(destinataires)}: {error}")
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1,
+                                       int(p / 100 * len(latencies)))] * 1000, 2)
+
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'dead': self.dead,
+            'seconds': round(self.seconds, 3),
+            'messages_per_second': (round((self.sent + self.failed) / self.seconds, 1)
+                                    if self.seconds else None),
+            'latency_ms': {'p50': percentile(50), 'p95': percentile(95),
+                           'p99': percentile(99),
+                           'max': round(latencies[-1] * 1000, 2) if latencies else None},
+            'connections_opened': self.connections_opened,
+            'reconnects': self.reconnects,
+            'errors': self.errors,
+        }
+
+
+def deliver(messages, pool, workers=8):
+    """
+    Envoie les (destinataires, message) de l'itérable `messages` avec au
+    plus `workers` envois simultanés sur les connexions de `pool`.
+
+    L'itérable est consommé au fil de l'eau (au plus 2 x workers messages
+    en attente) : un générateur de 100 000 rappels ne réside jamais en
+    mémoire. Un échec n'interrompt pas l'envoi ; il est compté dans le
+    rapport retourné (DeliveryReport).
+
+    `workers` est ramené à la taille du pool : un thread sans connexion ne
+    ferait qu'attendre (le sémaphore n'étant pas équitable, certains
+    messages attendraient alors toute la tournée).
+    """
+    workers = max(1, min(workers, pool.size))
+    report = DeliveryReport()
+    pending = threading.BoundedSemaphore(workers * 2)
+    opened, reconnects = pool.opened, pool.reconnects
+
+    def send_one(destinataires, msg):
+        started = time.monotonic()
+        try:
+            pool.send(destinataires, msg)
+        except Exception as e:
+            report.record(destinataires, time.monotonic() - started, e)
+        else:
+            report.record(destinataires, time.monotonic() - started)
+        finally:
+            pending.release()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix='smtp') as executor:
+        for destinataires, msg in messages:
+            pending.acquire()
+            executor.submit(send_one, destinataires, msg)
+    report.seconds = time.monotonic() - started
+    report.connections_opened = pool.opened - opened
+    report.reconnects = pool.reconnects - reconnects
+    return report
+
+
 # facilite metier
 def notify_loan_deadline(user_email: str, ebook_title: str, days_left: int):
     """
@@ -45,3 +287,27 @@ def notify_loan_deadline(user_email: str, ebook_title: str, days_left: int):
              f"Cordialement,\nL'équipe E-Lib")
 
     send_email([user_email], objet, corps)
+
+
+def loan_digest(loans, now=None):
+    """
+    (objet, corps) d'un seul rappel pour tous les prêts d'un utilisateur
+    arrivant à échéance. `loans` : [(titre, date d'échéance)].
+    """
+    now = now or datetime.utcnow()
+    lignes = []
+    for title, due_date in loans:
+        if due_date < now:
+            lignes.append(f"- '{title}' : en retard depuis le {due_date:%d/%m/%Y}")
+        else:
+            lignes.append(f"- '{title}' : à rendre avant le {due_date:%d/%m/%Y}")
+    if len(loans) == 1:
+        objet = f"Rappel : retour du livre '{loans[0][0]}'"
+    else:
+        objet = f"Rappel : {len(loans)} livres à rendre"
+    corps = (f"Bonjour,\n\n"
+             f"Les prêts suivants arrivent à échéance :\n"
+             + "\n".join(lignes) +
+             f"\n\nPensez à les rendre à temps pour éviter des pénalités.\n\n"
+             f"Cordialement,\nL'équipe E-Lib")
+    return objet, corps
@@ -0,0 +1,62 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from config import db
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS selon la base : pool PostgreSQL dérivé du
+    nombre de workers et de threads, rien de particulier pour SQLite (ses
+    réglages passent par les pragmas, voir init_engine_profiles).
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+    workers = max(1, config['WEB_CONCURRENCY'])
+    # connexions utiles en même temps dans un processus : une par thread
+    # de requête, plus le thread de l'ordonnanceur
+    demand = max(1, config['GUNICORN_THREADS']) + int(config['SCHEDULER_ENABLED'])
+    budget = max(1, config['DB_MAX_CONNECTIONS'] // workers)
+    pool_size = min(demand, budget)
+    return {
+        'pool_size': pool_size,
+        # débordement ponctuel (import en masse, pics), dans le budget
+        'max_overflow': min(pool_size, budget - pool_size),
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        # connexions coupées par le serveur ou un proxy (pgbouncer, LB)
+        'pool_pre_ping': True,
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+
+
+def sqlite_pragmas(engine, pragmas):
+    """Applique `pragmas` à chaque nouvelle connexion SQLite de `engine`."""
+
+    @event.listens_for(engine, 'connect')
+    def _apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def init_engine_profiles(app):
+    """Pragmas SQLITE_PRAGMAS sur les moteurs SQLite de l'application."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                sqlite_pragmas(engine, pragmas)
+
+
+def sqlite_settings(engine):
+    """Valeurs effectives des pragmas (vérification, benchmarks)."""
+    with engine.connect() as connection:
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+                for name in ('journal_mode', 'busy_timeout', 'synchronous',
+                             'mmap_size', 'cache_size')}
@@ -0,0 +1,173 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import g, make_response, request
+from sqlalchemy import func, select, text, update
+
+from config import db
+from models import CatalogState, Ebook, StockShard
+
+# Identifiant de la ligne unique de `catalog_state`
+CATALOG_STATE_ID = 1
+
+# Portée du stock (available_copies) dans une vue du catalogue : toutes les
+# lignes (listes, recherche) ; sinon le nom de l'argument de la vue qui
+# porte l'id de l'ebook ('ebook_id'). Les emprunts et retours écrivent
+# Ebook.stock_version (ETag d'un ebook) et une ligne de stock_shards
+# (ETag des listes), jamais catalog_state : pas de verrou commun.
+STOCK_ALL = 'all'
+
+# Lignes de stock_shards : la somme reste une lecture de quelques lignes
+# quelle que soit la taille du catalogue, et les emprunts simultanés de
+# livres différents se répartissent sur plusieurs lignes
+STOCK_SHARDS = 16
+
+# ON CONFLICT écrit en texte, comme pour l'outbox (requête mise en cache)
+_BUMP_STOCK_SHARD = text(
+    "INSERT INTO stock_shards (id, version) VALUES (:id, 1) "
+    "ON CONFLICT (id) DO UPDATE SET version = stock_shards.version + 1")
+
+
+def _stock_version(ebook_id):
+    if ebook_id == STOCK_ALL:
+        # somme exacte : chaque emprunt ou retour l'augmente de 1
+        return select(func.coalesce(func.sum(StockShard.version), 0))
+    return select(Ebook.stock_version).where(Ebook.id == ebook_id)
+
+
+def bump_stock_version(*ebook_ids):
+    """
+    Incrémente, dans la transaction courante, la version du stock des
+    listes pour ces ebooks (une ligne de stock_shards par groupe). À
+    appeler avec toute écriture de available_copies hors catalogue
+    (emprunt, retour), qui incrémente aussi Ebook.stock_version.
+    """
+    # ordre fixe : deux transactions ne se bloquent pas mutuellement
+    shards = sorted({int(ebook_id) % STOCK_SHARDS for ebook_id in ebook_ids})
+    if not shards:
+        return
+    dialect = db.session.get_bind(mapper=StockShard).dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        db.session.execute(_BUMP_STOCK_SHARD, [{'id': shard} for shard in shards])
+        return
+    for shard in shards:
+        result = db.session.execute(
+            update(StockShard).where(StockShard.id == shard)
+            .values(version=StockShard.version + 1))
+        if result.rowcount == 0:
+            db.session.add(StockShard(id=shard, version=1))
+
+
+def catalog_state(stock=None):
+    """
+    Retourne (version, updated_at, stock_version) du catalogue, en une
+    requête sans hydrater d'objet ORM. `stock` : None (vue sans stock),
+    STOCK_ALL (somme des versions du stock) ou l'id d'un ebook.
+    """
+    columns = [select(column).where(CatalogState.id == CATALOG_STATE_ID)
+               .scalar_subquery()
+               for column in (CatalogState.version, CatalogState.updated_at)]
+    if stock is not None:
+        columns.append(_stock_version(stock).scalar_subquery())
+    # une ligne même si le catalogue n'a jamais été modifié par l'API
+    row = db.session.execute(select(*columns)).one()
+    return (row[0] or 0, row[1],
+            None if stock is None else row[2])
+
+
+def catalog_validator(stock=None, view_kwargs=None):
+    """
+    Valideur des réponses d'une vue du catalogue (ETag, entrées du cache) :
+    (version, stock_version), et updated_at pour Last-Modified. `stock` :
+    None, STOCK_ALL, ou le nom de l'argument de la vue portant l'id.
+    """
+    if stock is not None and stock != STOCK_ALL:
+        stock = (view_kwargs or {}).get(stock)
+    version, updated_at, stock_version = catalog_state(stock)
+    return (version, stock_version), updated_at
+
+
+def bump_catalog_version():
+    """
+    Incrémente la version du catalogue dans la transaction courante.
+    À appeler par toute route qui modifie un ebook ou une catégorie, avant
+    le commit, pour que l'écriture et la nouvelle version soient atomiques.
+    Pas par les emprunts et retours : voir bump_stock_version.
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(CatalogState)
+        .where(CatalogState.id == CATALOG_STATE_ID)
+        .values(version=CatalogState.version + 1, updated_at=now))
+    if result.rowcount == 0:
+        db.session.add(CatalogState(
+            id=CATALOG_STATE_ID, version=1, updated_at=now))
+
+
+def _etag_for(validator):
+    # La représentation dépend de l'URL complète (paramètres compris)
+    digest = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:16]
+    version, stock_version = validator
+    if stock_version is None:
+        return f'c{version}-{digest}'
+    return f'c{version}s{stock_version}-{digest}'
+
+
+def _not_modified_since(updated_at):
+    ims = request.if_modified_since
+    if ims is None or updated_at is None:
+        return False
+    # Last-Modified est à la seconde près
+    return updated_at.replace(microsecond=0, tzinfo=timezone.utc) <= ims
+
+
+def catalog_conditional(view=None, stock=None):
+    """
+    GET conditionnel sur les routes du catalogue : ETag fort dérivé de la
+    version du catalogue et, pour les vues qui montrent le stock
+    (@catalog_conditional(stock=STOCK_ALL) ou stock='ebook_id'), de la
+    version du stock (stock_shards ou Ebook.stock_version), lues en une
+    requête de coût constant. Un If-None-Match à jour reçoit un 304 avant
+    l'exécution de la vue, donc sans aucune requête ORM ; sans aucune
+    requête du tout si la réponse est dans le cache du catalogue.
+
+    Last-Modified / If-Modified-Since ne servent qu'aux vues sans stock :
+    les emprunts ne datent pas le catalogue (pas d'écriture commune).
+    """
+    if view is None:
+        return lambda view: catalog_conditional(view, stock=stock)
+
+    # réponse en cache (@catalog_cached) : son valideur, sans requête
+    lookup = getattr(view, 'catalog_cache_lookup', None)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cached = lookup(kwargs) if lookup is not None else None
+        if cached is not None:
+            validator, updated_at = cached.validator, cached.updated_at
+        else:
+            validator, updated_at = catalog_validator(stock, kwargs)
+        g.catalog_version, g.catalog_updated_at = validator, updated_at
+        etag = _etag_for(validator)
+        if stock is not None:
+            updated_at = None
+
+        if request.if_none_match:
+            fresh = request.if_none_match.contains(etag)
+        else:
+            fresh = _not_modified_since(updated_at)
+        if fresh:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if updated_at is not None:
+            response.last_modified = updated_at.replace(tzinfo=timezone.utc)
+        # Le client garde sa copie mais doit la revalider à chaque lecture
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
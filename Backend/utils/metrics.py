@@ -0,0 +1,315 @@
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from config import db
+from utils.auth import admin_required
+from utils.scheduler import job_status
+
+# Bornes des histogrammes (secondes, sauf le nombre de requêtes SQL)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Histogramme à bornes fixes (appelé verrou de Metrics tenu)."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield bound, total
+
+
+class Metrics:
+    """
+    Métriques HTTP et SQL du processus, exposées au format texte
+    Prometheus. Chaque worker gunicorn tient les siennes : le scraper
+    agrège les instances.
+
+    Le chemin chaud se limite à quelques perf_counter() et à une mise à
+    jour de compteurs sous verrou ; la mise en forme n'a lieu qu'au scrape.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = {}      # (method, endpoint, status) -> nombre
+        self.latency = {}       # (method, endpoint) -> Histogram
+        self.db_queries = {}    # (method, endpoint) -> Histogram
+        self.db_time = {}       # (method, endpoint) -> Histogram
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.queries_total = 0
+        self.db_seconds_total = 0.0
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe_request(self, method, endpoint, status, seconds, queries,
+                        db_seconds):
+        key = (method, endpoint)
+        with self._lock:
+            status_key = (method, endpoint, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.db_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.db_time[key] = Histogram(DB_TIME_BUCKETS)
+            self.latency[key].observe(seconds)
+            self.db_queries[key].observe(queries)
+            self.db_time[key].observe(db_seconds)
+
+    def observe_query(self, seconds):
+        with self._lock:
+            self.queries_total += 1
+            self.db_seconds_total += seconds
+
+    def observe_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait.observe(seconds)
+
+    def render(self, engines=(), extra=()):
+        """Texte d'exposition Prometheus (version 0.0.4)."""
+        out = []
+        with self._lock:
+            _gauge(out, 'http_requests_in_flight',
+                   'Requêtes HTTP en cours de traitement', [((), self.in_flight)])
+            _counter(out, 'http_requests_total',
+                     'Requêtes HTTP traitées, par statut',
+                     [((('method', m), ('endpoint', e), ('status', s)), n)
+                      for (m, e, s), n in sorted(self.requests.items())])
+            _histograms(out, 'http_request_duration_seconds',
+                        'Durée de traitement des requêtes HTTP', self.latency)
+            _histograms(out, 'http_request_db_queries',
+                        'Requêtes SQL exécutées par requête HTTP', self.db_queries)
+            _histograms(out, 'http_request_db_seconds',
+                        'Temps passé en base par requête HTTP', self.db_time)
+            _counter(out, 'db_queries_total', 'Requêtes SQL exécutées',
+                     [((), self.queries_total)])
+            _counter(out, 'db_query_seconds_total', 'Temps total passé en base',
+                     [((), self.db_seconds_total)])
+            _histograms(out, 'db_pool_checkout_wait_seconds',
+                        'Attente pour obtenir une connexion du pool',
+                        {(): self.pool_wait}, labels=())
+
+        pool_stats = [(name, _pool_stats(engine)) for name, engine in engines]
+        for metric, help_text in (('size', 'Taille configurée du pool'),
+                                  ('checked_out', 'Connexions empruntées'),
+                                  ('overflow', 'Connexions en débordement')):
+            samples = [((('engine', name),), stats[metric])
+                       for name, stats in pool_stats if metric in stats]
+            if samples:
+                _gauge(out, f'db_pool_{metric}', help_text, samples)
+
+        for name, help_text, kind, value in extra:
+            render = _counter if kind == 'counter' else _gauge
+            # valeur seule, ou liste d'échantillons (labels, valeur)
+            samples = value if isinstance(value, list) else [((), value)]
+            render(out, name, help_text, samples)
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _sample(name, labels, value):
+    if labels:
+        inner = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+        return f'{name}{{{inner}}} {value}'
+    return f'{name} {value}'
+
+
+def _header(out, name, help_text, kind):
+    out.append(f'# HELP {name} {help_text}')
+    out.append(f'# TYPE {name} {kind}')
+
+
+def _counter(out, name, help_text, samples):
+    _header(out, name, help_text, 'counter')
+    out.extend(_sample(name, labels, value) for labels, value in samples)
+
+
+def _gauge(out, name, help_text, samples):
+    _header(out, name, help_text, 'gauge')
+    out.extend(_sample(name, labels, value) for labels, value in samples)
+
+
+def _histograms(out, name, help_text, histograms, labels=('method', 'endpoint')):
+    _header(out, name, help_text, 'histogram')
+    for key, histogram in sorted(histograms.items()):
+        base = tuple(zip(labels, key))
+        for bound, total in histogram.cumulative():
+            out.append(_sample(f'{name}_bucket', base + (('le', bound),), total))
+        out.append(_sample(f'{name}_bucket', base + (('le', '+Inf'),),
+                           histogram.count))
+        out.append(_sample(f'{name}_sum', base, histogram.sum))
+        out.append(_sample(f'{name}_count', base, histogram.count))
+
+
+def _pool_stats(engine):
+    # StaticPool / NullPool (SQLite en mémoire, tests) n'ont pas de taille
+    pool = engine.pool
+    stats = {}
+    for metric, attr in (('size', 'size'), ('checked_out', 'checkedout'),
+                         ('overflow', 'overflow')):
+        method = getattr(pool, attr, None)
+        if callable(method):
+            stats[metric] = method()
+    return stats
+
+
+def _instrument_engine(engine, metrics):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        metrics.observe_query(elapsed)
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+
+    # Pas d'événement « avant checkout » : on chronomètre l'emprunt d'une
+    # connexion DBAPI (attente du pool + éventuelle ouverture)
+    raw_connection = engine.raw_connection
+
+    @wraps(raw_connection)
+    def timed_raw_connection(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        finally:
+            metrics.observe_pool_wait(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+def init_metrics(app):
+    """Middleware de mesure et route /metrics (administrateurs)."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    metrics = app.extensions['metrics'] = Metrics()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(engine, metrics)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        metrics.request_started()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            metrics.observe_request(
+                request.method, request.endpoint or 'unmatched',
+                response.status_code, time.perf_counter() - started,
+                g.get('db_queries', 0), g.get('db_seconds', 0.0))
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        if g.pop('request_started', None) is not None:
+            metrics.request_finished()
+
+    @admin_required()
+    def metrics_view():
+        return Response(render_metrics(current_app),
+                        mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def render_metrics(app):
+    engines = [(name or 'default', engine)
+               for name, engine in db.engines.items()]
+    extra = []
+    hasher = app.extensions.get('password_hasher')
+    if hasher is not None:
+        stats = hasher.stats()
+        extra += [
+            ('password_hash_queue_depth', 'Hachages bcrypt en attente',
+             'gauge', stats['queue_depth']),
+            ('password_hash_running', 'Hachages bcrypt en cours',
+             'gauge', stats['running']),
+            ('password_hash_rejected_total', 'Hachages refusés (503)',
+             'counter', stats['rejected']),
+        ]
+    cache = app.extensions.get('catalog_cache')
+    if cache is not None:
+        stats = cache.stats()
+        extra += [
+            ('catalog_cache_hits_total',
+             'Lectures du catalogue servies par le cache', 'counter',
+             stats['hits']),
+            ('catalog_cache_misses_total', 'Lectures du catalogue hors cache',
+             'counter', stats['misses']),
+            ('catalog_cache_entries', 'Entrées du cache du catalogue',
+             'gauge', stats['size']),
+            ('catalog_cache_evictions_total',
+             'Entrées évincées par la limite de taille (LRU)', 'counter',
+             stats['evictions']),
+        ]
+    if app.extensions.get('scheduler') is not None:
+        jobs = job_status()
+        for name, key, help_text, kind in SCHEDULER_METRICS:
+            # booléens (running) exposés en 0 / 1
+            samples = [((('job', job),), int(stats[key])
+                        if isinstance(stats[key], bool) else stats[key])
+                       for job, stats in jobs.items() if stats[key] is not None]
+            if samples:
+                extra.append((name, help_text, kind, samples))
+    return app.extensions['metrics'].render(engines, extra)
+
+
+# (métrique, clé de job_status(), aide, type)
+SCHEDULER_METRICS = (
+    ('scheduler_job_lag_seconds', 'lag_seconds',
+     'Retard actuel de la tâche sur son échéance', 'gauge'),
+    ('scheduler_job_last_duration_seconds', 'last_duration_seconds',
+     'Durée de la dernière exécution', 'gauge'),
+    ('scheduler_job_last_lag_seconds', 'last_lag_seconds',
+     'Retard du démarrage de la dernière exécution', 'gauge'),
+    ('scheduler_job_running', 'running', 'Tâche en cours (bail actif)', 'gauge'),
+    ('scheduler_job_runs_total', 'runs', 'Exécutions de la tâche', 'counter'),
+    ('scheduler_job_failures_total', 'failures', 'Exécutions en échec',
+     'counter'),
+)
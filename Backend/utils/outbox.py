@@ -0,0 +1,259 @@
+import random
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, text, update
+
+from config import db
+from models import EmailOutbox
+from utils.email_service import DeliveryReport, SMTPConnectionPool, build_message
+
+# File d'envoi durable des mails (table email_outbox) :
+#   - enqueue_email() insère le message dans la transaction de l'appelant,
+#     sans aucun appel SMTP : il part si et seulement si l'appelant commit ;
+#   - OutboxDispatcher réserve un lot de messages dus, les envoie en
+#     parallèle sur un SMTPConnectionPool, puis marque chacun sent, le
+#     replanifie (backoff exponentiel) ou le passe en dead.
+
+PENDING = 'pending'
+SENT = 'sent'
+DEAD = 'dead'
+
+_MAX_ERROR_LENGTH = 1000
+
+
+def enqueue_email(destinataires, sujet, corps_text, corps_html=None,
+                  idempotency_key=None, session=None):
+    """
+    Enfile un mail dans la transaction en cours (rien n'est envoyé ici).
+
+    `idempotency_key` : un second message de même clé est ignoré, même
+    enfilé en parallèle (contrainte unique, ON CONFLICT DO NOTHING).
+    Retourne False si la clé existait déjà.
+    """
+    session = session or db.session
+    now = datetime.utcnow()
+    values = dict(idempotency_key=idempotency_key or uuid.uuid4().hex,
+                  recipients=', '.join(destinataires), subject=sujet,
+                  body_text=corps_text, body_html=corps_html, status=PENDING,
+                  attempts=0, next_attempt_at=now, created_at=now)
+
+    dialect = session.get_bind(mapper=EmailOutbox).dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        return session.execute(_INSERT_IGNORE, values).rowcount == 1
+
+    if session.query(EmailOutbox.id).filter_by(
+            idempotency_key=values['idempotency_key']).first():
+        return False
+    session.execute(insert(EmailOutbox.__table__), values)
+    return True
+
+
+# ON CONFLICT DO NOTHING écrit en texte : les constructions des dialectes
+# (sqlite.insert().on_conflict_do_nothing()) ne sont pas mises en cache par
+# SQLAlchemy et seraient recompilées à chaque message enfilé
+_OUTBOX_COLUMNS = ('idempotency_key', 'recipients', 'subject', 'body_text',
+                   'body_html', 'status', 'attempts', 'next_attempt_at',
+                   'created_at')
+_INSERT_IGNORE = text(
+    f"INSERT INTO email_outbox ({', '.join(_OUTBOX_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in _OUTBOX_COLUMNS)}) "
+    f"ON CONFLICT (idempotency_key) DO NOTHING")
+
+
+def backoff_delay(attempts, base, maximum, jitter=0.2, rng=random):
+    """
+    Délai (s) avant la tentative suivant la `attempts`-ième : base x 2^(n-1),
+    plafonné à `maximum`, à +/- `jitter` près pour étaler les reprises.
+    """
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return delay * rng.uniform(1 - jitter, 1 + jitter)
+
+
+def is_permanent(error):
+    """Refus définitif du relais (5xx, destinataires refusés) : inutile de réessayer."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+class OutboxDispatcher:
+    """
+    Vide la table email_outbox par lots de `batch_size`.
+
+    Un lot est réservé par un jeton (claim_token) et un bail : next_attempt_at
+    est repoussé de `lease_seconds`, si bien que plusieurs dispatchers
+    peuvent tourner sans envoyer deux fois le même message, et qu'un
+    message réservé par un processus mort repart à l'expiration du bail.
+    Après `max_attempts` échecs, ou sur un refus définitif, le message
+    passe en dead (last_error conserve la cause).
+    """
+
+    def __init__(self, pool, batch_size=100, workers=8, max_attempts=8,
+                 backoff_base=30.0, backoff_max=6 * 3600.0, lease_seconds=300.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.workers = max(1, min(workers, pool.size))
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.report = DeliveryReport()
+        self.retried = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='outbox')
+
+    @classmethod
+    def from_config(cls, app, pool=None):
+        config = app.config
+        workers = config.get('OUTBOX_WORKERS', 8)
+        return cls(pool or SMTPConnectionPool(size=workers),
+                   batch_size=config.get('OUTBOX_BATCH_SIZE', 100),
+                   workers=workers,
+                   max_attempts=config.get('OUTBOX_MAX_ATTEMPTS', 8),
+                   backoff_base=config.get('OUTBOX_BACKOFF_BASE', 30.0),
+                   backoff_max=config.get('OUTBOX_BACKOFF_MAX', 6 * 3600.0),
+                   lease_seconds=config.get('OUTBOX_LEASE_SECONDS', 300.0))
+
+    def claim(self, now):
+        """Réserve le prochain lot de messages dus ; retourne (jeton, lignes)."""
+        due = (db.session.query(EmailOutbox.id)
+               .filter(EmailOutbox.status == PENDING,
+                       EmailOutbox.next_attempt_at <= now)
+               .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+               .limit(self.batch_size)
+               # PostgreSQL : deux dispatchers ne se disputent pas les lignes
+               .with_for_update(skip_locked=True))
+        ids = [row_id for row_id, in due]
+        if not ids:
+            db.session.rollback()
+            return None, []
+        token = uuid.uuid4().hex
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids), EmailOutbox.status == PENDING,
+                   EmailOutbox.next_attempt_at <= now)
+            .values(claim_token=token,
+                    next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        rows = (db.session.query(EmailOutbox.id, EmailOutbox.recipients,
+                                 EmailOutbox.subject, EmailOutbox.body_text,
+                                 EmailOutbox.body_html, EmailOutbox.attempts)
+                .filter(EmailOutbox.claim_token == token).all())
+        return token, rows
+
+    def _send(self, row):
+        destinataires = [r.strip() for r in row.recipients.split(',')]
+        msg = build_message(destinataires, row.subject, row.body_text,
+                            row.body_html)
+        started = time.monotonic()
+        try:
+            self.pool.send(destinataires, msg)
+            error = None
+        except Exception as e:
+            error = e
+        self.report.record(destinataires, time.monotonic() - started, error)
+        return row, error
+
+    def run_once(self, now=None):
+        """Envoie un lot ; retourne le nombre de messages traités."""
+        now = now or datetime.utcnow()
+        token, rows = self.claim(now)
+        if not rows:
+            return 0
+        started = time.monotonic()
+        results = list(self._executor.map(self._send, rows))
+
+        finished = datetime.utcnow()
+        sent = [row.id for row, error in results if error is None]
+        if sent:
+            db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(sent), EmailOutbox.claim_token == token)
+                .values(status=SENT, sent_at=finished, claim_token=None,
+                        attempts=EmailOutbox.attempts + 1, last_error=None)
+                .execution_options(synchronize_session=False))
+        for row, error in results:
+            if error is None:
+                continue
+            attempts = row.attempts + 1
+            values = dict(attempts=attempts, claim_token=None,
+                          last_error=f'{type(error).__name__}: {error}'[:_MAX_ERROR_LENGTH])
+            if is_permanent(error) or attempts >= self.max_attempts:
+                values['status'] = DEAD
+                self.report.dead += 1
+                current_app.logger.warning('Mail %d abandonné après %d tentative(s) : %s',
+                                           row.id, attempts, error)
+            else:
+                values['next_attempt_at'] = finished + timedelta(seconds=backoff_delay(
+                    attempts, self.backoff_base, self.backoff_max))
+                self.retried += 1
+            db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == row.id, EmailOutbox.claim_token == token)
+                .values(**values)
+                .execution_options(synchronize_session=False))
+        db.session.commit()
+        self.report.seconds += time.monotonic() - started
+        return len(rows)
+
+    def drain(self, now=None):
+        """Envoie les lots dus jusqu'à épuisement ; retourne le rapport cumulé."""
+        while self.run_once(now):
+            pass
+        return self.stats()
+
+    def run_forever(self, interval=5.0, stop=None):
+        """Boucle du dispatcher : attend `interval` s quand la file est vide."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Erreur du dispatcher de mails")
+                processed = 0
+            if not processed:
+                stop.wait(interval)
+
+    def stats(self):
+        stats = self.report.to_dict()
+        stats['retried'] = self.retried
+        stats['connections_opened'] = self.pool.opened
+        stats['reconnects'] = self.pool.reconnects
+        return stats
+
+    def close(self):
+        self._executor.shutdown()
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def dispatch_job(ctx):
+    """
+    Tâche périodique (utils/scheduler.py) : vide l'outbox, en renouvelant
+    le bail de la tâche après chaque lot.
+    """
+    with OutboxDispatcher.from_config(current_app) as dispatcher:
+        while dispatcher.run_once():
+            ctx.save()
+        return dispatcher.stats()
+
+
+def outbox_counts():
+    """Nombre de messages par statut (supervision)."""
+    rows = (db.session.query(EmailOutbox.status, db.func.count())
+            .group_by(EmailOutbox.status).all())
+    return {status: count for status, count in rows}
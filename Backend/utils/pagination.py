@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+# Taille de page par défaut et plafond accepté pour ?limit=
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidPageRequest(ValueError):
+    """Paramètres `limit` / `cursor` invalides (réponse 400)."""
+
+
+def parse_limit(raw, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """
+    Convertit le paramètre `limit` en entier borné dans [1, maximum].
+    """
+    if raw in (None, ''):
+        return default
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise InvalidPageRequest("Le paramètre 'limit' doit être un entier")
+    if limit < 1:
+        raise InvalidPageRequest("Le paramètre 'limit' doit être positif")
+    return min(limit, maximum)
+
+
+def encode_cursor(*values):
+    """
+    Encode la clé de tri de la dernière ligne d'une page en jeton opaque.
+    Les datetimes sont sérialisées en ISO 8601.
+    """
+    payload = [v.isoformat() if isinstance(v, datetime) else v
+               for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """
+    Décode un jeton produit par `encode_cursor`. `types` indique le type
+    attendu de chaque composante (datetime ou int).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for v, t in zip(values, types)
+        )
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidPageRequest("Curseur de pagination invalide")
+
+
+def keyset_page(query, columns, limit, cursor=None, descending=False):
+    """
+    Applique une pagination par clé (seek) sur `columns` au lieu d'un OFFSET :
+    le coût d'une page reste constant quelle que soit sa position.
+
+    `columns` est la clé de tri, ex. (Ebook.uploaded_at, Ebook.id) ; la
+    dernière colonne doit être unique. Retourne (lignes, next_cursor).
+    """
+    if cursor is not None:
+        seek = []
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), écrit en clair
+        # pour rester compatible avec tous les moteurs
+        for i, column in enumerate(columns):
+            equals = [c == v for c, v in zip(columns[:i], cursor[:i])]
+            step = column < cursor[i] if descending else column > cursor[i]
+            seek.append(and_(*equals, step))
+        query = query.filter(or_(*seek))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            *(getattr(last, c.key) for c in columns))
+    return rows, next_cursor
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app, jsonify
+
+
+class HashingBusy(Exception):
+    """File d'attente du hachage pleine ou délai d'attente dépassé (503)."""
+
+
+class PasswordHasher:
+    """
+    Exécute bcrypt dans un pool de threads dédié et borné.
+
+    bcrypt relâche le GIL pendant le calcul : avec des workers à threads,
+    les autres requêtes (lectures du catalogue) continuent d'être servies
+    pendant un pic de connexions. Au-delà de `max_concurrency` hachages en
+    cours et `max_queue` en attente, ou si une tâche attend plus de
+    `queue_timeout` secondes, HashingBusy est levée au lieu d'empiler.
+    """
+
+    def __init__(self, rounds=12, max_concurrency=2, max_queue=16,
+                 queue_timeout=5.0):
+        self.rounds = rounds
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix='bcrypt')
+        self._admission = threading.BoundedSemaphore(
+            max_concurrency + max_queue)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'),
+                         salt).decode('utf-8')
+
+    def verify(self, password, hashed):
+        try:
+            return self._run(bcrypt.checkpw, password.encode('utf-8'),
+                             hashed.encode('utf-8'))
+        except ValueError:
+            # hash mal formé (ex. autre algorithme)
+            return False
+
+    def needs_rehash(self, hashed):
+        """Vrai si `hashed` n'utilise pas le facteur de coût configuré."""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def record_rehash(self):
+        """Compte un hash remplacé à la connexion (facteur de coût changé)."""
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'max_concurrency': self.max_concurrency,
+                'queue_depth': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'hash_seconds_total': self.total_seconds,
+                'hash_seconds_max': self.max_seconds,
+                'queue_wait_seconds_total': self.total_wait_seconds,
+            }
+
+    def _run(self, fn, *args):
+        if not self._admission.acquire(timeout=self.queue_timeout):
+            self._reject()
+        try:
+            with self._lock:
+                self.queued += 1
+            future = self._executor.submit(
+                self._timed, time.monotonic(), fn, *args)
+            return future.result()
+        finally:
+            self._admission.release()
+
+    def _timed(self, enqueued_at, fn, *args):
+        started = time.monotonic()
+        waited = started - enqueued_at
+        with self._lock:
+            self.queued -= 1
+            self.total_wait_seconds += waited
+            if waited > self.queue_timeout:
+                # le client a probablement abandonné : inutile de calculer
+                self.rejected += 1
+                raise HashingBusy()
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise HashingBusy()
+
+
+def init_password_hasher(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        max_concurrency=app.config.get('PASSWORD_HASH_CONCURRENCY', 2),
+        max_queue=app.config.get('PASSWORD_HASH_QUEUE_SIZE', 16),
+        queue_timeout=app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0))
+
+    @app.errorhandler(HashingBusy)
+    def _hashing_busy(e):
+        response = jsonify({"msg": "Serveur occupé, veuillez réessayer"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
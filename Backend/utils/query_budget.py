@@ -0,0 +1,127 @@
+import os
+import re
+import sys
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from config import db
+
+# Mode développement / tests (opt-in) : chaque requête SQL émise pendant une
+# requête HTTP est notée avec le code de l'application qui l'a déclenchée.
+# En fin de requête :
+#   - les formes de requête répétées (même SQL, paramètres à part) sont
+#     signalées comme N+1 probables, avec leurs lieux d'appel ;
+#   - le nombre de requêtes est comparé au budget de l'endpoint
+#     (QUERY_BUDGETS) ; en TESTING un dépassement lève QueryBudgetExceeded
+#     pour faire échouer le test.
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+_PARAM = re.compile(r'%\([^)]*\)s|:\w+|\$\d+')
+_PARAM_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Une requête HTTP a exécuté plus de requêtes SQL que son budget."""
+
+
+def statement_shape(statement):
+    """SQL normalisé : paramètres et listes IN (...) ramenés à `?`."""
+    shape = _PARAM.sub('?', statement)
+    shape = _PARAM_LIST.sub('?', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def _is_app_file(filename):
+    # '<string>' : code généré par SQLAlchemy
+    if filename.startswith('<'):
+        return False
+    filename = os.path.abspath(filename)
+    return (filename.startswith(_BACKEND_DIR) and filename != _THIS_FILE
+            and 'site-packages' not in filename
+            and os.sep + 'virtual' + os.sep not in filename)
+
+
+def _call_site():
+    # Première frame du code de l'application (hors dépendances)
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if _is_app_file(code.co_filename):
+            path = os.path.relpath(os.path.abspath(code.co_filename), _BACKEND_DIR)
+            return f'{path}:{frame.f_lineno} ({code.co_name})'
+        frame = frame.f_back
+    return '?'
+
+
+def find_repeated(queries, threshold):
+    """[(forme, nombre, lieux d'appel)] des SELECT répétés `threshold` fois ou plus."""
+    counts = Counter(shape for shape, _ in queries)
+    repeated = []
+    for shape, count in counts.most_common():
+        if count < threshold or not shape.upper().startswith('SELECT'):
+            continue
+        sites = sorted({site for s, site in queries if s == shape})
+        repeated.append((shape, count, sites))
+    return repeated
+
+
+def _listen(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            log = g.get('query_log')
+            if log is not None:
+                log.append((statement_shape(statement), _call_site()))
+
+
+def init_query_budget(app):
+    """
+    Active le journal SQL par requête si QUERY_DEBUG est vrai ou si des
+    budgets sont déclarés ; sans effet (et sans coût) sinon.
+    """
+    debug = app.config.get('QUERY_DEBUG', False)
+    budgets = app.config.get('QUERY_BUDGETS') or {}
+    default_budget = app.config.get('QUERY_BUDGET_DEFAULT')
+    if not (debug or budgets or default_budget is not None):
+        return
+    threshold = app.config.get('QUERY_N1_THRESHOLD', 2)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _listen(engine)
+
+    @app.before_request
+    def _start_query_log():
+        g.query_log = []
+
+    @app.after_request
+    def _check_queries(response):
+        queries = g.pop('query_log', None)
+        if queries is None:
+            return response
+        label = f'{request.method} {request.path}'
+
+        if debug:
+            response.headers['X-Query-Count'] = str(len(queries))
+            app.logger.info('%s : %d requête(s) SQL\n%s', label, len(queries),
+                            '\n'.join(f'  {site}  {shape}' for shape, site in queries))
+
+        repeated = find_repeated(queries, threshold)
+        for shape, count, sites in repeated:
+            app.logger.warning('N+1 probable sur %s : %d x %s\n  appelé depuis %s',
+                               label, count, shape, ', '.join(sites))
+
+        budget = budgets.get(request.endpoint, default_budget)
+        if budget is not None and len(queries) > budget:
+            message = (f'{label} ({request.endpoint}) : {len(queries)} requêtes SQL '
+                       f'pour un budget de {budget}\n'
+                       + '\n'.join(f'  {site}  {shape}' for shape, site in queries))
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            app.logger.error(message)
+        return response
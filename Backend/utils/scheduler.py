@@ -0,0 +1,309 @@
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, text, update
+
+from config import db
+from models import JobLease
+from utils.check_expired_loans import reminders_job
+from utils.outbox import dispatch_job
+
+# Tâches périodiques exécutées par une seule instance à la fois :
+#   - chaque tâche a sa ligne dans job_leases ; une instance la prend par
+#     un UPDATE conditionnel (échéance atteinte, bail libre ou expiré) :
+#     une seule ligne modifiée, un seul gagnant, sur SQLite comme sur
+#     PostgreSQL, sans verrou consultatif ;
+#   - le bail est renouvelé à chaque point de reprise (JobContext.save) :
+#     si l'instance meurt, une autre reprend la tâche à l'expiration du
+#     bail, avec le dernier point de reprise enregistré ;
+#   - durée et retard de la dernière exécution restent dans la ligne
+#     (job_status(), /metrics, flask scheduler --status).
+
+_INSERT_IGNORE = text(
+    "INSERT INTO job_leases (name, next_run_at, runs, failures) "
+    "VALUES (:name, :next_run_at, 0, 0) ON CONFLICT (name) DO NOTHING")
+
+_MAX_ERROR_LENGTH = 1000
+
+
+class LeaseLost(Exception):
+    """Le bail a expiré et une autre instance a repris la tâche."""
+
+
+class Job:
+    """Tâche `func(ctx)` à lancer toutes les `interval` secondes."""
+
+    def __init__(self, name, func, interval, lease_seconds, retry_seconds):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+
+
+class JobContext:
+    """
+    Passé à la tâche : heure de démarrage et échéance prévue, point de
+    reprise (`checkpoint`, dict JSON conservé d'une exécution à l'autre).
+    """
+
+    def __init__(self, scheduler, job, started_at, scheduled_at, checkpoint):
+        self.scheduler = scheduler
+        self.job = job
+        self.started_at = started_at
+        self.scheduled_at = scheduled_at
+        self.checkpoint = checkpoint
+        self._started = time.monotonic()
+
+    @property
+    def lag(self):
+        """Retard du démarrage sur l'échéance prévue (secondes)."""
+        return max(0.0, (self.started_at - self.scheduled_at).total_seconds())
+
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    def now(self):
+        # horloge de l'exécution : started_at avance avec le temps écoulé
+        return self.started_at + timedelta(seconds=self.elapsed())
+
+    def save(self, checkpoint=None):
+        """
+        Enregistre le point de reprise et renouvelle le bail, puis commit :
+        le travail de la transaction en cours et son point de reprise sont
+        écrits ensemble. Lève LeaseLost si une autre instance a repris la
+        tâche entre-temps (la transaction est alors annulée).
+        """
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        result = db.session.execute(
+            update(JobLease)
+            .where(JobLease.name == self.job.name,
+                   JobLease.owner == self.scheduler.owner)
+            .values(checkpoint=json.dumps(self.checkpoint),
+                    lease_expires_at=self.now() + timedelta(
+                        seconds=self.job.lease_seconds))
+            .execution_options(synchronize_session=False))
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise LeaseLost(self.job.name)
+        db.session.commit()
+        return self.checkpoint
+
+
+def default_owner():
+    """Identifiant de l'instance : hôte, processus, suffixe aléatoire."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class Scheduler:
+    """
+    Lance les tâches enregistrées à leur échéance, si cette instance en
+    obtient le bail. Chaque worker (ou processus `flask scheduler`) peut
+    avoir le sien : une tâche n'est exécutée qu'une fois par intervalle.
+
+        scheduler.register('loan-reminders', 3600, reminders_job)
+        scheduler.run_pending()
+    """
+
+    def __init__(self, owner=None, lease_seconds=600.0):
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.jobs = {}
+        self._installed = False
+        self._thread = None
+
+    def register(self, name, interval, func, lease_seconds=None,
+                 retry_seconds=None):
+        """
+        `lease_seconds` : durée du bail (à renouveler par ctx.save() pour
+        les tâches plus longues) ; `retry_seconds` : nouvel essai après un
+        échec (par défaut min(interval, 60)).
+        """
+        self.jobs[name] = Job(
+            name, func, interval, lease_seconds or self.lease_seconds,
+            min(interval, 60) if retry_seconds is None else retry_seconds)
+        self._installed = False
+        return func
+
+    def _install(self, now):
+        # une ligne par tâche, créée par la première instance qui la voit
+        existing = {name for name, in db.session.query(JobLease.name)}
+        dialect = db.session.get_bind(mapper=JobLease).dialect.name
+        for name in self.jobs.keys() - existing:
+            if dialect in ('postgresql', 'sqlite'):
+                db.session.execute(_INSERT_IGNORE,
+                                   {'name': name, 'next_run_at': now})
+            else:
+                db.session.add(JobLease(name=name, next_run_at=now, runs=0,
+                                        failures=0))
+        db.session.commit()
+        self._installed = True
+
+    def acquire(self, job, now):
+        """Prend le bail de `job` s'il est dû et libre ; retourne le contexte ou None."""
+        result = db.session.execute(
+            update(JobLease)
+            .where(JobLease.name == job.name, JobLease.next_run_at <= now,
+                   or_(JobLease.owner.is_(None),
+                       JobLease.lease_expires_at <= now))
+            .values(owner=self.owner, last_started_at=now,
+                    lease_expires_at=now + timedelta(seconds=job.lease_seconds))
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        if result.rowcount != 1:
+            return None
+        scheduled_at, checkpoint = (
+            db.session.query(JobLease.next_run_at, JobLease.checkpoint)
+            .filter(JobLease.name == job.name).one())
+        return JobContext(self, job, now, scheduled_at,
+                          json.loads(checkpoint) if checkpoint else {})
+
+    def run_job(self, job, now=None):
+        """Exécute `job` si cette instance en obtient le bail ; retourne True si lancé."""
+        ctx = self.acquire(job, now or datetime.utcnow())
+        if ctx is None:
+            return False
+        try:
+            job.func(ctx)
+        except LeaseLost:
+            db.session.rollback()
+            current_app.logger.warning('Tâche %s reprise par une autre instance',
+                                       job.name)
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Échec de la tâche %s', job.name)
+            self._release(ctx, error=e)
+            return True
+        self._release(ctx)
+        return True
+
+    def _release(self, ctx, error=None):
+        job, duration = ctx.job, ctx.elapsed()
+        finished = ctx.now()
+        values = dict(owner=None, lease_expires_at=None,
+                      runs=JobLease.runs + 1, last_duration=duration,
+                      last_lag=ctx.lag)
+        if error is None:
+            # prochaine échéance de la grille : les intervalles manqués
+            # (instance arrêtée, tâche trop longue) ne sont pas rattrapés
+            missed = math.floor((finished - ctx.scheduled_at).total_seconds()
+                                / job.interval)
+            values.update(
+                next_run_at=ctx.scheduled_at + timedelta(
+                    seconds=job.interval * (max(missed, 0) + 1)),
+                last_success_at=finished, last_error=None)
+        else:
+            # le point de reprise est conservé pour l'essai suivant
+            values.update(
+                next_run_at=finished + timedelta(seconds=job.retry_seconds),
+                failures=JobLease.failures + 1,
+                last_error=f'{type(error).__name__}: {error}'[:_MAX_ERROR_LENGTH])
+        result = db.session.execute(
+            update(JobLease)
+            .where(JobLease.name == job.name, JobLease.owner == self.owner)
+            .values(**values)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        if result.rowcount != 1:
+            current_app.logger.warning('Bail de la tâche %s perdu avant la fin',
+                                       job.name)
+
+    def run_pending(self, now=None):
+        """Exécute les tâches dues dont cette instance obtient le bail ; retourne leurs noms."""
+        if not self._installed:
+            self._install(now or datetime.utcnow())
+        return [job.name for job in list(self.jobs.values())
+                if self.run_job(job, now)]
+
+    def run_forever(self, app, interval=30.0, stop=None):
+        """Boucle de l'ordonnanceur : une passe toutes les `interval` s."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            with app.app_context():
+                try:
+                    self.run_pending()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Erreur de l'ordonnanceur")
+                finally:
+                    db.session.remove()
+            stop.wait(interval)
+
+    def start(self, app, interval=30.0):
+        """Lance la boucle dans un thread démon (une par worker)."""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self.run_forever, args=(app, interval, self._stop),
+            name='scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def job_status(now=None):
+    """État des tâches périodiques (supervision), par nom de tâche."""
+    now = now or datetime.utcnow()
+    status = {}
+    rows = JobLease.query.order_by(JobLease.name)
+    for row in rows:
+        running = row.owner is not None and row.lease_expires_at > now
+        status[row.name] = {
+            'running': running,
+            'owner': row.owner if running else None,
+            'next_run_at': row.next_run_at.isoformat(),
+            # retard actuel : échéance dépassée sans exécution en cours
+            'lag_seconds': 0.0 if running else
+            max(0.0, (now - row.next_run_at).total_seconds()),
+            'last_started_at': row.last_started_at and row.last_started_at.isoformat(),
+            'last_success_at': row.last_success_at and row.last_success_at.isoformat(),
+            'last_duration_seconds': row.last_duration,
+            'last_lag_seconds': row.last_lag,
+            'runs': row.runs,
+            'failures': row.failures,
+            'last_error': row.last_error,
+        }
+    return status
+
+
+def init_scheduler(app):
+    """
+    Ordonnanceur de l'application et ses tâches, sans lancer la boucle :
+    create_app sert aussi aux commandes CLI et aux tests. Elle tourne dans
+    chaque worker gunicorn si SCHEDULER_ENABLED (start_scheduler, appelé
+    par gunicorn.conf.py ; les baux évitent les doublons), ou dans un
+    processus dédié : `flask scheduler`.
+    """
+    config = app.config
+    scheduler = app.extensions['scheduler'] = Scheduler(
+        lease_seconds=config['SCHEDULER_LEASE_SECONDS'])
+    scheduler.register('loan-reminders', config['REMINDER_INTERVAL'],
+                       reminders_job)
+    scheduler.register('outbox-dispatch', config['OUTBOX_POLL_INTERVAL'],
+                       dispatch_job)
+    return scheduler
+
+
+def start_scheduler(app):
+    """
+    Lance la boucle de l'ordonnanceur dans le worker courant si
+    SCHEDULER_ENABLED. À appeler une fois le worker créé (après le fork) :
+    un thread lancé avant, avec `gunicorn --preload`, n'y survivrait pas.
+    """
+    if not app.config['SCHEDULER_ENABLED']:
+        return None
+    return app.extensions['scheduler'].start(
+        app, app.config['SCHEDULER_POLL_INTERVAL'])
@@ -0,0 +1,195 @@
+import re
+
+from sqlalchemy import Float, Integer, or_, text
+
+from config import db
+from models import Ebook
+from schemas import ebook_schema
+from utils.pagination import encode_cursor
+
+# Index plein texte sur ebooks.title / author / description.
+#
+# SQLite : table FTS5 « external content » maintenue par des triggers, si
+# bien que toute écriture sur `ebooks` (routes, import en masse, scripts)
+# garde l'index synchronisé dans la même transaction.
+# PostgreSQL : colonne tsvector générée + index GIN, même garantie.
+
+# Poids des colonnes (titre > auteur > description)
+SQLITE_BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS ebooks_fts USING fts5(
+        title, author, description,
+        content='ebooks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS ebooks_fts_ai AFTER INSERT ON ebooks BEGIN
+        INSERT INTO ebooks_fts(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ebooks_fts_ad AFTER DELETE ON ebooks BEGIN
+        INSERT INTO ebooks_fts(ebooks_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    # Seules les colonnes indexées déclenchent une réindexation : les
+    # emprunts qui modifient available_copies ne touchent pas à l'index
+    """CREATE TRIGGER IF NOT EXISTS ebooks_fts_au
+    AFTER UPDATE OF title, author, description ON ebooks BEGIN
+        INSERT INTO ebooks_fts(ebooks_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO ebooks_fts(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+]
+
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS ebooks_fts_au",
+    "DROP TRIGGER IF EXISTS ebooks_fts_ad",
+    "DROP TRIGGER IF EXISTS ebooks_fts_ai",
+    "DROP TABLE IF EXISTS ebooks_fts",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE ebooks ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED""",
+    """CREATE INDEX IF NOT EXISTS ix_ebooks_search_vector
+    ON ebooks USING GIN (search_vector)""",
+]
+
+POSTGRES_DROP_DDL = [
+    "DROP INDEX IF EXISTS ix_ebooks_search_vector",
+    "ALTER TABLE ebooks DROP COLUMN IF EXISTS search_vector",
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def include_migration_object(obj, name, type_, reflected, compare_to):
+    """
+    Hook include_object d'alembic (migrations/env.py) : l'index plein texte
+    est créé par le DDL ci-dessus, hors des modèles. Sans ce filtre,
+    `flask db migrate` proposerait de supprimer la table ebooks_fts, ses
+    tables internes (ebooks_fts_data, _idx...) et, sur PostgreSQL, la
+    colonne search_vector et son index GIN.
+    """
+    if type_ == 'table' and name.startswith('ebooks_fts'):
+        return False
+    if reflected and compare_to is None and (
+            (type_ == 'column' and name == 'search_vector') or
+            (type_ == 'index' and name == 'ix_ebooks_search_vector')):
+        return False
+    return True
+
+
+def install_search_index(connection):
+    """
+    Crée l'index plein texte adapté au moteur s'il n'existe pas encore.
+    Sur SQLite, les livres déjà présents sont indexés à la création.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'ebooks_fts'")).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(
+                "INSERT INTO ebooks_fts(ebooks_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def rebuild_search_index(connection):
+    """Reconstruit entièrement l'index (SQLite uniquement, PG est généré)."""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            "INSERT INTO ebooks_fts(ebooks_fts) VALUES ('rebuild')"))
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query.lower())[:16]
+
+
+def search_ebooks(query, limit, cursor=None, fields=None, include=None):
+    """
+    Recherche classée par pertinence. Retourne (ebooks, scores, next_cursor) ;
+    les ebooks sont des lignes de ebook_schema.select(fields, include=include)
+    pour ebook_schema.dump_many.
+
+    `cursor` est le tuple (score, id) de la dernière ligne de la page
+    précédente : la pagination se fait par clé sur le score, qui est
+    déterministe pour un index donné.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return [], {}, None
+
+    dialect = db.session.get_bind(mapper=Ebook).dialect.name
+    if dialect == 'sqlite':
+        # Chaque terme entre guillemets (pas d'opérateurs FTS5 injectés),
+        # en préfixe pour la recherche « au fil de la frappe »
+        match = ' '.join('"%s"*' % t for t in tokens)
+        weights = ', '.join(str(w) for w in SQLITE_BM25_WEIGHTS)
+        # bm25() est négatif : plus petit = plus pertinent
+        ranked = ("SELECT rowid AS id, bm25(ebooks_fts, %s) AS score "
+                  "FROM ebooks_fts WHERE ebooks_fts MATCH :match" % weights)
+    elif dialect == 'postgresql':
+        match = ' & '.join('%s:*' % t for t in tokens)
+        ranked = ("SELECT id, -ts_rank_cd(search_vector, q) AS score "
+                  "FROM ebooks, to_tsquery('simple', :match) AS q "
+                  "WHERE search_vector @@ q")
+    else:
+        return _search_ebooks_like(tokens, limit, cursor, fields, include)
+
+    # Dans les deux cas le score est « plus petit = plus pertinent »
+    sql = "SELECT id, score FROM (%s) AS hits" % ranked
+    params = {'match': match, 'limit': limit + 1}
+    if cursor is not None:
+        sql += " WHERE score > :score OR (score = :score AND id > :id)"
+        params.update(score=cursor[0], id=cursor[1])
+    sql += " ORDER BY score ASC, id ASC LIMIT :limit"
+
+    # SELECT déclaré et lié à Ebook : RoutingSession l'envoie sur la réplique
+    ranking = text(sql).columns(id=Integer, score=Float)
+    hits = db.session.execute(ranking, params,
+                              bind_arguments={'mapper': Ebook}).all()
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1].score, hits[-1].id)
+
+    scores = {hit.id: hit.score for hit in hits}
+    ebooks = _load_in_order([hit.id for hit in hits], fields, include)
+    return ebooks, scores, next_cursor
+
+
+def _search_ebooks_like(tokens, limit, cursor=None, fields=None, include=None):
+    """Repli pour les moteurs sans index plein texte (non classé)."""
+    query = ebook_schema.select(fields, Ebook.id, include=include)
+    for token in tokens:
+        pattern = '%' + token + '%'
+        query = query.filter(or_(Ebook.title.ilike(pattern),
+                                 Ebook.author.ilike(pattern),
+                                 Ebook.description.ilike(pattern)))
+    if cursor is not None:
+        query = query.filter(Ebook.id > cursor[1])
+    ebooks = query.order_by(Ebook.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(ebooks) > limit:
+        ebooks = ebooks[:limit]
+        next_cursor = encode_cursor(0.0, ebooks[-1].id)
+    return ebooks, {e.id: 0.0 for e in ebooks}, next_cursor
+
+
+def _load_in_order(ids, fields=None, include=None):
+    # colonnes demandées seulement, pas d'entités
+    if not ids:
+        return []
+    rows = ebook_schema.select(fields, Ebook.id, include=include).filter(
+        Ebook.id.in_(ids))
+    by_id = {row.id: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
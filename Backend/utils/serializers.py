@@ -0,0 +1,288 @@
+import dataclasses
+import decimal
+import keyword
+import uuid
+from datetime import date, datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import DateTime, inspect
+from sqlalchemy.orm import ColumnProperty
+
+from config import db
+
+try:
+    import orjson
+except ImportError:  # dépendance facultative : json de la bibliothèque standard
+    orjson = None
+
+# Sérialisation des réponses :
+#   - Schema : champs déclarés une fois par modèle, compilés en une fonction
+#     `obj -> dict` (un littéral de dict, sans boucle ni getattr) et mise en
+#     cache par sélection de champs (?fields=...) ;
+#   - Schema.select : les listes lisent les seules colonnes utiles en
+#     tuples, sans hydrater d'entités ORM ;
+#   - ?include= : objets liés intégrés par une requête IN par relation ;
+#   - horodatages en ISO 8601 UTC (« 2026-01-31T08:00:00Z ») : les dates
+#     naïves de la base sont en UTC (datetime.utcnow) ;
+#   - FastJSONProvider : app.json sur orjson quand il est installé.
+
+
+# clés par IN (...) : sous la limite de paramètres de SQLite, comme selectinload
+_IN_CHUNK = 500
+
+
+class UnknownFields(ValueError):
+    """Champs ou relations demandés absents du schéma (400)."""
+
+
+def isoformat(value):
+    """Date en ISO 8601 ; les dates naïves (UTC) et UTC finissent par Z."""
+    if value is None:
+        return None
+    offset = value.utcoffset()
+    if offset is None or offset == timedelta(0):
+        return value.replace(tzinfo=None).isoformat() + 'Z'
+    return value.isoformat()
+
+
+class Field:
+    """
+    Champ d'un schéma : `name` dans la réponse, lu sur `attribute` (même nom
+    par défaut). `default` remplace une valeur vide (None, ''), `iso`
+    force le format ISO (déduit des colonnes DateTime du modèle).
+    """
+
+    def __init__(self, name, attribute=None, default=None, iso=None):
+        self.name = name
+        self.attribute = attribute or name
+        self.default = default
+        self.iso = iso
+
+
+class Schema:
+    """
+    Représentation JSON d'un modèle. Fonctionne aussi sur les lignes de
+    requêtes par colonnes (accès par attribut).
+
+        ebook_schema = Schema(Ebook, 'id', 'title', 'uploaded_at')
+        ebook_schema.dump(ebook, fields=['id', 'title'])
+        ebook_schema.dump_many(ebooks)
+        loan_schema.dump_many(loans, include={'ebook': ['id', 'title']})
+    """
+
+    def __init__(self, model, *fields, includes=None):
+        self.model = model
+        # relations du modèle intégrables (?include=) -> schéma de la cible
+        self.includes = dict(includes or {})
+        columns = inspect(model).columns
+        self.fields = {}
+        for field in fields:
+            if isinstance(field, str):
+                field = Field(field)
+            if not field.attribute.isidentifier() or keyword.iskeyword(field.attribute):
+                raise ValueError(f"Attribut invalide : {field.attribute!r}")
+            if field.iso is None:
+                column = columns.get(field.attribute)
+                field.iso = column is not None and isinstance(column.type, DateTime)
+            self.fields[field.name] = field
+        self._serializers = {}
+
+    def only(self, fields):
+        """Noms des champs demandés, dans l'ordre du schéma ; UnknownFields sinon."""
+        if fields is None:
+            return tuple(self.fields)
+        unknown = set(fields) - self.fields.keys()
+        if unknown:
+            raise UnknownFields(
+                f"Champs inconnus : {', '.join(sorted(unknown))} "
+                f"(disponibles : {', '.join(self.fields)})")
+        return tuple(name for name in self.fields if name in fields)
+
+    def selection(self, args):
+        """
+        Champs et relations demandés dans les paramètres de requête :
+        ?fields=id,title, ?include=ebook,user et ?fields[ebook]=id,title.
+        Retourne (fields, include) pour select / dump_many ; UnknownFields
+        si un nom est inconnu.
+        """
+        fields = _names(args.get('fields'))
+        if fields is not None:
+            self.only(fields)
+        include = {}
+        for name in _names(args.get('include')) or ():
+            schema = self.includes.get(name)
+            if schema is None:
+                raise UnknownFields(
+                    f"Relation inconnue : {name} "
+                    f"(disponibles : {', '.join(self.includes) or 'aucune'})")
+            include[name] = _names(args.get(f'fields[{name}]'))
+            if include[name] is not None:
+                schema.only(include[name])
+        return fields, include
+
+    def serializer(self, fields=None):
+        """Fonction `obj -> dict` pour ces champs (compilée une seule fois)."""
+        names = self.only(fields)
+        serialize = self._serializers.get(names)
+        if serialize is None:
+            serialize = self._serializers[names] = self._compile(names)
+        return serialize
+
+    def _compile(self, names):
+        namespace = {'_iso': isoformat}
+        items = []
+        for i, name in enumerate(names):
+            field = self.fields[name]
+            expr = f'obj.{field.attribute}'
+            if field.iso:
+                # cas courant (date naïve de la base) sans appel de fonction
+                expr = (f"(_v.isoformat() + 'Z' if (_v := {expr}) is not None"
+                        f" and _v.tzinfo is None else _iso(_v))")
+            if field.default is not None:
+                namespace[f'_default{i}'] = field.default
+                expr = f'({expr} or _default{i})'
+            items.append(f'{name!r}: {expr}')
+        source = f"def serialize(obj):\n    return {{{', '.join(items)}}}\n"
+        exec(compile(source, f'<schema {self.model.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+    def columns(self, fields=None, *extra, include=None):
+        """
+        Colonnes à lire pour ces champs, plus `extra` (clé de tri d'une
+        pagination) et les clés des relations de `include`, sans doublon.
+        Les colonnes non demandées (ex. Ebook.description) ne sont pas lues.
+        """
+        columns = {}
+        for name in self.only(fields):
+            attribute = self.fields[name].attribute
+            column = getattr(self.model, attribute, None)
+            if not isinstance(getattr(column, 'property', None), ColumnProperty):
+                raise ValueError(
+                    f"{self.model.__name__}.{attribute} n'est pas une colonne")
+            columns[attribute] = column
+        for name in include or ():
+            local, _ = self._relation(name).local_remote_pairs[0]
+            extra += (getattr(self.model, self._attribute(local)),)
+        for column in extra:
+            columns.setdefault(column.key, column)
+        return list(columns.values())
+
+    def select(self, fields=None, *extra, include=None):
+        """
+        Requête par colonnes : lignes (tuples nommés) au lieu d'entités, sans
+        identity map ni état d'instance ; dump / dump_many les acceptent.
+
+            rows = user_schema.select().order_by(User.id)
+            user_schema.dump_many(rows)
+        """
+        return db.session.query(*self.columns(fields, *extra, include=include))
+
+    def _relation(self, name):
+        return inspect(self.model).relationships[name]
+
+    def _attribute(self, column):
+        return inspect(self.model).get_property_by_column(column).key
+
+    def _embed(self, name, fields, objs, dumped):
+        # équivalent de selectinload pour entités comme pour tuples : une
+        # requête IN par relation et par tranche de clés, quelle que soit
+        # la taille de la page, uniquement sur les colonnes demandées
+        relation, schema = self._relation(name), self.includes[name]
+        local, remote = relation.local_remote_pairs[0]
+        key = self._attribute(local)
+        serialize = schema.serializer(fields)
+        values = sorted({getattr(obj, key) for obj in objs} - {None})
+        query = db.session.query(remote.label('include_key'),
+                                 *schema.columns(fields))
+        if relation.secondary is not None:
+            query = (query.select_from(schema.model)
+                     .join(relation.secondary, relation.secondaryjoin))
+        query = query.order_by(*inspect(schema.model).primary_key)
+        related = {}
+        for start in range(0, len(values), _IN_CHUNK):
+            chunk = values[start:start + _IN_CHUNK]
+            for row in query.filter(remote.in_(chunk)):
+                related.setdefault(row[0], []).append(serialize(row))
+        for obj, data in zip(objs, dumped):
+            items = related.get(getattr(obj, key), [])
+            data[name] = items if relation.uselist else (items[0] if items else None)
+
+    def dump(self, obj, fields=None, include=None):
+        if include:
+            return self.dump_many([obj], fields, include)[0]
+        return self.serializer(fields)(obj)
+
+    def dump_many(self, objs, fields=None, include=None):
+        """
+        Dicts des objets (entités ou lignes de select()) ; `include`
+        ({relation: champs ou None}) y intègre les objets liés.
+        """
+        serialize = self.serializer(fields)
+        if not include:
+            return [serialize(obj) for obj in objs]
+        objs = list(objs)
+        dumped = [serialize(obj) for obj in objs]
+        for name, include_fields in include.items():
+            self._embed(name, include_fields, objs, dumped)
+        return dumped
+
+
+def _names(raw):
+    """'id, title' -> ['id', 'title'] ; None si le paramètre est absent ou vide."""
+    names = [name.strip() for name in (raw or '').split(',') if name.strip()]
+    return names or None
+
+
+def json_default(obj):
+    """Types hors JSON (repli de json.dumps et d'orjson)."""
+    if isinstance(obj, datetime):
+        return isoformat(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    # mêmes dates que isoformat() ; clés non textuelles converties comme json
+    _ORJSON_OPTIONS = (orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+                       | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    app.json : orjson (C, UTF-8 direct, clés non triées) s'il est installé,
+    sinon json avec les mêmes dates ISO. Les appels avec des options de
+    json.dumps (indent, cls...) passent par json.
+    """
+
+    default = staticmethod(json_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=json_default,
+                            option=_ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = _ORJSON_OPTIONS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=json_default, option=option) + b'\n',
+            mimetype=self.mimetype)
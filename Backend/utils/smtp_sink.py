@@ -0,0 +1,130 @@
+import base64
+import socketserver
+import threading
+import time
+
+
+class SMTPSink:
+    """
+    Serveur SMTP local minimal (tests, benchmarks, développement) : accepte
+    tout message et le garde en mémoire au lieu de le remettre.
+
+    Sans dépendance (smtpd a disparu de Python 3.12) ; EHLO, AUTH PLAIN,
+    MAIL, RCPT, DATA, RSET, NOOP et QUIT suffisent à smtplib. `handshake_delay`
+    et `message_delay` simulent la latence d'un vrai relais (secondes),
+    `max_messages` ferme la session après N messages comme certains relais,
+    et les adresses de `rejected` sont refusées (550).
+
+        with SMTPSink() as sink:
+            pool = SMTPConnectionPool('127.0.0.1', sink.port, use_tls=False)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, handshake_delay=0.0,
+                 message_delay=0.0, max_messages=None, rejected=()):
+        self.handshake_delay = handshake_delay
+        self.message_delay = message_delay
+        self.max_messages = max_messages
+        self.rejected = set(rejected)
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        sink._count('connections')
+        time.sleep(sink.handshake_delay)
+        self.reply('220 smtp-sink ESMTP')
+        sender, recipients, delivered = None, [], 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.reply('250-smtp-sink')
+                self.reply('250-AUTH PLAIN')
+                self.reply('250 8BITMIME')
+            elif command == 'HELO':
+                self.reply('250 smtp-sink')
+            elif command == 'AUTH':
+                # le mot de passe n'est pas vérifié, seulement décodable
+                mechanism, _, token = argument.partition(' ')
+                try:
+                    base64.b64decode(token, validate=True)
+                except ValueError:
+                    self.reply('501 invalid credentials')
+                    continue
+                time.sleep(sink.handshake_delay)
+                sink._count('logins')
+                self.reply('235 authenticated')
+            elif command == 'MAIL':
+                sender, recipients = argument.partition(':')[2].strip('<> '), []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipient = argument.partition(':')[2].strip('<> ')
+                if recipient in sink.rejected:
+                    self.reply('550 mailbox unavailable')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                time.sleep(sink.message_delay)
+                with sink._lock:
+                    sink.messages.append((sender, recipients, b''.join(lines)))
+                delivered += 1
+                self.reply('250 queued')
+                if sink.max_messages and delivered >= sink.max_messages:
+                    self.reply('421 too many messages, closing')
+                    return
+            elif command in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 command not implemented')
@@ -0,0 +1,315 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import func, insert, select, text, update
+
+from models import Category, Ebook, Loan, User, ebook_category
+from utils.search import SQLITE_DROP_DDL, install_search_index
+
+# Générateur de bibliothèque synthétique pour les tests de capacité :
+# utilisateurs, catégories, ebooks, liens ebook/catégorie et historique
+# d'emprunts. Les lignes sont produites sous forme de tuples et chargées
+# par COPY sur PostgreSQL, par insertions Core en lots ailleurs. Même
+# graine, mêmes données (un générateur aléatoire par table).
+#
+# Réalisme : la popularité des ebooks et des catégories, ainsi que
+# l'activité des lecteurs, suivent une loi de Zipf (`skew`) ; une part des
+# prêts est en cours (`open_fraction`), dont une part en retard
+# (`overdue_fraction`).
+
+FIRST_NAMES = ('alice', 'bruno', 'chloe', 'david', 'emma', 'farid', 'gabriel',
+               'hugo', 'ines', 'jules', 'karim', 'lea', 'manon', 'nathan',
+               'olivia', 'paul', 'quentin', 'rose', 'samuel', 'theo', 'ursula',
+               'victor', 'wendy', 'yanis', 'zoe')
+LAST_NAMES = ('martin', 'bernard', 'dubois', 'thomas', 'robert', 'richard',
+              'petit', 'durand', 'leroy', 'moreau', 'simon', 'laurent',
+              'lefebvre', 'michel', 'garcia', 'david', 'bertrand', 'roux',
+              'vincent', 'fournier', 'morel', 'girard', 'andre', 'mercier')
+WORDS = ('atlas', 'jardin', 'histoire', 'python', 'ocean', 'musique',
+         'cuisine', 'voyage', 'science', 'roman', 'poesie', 'algebre',
+         'economie', 'montagne', 'planete', 'memoire', 'lumiere', 'reseau',
+         'donnees', 'medecine', 'philosophie', 'theatre', 'biologie',
+         'architecture', 'cinema', 'nuit', 'riviere', 'empire', 'secret',
+         'machine', 'silence', 'frontiere', 'hiver', 'royaume', 'ville',
+         'enquete', 'chimie', 'desert', 'foret', 'etoile')
+CATEGORY_NAMES = ('Informatique', 'Science', 'Littérature', 'Éducation',
+                  'Histoire', 'Philosophie', 'Art', 'Cuisine', 'Voyage',
+                  'Économie', 'Santé', 'Jeunesse', 'Policier',
+                  'Science-fiction', 'Fantasy', 'Biographie', 'Poésie',
+                  'Théâtre', 'Musique', 'Droit')
+
+LOAN_DAYS = 14
+
+
+def synthetic_email(user_id):
+    """Email de l'utilisateur synthétique `user_id` (connexions de test)."""
+    return f'{_user_name(user_id)}@example.test'
+
+
+def _user_name(user_id):
+    first = FIRST_NAMES[user_id % len(FIRST_NAMES)]
+    last = LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f'{first}.{last}{user_id}'
+
+
+def zipf_cum_weights(n, skew):
+    """Poids cumulés d'une loi de Zipf sur n rangs (pour random.choices)."""
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def _ranked(rng, n):
+    # Les rangs de popularité sont répartis au hasard sur les identifiants
+    ids = list(range(1, n + 1))
+    rng.shuffle(ids)
+    return ids
+
+
+# =====================================================
+# Générateurs de lignes
+# =====================================================
+USER_COLUMNS = ('id', 'username', 'email', 'password', 'is_admin',
+                'created_at', 'token_version')
+CATEGORY_COLUMNS = ('id', 'name', 'description')
+EBOOK_COLUMNS = ('id', 'title', 'author', 'description', 'cover_image',
+                 'file_path', 'total_copies', 'available_copies', 'uploaded_at')
+LINK_COLUMNS = ('ebook_id', 'category_id')
+LOAN_COLUMNS = ('id', 'user_id', 'ebook_id', 'loan_date', 'due_date',
+                'return_date', 'is_returned')
+
+
+def generate_users(rng, count, password_hash, now, history_days):
+    # L'utilisateur 1 est administrateur
+    for user_id in range(1, count + 1):
+        created_at = now - timedelta(days=rng.uniform(0, history_days))
+        yield (user_id, _user_name(user_id), synthetic_email(user_id),
+               password_hash, user_id == 1, created_at, 0)
+
+
+def generate_categories(count):
+    for category_id in range(1, count + 1):
+        base = CATEGORY_NAMES[(category_id - 1) % len(CATEGORY_NAMES)]
+        cycle = (category_id - 1) // len(CATEGORY_NAMES)
+        name = base if cycle == 0 else f'{base} {cycle + 1}'
+        yield (category_id, name, f'Livres : {name.lower()}')
+
+
+def generate_ebooks(rng, count, copies, now, history_days):
+    for ebook_id in range(1, count + 1):
+        title = ' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+        author = (f'{rng.choice(FIRST_NAMES).title()} '
+                  f'{rng.choice(LAST_NAMES).title()}')
+        description = ' '.join(rng.choices(WORDS, k=rng.randint(10, 40)))
+        uploaded_at = now - timedelta(seconds=rng.uniform(0, history_days * 86400))
+        # numéro de tome : (title, author) est unique (uq_ebooks_title_author)
+        tome = f' {ebook_id}'
+        title = title.capitalize()[:40 - len(tome)] + tome
+        yield (ebook_id, title, author, description,
+               f'uploads/covers/{ebook_id}.jpg', f'uploads/{ebook_id}.pdf',
+               copies[ebook_id - 1], copies[ebook_id - 1], uploaded_at)
+
+
+def generate_links(rng, ebooks, categories, skew):
+    # 1 à 3 catégories par ebook, les catégories populaires plus souvent
+    ranked = _ranked(rng, categories)
+    weights = zipf_cum_weights(categories, skew)
+    for ebook_id in range(1, ebooks + 1):
+        chosen = set(rng.choices(ranked, cum_weights=weights,
+                                 k=rng.randint(1, min(3, categories))))
+        for category_id in sorted(chosen):
+            yield (ebook_id, category_id)
+
+
+def generate_loans(rng, count, users, copies, now, skew, open_fraction,
+                   overdue_fraction, history_days, chunk=10000):
+    """
+    Historique d'emprunts. `copies` (copies par ebook) est décrémenté pour
+    chaque prêt en cours : un prêt n'est laissé ouvert que s'il reste une
+    copie, comme le ferait la route d'emprunt.
+    """
+    ebook_ids = _ranked(rng, len(copies))
+    ebook_weights = zipf_cum_weights(len(copies), skew)
+    user_ids = _ranked(rng, users)
+    user_weights = zipf_cum_weights(users, skew)
+    loan_id = 0
+    while loan_id < count:
+        k = min(chunk, count - loan_id)
+        picked_ebooks = rng.choices(ebook_ids, cum_weights=ebook_weights, k=k)
+        picked_users = rng.choices(user_ids, cum_weights=user_weights, k=k)
+        for ebook_id, user_id in zip(picked_ebooks, picked_users):
+            loan_id += 1
+            is_open = rng.random() < open_fraction and copies[ebook_id - 1] > 0
+            if is_open:
+                copies[ebook_id - 1] -= 1
+                if rng.random() < overdue_fraction:
+                    loan_date = now - timedelta(days=rng.uniform(LOAN_DAYS + 1, LOAN_DAYS + 60))
+                else:
+                    loan_date = now - timedelta(days=rng.uniform(0, LOAN_DAYS))
+                return_date = None
+            else:
+                loan_date = now - timedelta(days=rng.uniform(LOAN_DAYS, history_days))
+                # rendu en avance ou jusqu'à une semaine de retard
+                return_date = loan_date + timedelta(days=rng.uniform(1, LOAN_DAYS + 7))
+            yield (loan_id, user_id, ebook_id, loan_date,
+                   loan_date + timedelta(days=LOAN_DAYS), return_date,
+                   not is_open)
+
+
+# =====================================================
+# Chargement
+# =====================================================
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy_value(value):
+    if value is None:
+        return None     # champ vide non cité = NULL en CSV
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def _copy_chunk(connection, table, columns, chunk):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chunk:
+        writer.writerow([_copy_value(v) for v in row])
+    buffer.seek(0)
+    statement = (f"COPY {table.name} ({', '.join(columns)}) "
+                 f"FROM STDIN WITH (FORMAT csv)")
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):         # psycopg2
+            cursor.copy_expert(statement, buffer)
+        else:                                       # psycopg 3
+            with cursor.copy(statement) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def _sqlite_value(value):
+    # Même format texte que le type DateTime de SQLAlchemy sur SQLite
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def bulk_load(connection, table, columns, rows, batch_size=10000):
+    """
+    Charge `rows` (tuples dans l'ordre de `columns`) ; renvoie le nombre.
+    PostgreSQL : COPY. SQLite : executemany direct du pilote, sans
+    traitement des paramètres par ligne. Autres moteurs : insert() Core.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statement = (f"INSERT INTO {table.name} ({', '.join(columns)}) "
+                     f"VALUES ({', '.join('?' * len(columns))})")
+    else:
+        statement = insert(table)
+    total = 0
+    for chunk in _chunks(rows, batch_size):
+        if dialect == 'postgresql':
+            _copy_chunk(connection, table, columns, chunk)
+        elif dialect == 'sqlite':
+            connection.exec_driver_sql(
+                statement, [tuple(map(_sqlite_value, row)) for row in chunk])
+        else:
+            connection.execute(statement, [dict(zip(columns, row)) for row in chunk])
+        total += len(chunk)
+    return total
+
+
+def _tables():
+    return (User.__table__, Category.__table__, Ebook.__table__,
+            ebook_category, Loan.__table__)
+
+
+def seed_synthetic(connection, users=1000, ebooks=10000, categories=20,
+                   loans=50000, seed=42, skew=0.9, open_fraction=0.1,
+                   overdue_fraction=0.3, history_days=730,
+                   password_hash='', batch_size=10000, now=None,
+                   progress=None):
+    """
+    Charge une bibliothèque synthétique dans des tables vides. Les index
+    secondaires (et, sur SQLite, l'index plein texte) sont supprimés pendant
+    le chargement puis reconstruits en une passe. Les dates sont relatives
+    à `now` (minuit UTC du jour par défaut, pour que les retards soient
+    réels). Renvoie {table: (lignes, secondes)}.
+    """
+    dialect = connection.dialect.name
+    if now is None:
+        now = datetime.utcnow().replace(hour=0, minute=0, second=0,
+                                        microsecond=0)
+    report = {}
+
+    def load(table, columns, rows):
+        started = time.perf_counter()
+        count = bulk_load(connection, table, columns, rows, batch_size)
+        report[table.name] = (count, time.perf_counter() - started)
+        if progress is not None:
+            progress(table.name, *report[table.name])
+
+    indexes = [index for table in _tables() for index in table.indexes]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    if dialect == 'sqlite':
+        for statement in SQLITE_DROP_DDL:
+            connection.execute(text(statement))
+
+    ebook_rng = random.Random(f'{seed}:ebooks')
+    copies = [ebook_rng.randint(1, 10) for _ in range(ebooks)]
+
+    load(User.__table__, USER_COLUMNS,
+         generate_users(random.Random(f'{seed}:users'), users, password_hash,
+                        now, history_days))
+    load(Category.__table__, CATEGORY_COLUMNS, generate_categories(categories))
+    load(Ebook.__table__, EBOOK_COLUMNS,
+         generate_ebooks(ebook_rng, ebooks, copies, now, history_days))
+    if categories:
+        load(ebook_category, LINK_COLUMNS,
+             generate_links(random.Random(f'{seed}:links'), ebooks,
+                            categories, skew))
+    if users and ebooks:
+        load(Loan.__table__, LOAN_COLUMNS,
+             generate_loans(random.Random(f'{seed}:loans'), loans, users,
+                            list(copies), now, skew, open_fraction,
+                            overdue_fraction, history_days))
+
+    started = time.perf_counter()
+    for index in indexes:
+        index.create(connection)
+    # Copies disponibles = total - prêts en cours, pour les seuls ebooks
+    # empruntés (index partiel ix_loans_open_due_date)
+    open_loans = (select(func.count()).select_from(Loan)
+                  .where(Loan.ebook_id == Ebook.id, Loan.return_date.is_(None))
+                  .scalar_subquery())
+    connection.execute(
+        update(Ebook)
+        .where(Ebook.id.in_(select(Loan.ebook_id)
+                            .where(Loan.return_date.is_(None))))
+        .values(available_copies=Ebook.total_copies - open_loans))
+    if dialect == 'postgresql':
+        # Identifiants explicites : recaler les séquences
+        for table in ('users', 'categories', 'ebooks', 'loans'):
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+    install_search_index(connection)
+    report['indexes'] = (len(indexes), time.perf_counter() - started)
+    if progress is not None:
+        progress('indexes', *report['indexes'])
+    return report
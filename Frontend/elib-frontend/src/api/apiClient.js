@@ -7,10 +7,16 @@ const apiClient = axios.create({
     withCredentials: true,
 });
 
+// Épinglage au primaire après une écriture (lectures sur réplique côté
+// API) : valeur signée renvoyée par le serveur, répétée telle quelle
+const PIN_HEADER = 'X-DB-Primary-Until';
+let primaryPin = null;
+
 apiClient.interceptors.request.use(
     (config) => {
         const token = localStorage.getItem('token');
         if (token) config.headers.Authorization = `Bearer ${token}`;
+        if (primaryPin) config.headers[PIN_HEADER] = primaryPin;
         return config;
     },
     (error) => Promise.reject(error)
@@ -18,6 +24,9 @@ apiClient.interceptors.request.use(
 
 apiClient.interceptors.response.use(
     (response) => {
+        const pin = response.headers?.[PIN_HEADER.toLowerCase()];
+        if (pin) primaryPin = pin;
+
         // Affiche un succès seulement si le backend renvoie un message
         const method = response.config?.method?.toLowerCase();
         const message =
@@ -59,4 +68,17 @@ apiClient.interceptors.response.use(
     }
 );
 
+// Suit next_cursor jusqu'à la dernière page (listes paginées par curseur)
+// et renvoie tous les éléments de `key` : getAllPages('/ebooks', 'ebooks')
+export const getAllPages = async (url, key, params = {}) => {
+    const items = [];
+    let cursor;
+    do {
+        const { data } = await apiClient.get(url, { params: { limit: 200, ...params, cursor } });
+        items.push(...(data[key] || []));
+        cursor = data.next_cursor;
+    } while (cursor);
+    return items;
+};
+
 export default apiClient;
@@ -2,7 +2,10 @@
 import apiClient from './apiClient';
 
 // EBOOKS endpoints
-export const getBooks = () => apiClient.get('/ebooks');
+// params : { limit, cursor, fields, include }
+export const getBooks = (params = {}) => apiClient.get('/ebooks', { params });
+// recherche plein texte côté serveur, paginée comme la liste (next_cursor)
+export const searchBooks = (q, params = {}) => apiClient.get('/ebooks/search', { params: { q, ...params } });
 export const getBookById = (id) => apiClient.get(`/ebooks/${id}`);
 export const createBook = (data) => apiClient.post('/ebooks', data);
 export const updateBook = (id, data) => apiClient.put(`/ebooks/${id}`, data);
@@ -1,6 +1,10 @@
-import apiClient from './apiClient';
+import apiClient, { getAllPages } from './apiClient';
 
-export const getLoans = () => apiClient.get('/loans');
+// params : { status: 'active'|'returned'|'overdue', due_before, due_after, sort, limit, cursor }
+export const getLoans = (params = {}) => apiClient.get('/loans', { params });
+export const getUserLoans = (userId, params = {}) => apiClient.get(`/users/${userId}/loans`, { params });
+// tous les prêts d'un utilisateur vérifiant `params`, toutes pages suivies
+export const getAllUserLoans = (userId, params = {}) => getAllPages(`/users/${userId}/loans`, 'loans', params);
 export const getLoanById = (id) => apiClient.get(`/loans/${id}`);
 export const createLoan = (bookId) => apiClient.post('/loans', { ebook_id: bookId });
 export const returnLoan = (loanId) => apiClient.put(`/loans/${loanId}`);
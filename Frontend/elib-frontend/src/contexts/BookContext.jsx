@@ -1,7 +1,8 @@
 // src/context/BookContext.jsx
-import React, { createContext, useContext, useReducer, useEffect, useCallback } from 'react';
+import React, { createContext, useContext, useReducer, useEffect, useCallback, useRef } from 'react';
 import {
   getBooks,
+  searchBooks as searchBooksApi,
   getBookById,
   createBook,
   updateBook,
@@ -9,8 +10,14 @@ import {
   getCategories
 } from '../api/bookApi';
 
+// livres chargés par page (liste ou recherche) ; catégories intégrées pour le filtre
+const PAGE_SIZE = 24;
+const PAGE_PARAMS = { limit: PAGE_SIZE, include: 'categories' };
+
 const initialState = {
   books: [],
+  nextCursor: null,
+  isLoadingMore: false,
   categories: [],
   currentBook: null,
   isLoading: false,
@@ -29,6 +36,8 @@ const BOOK_ACTIONS = {
   SET_ERROR: 'SET_ERROR',
   CLEAR_ERROR: 'CLEAR_ERROR',
   FETCH_BOOKS_SUCCESS: 'FETCH_BOOKS_SUCCESS',
+  SET_LOADING_MORE: 'SET_LOADING_MORE',
+  FETCH_MORE_BOOKS_SUCCESS: 'FETCH_MORE_BOOKS_SUCCESS',
   FETCH_CATEGORIES_SUCCESS: 'FETCH_CATEGORIES_SUCCESS',
   FETCH_BOOK_SUCCESS: 'FETCH_BOOK_SUCCESS',
   ADD_BOOK_SUCCESS: 'ADD_BOOK_SUCCESS',
@@ -45,11 +54,27 @@ const bookReducer = (state, action) => {
     case BOOK_ACTIONS.SET_LOADING:
       return { ...state, isLoading: action.payload };
     case BOOK_ACTIONS.SET_ERROR:
-      return { ...state, error: action.payload, isLoading: false };
+      return { ...state, error: action.payload, isLoading: false, isLoadingMore: false };
     case BOOK_ACTIONS.CLEAR_ERROR:
       return { ...state, error: null };
     case BOOK_ACTIONS.FETCH_BOOKS_SUCCESS:
-      return { ...state, books: action.payload, isLoading: false, error: null };
+      return {
+        ...state,
+        books: action.payload.books,
+        nextCursor: action.payload.nextCursor,
+        isLoading: false,
+        error: null
+      };
+    case BOOK_ACTIONS.SET_LOADING_MORE:
+      return { ...state, isLoadingMore: action.payload };
+    case BOOK_ACTIONS.FETCH_MORE_BOOKS_SUCCESS:
+      return {
+        ...state,
+        books: [...state.books, ...action.payload.books],
+        nextCursor: action.payload.nextCursor,
+        isLoadingMore: false,
+        error: null
+      };
     case BOOK_ACTIONS.FETCH_CATEGORIES_SUCCESS:
       return { ...state, categories: action.payload, isLoading: false, error: null };
     case BOOK_ACTIONS.FETCH_BOOK_SUCCESS:
@@ -94,19 +119,53 @@ const BookContext = createContext();
 
 export const BookProvider = ({ children }) => {
   const [state, dispatch] = useReducer(bookReducer, initialState);
+  // dernière liste demandée : la réponse d'une recherche dépassée est ignorée
+  const listRequest = useRef(0);
+
+  // une page de la liste, ou des résultats de /ebooks/search si une recherche est saisie
+  const fetchPage = (query, cursor) => {
+    const params = { ...PAGE_PARAMS, cursor };
+    return query ? searchBooksApi(query, params) : getBooks(params);
+  };
 
   const fetchBooks = useCallback(async () => {
+    const request = ++listRequest.current;
     dispatch({ type: BOOK_ACTIONS.SET_LOADING, payload: true });
     try {
-      const res = await getBooks();
-      dispatch({ type: BOOK_ACTIONS.FETCH_BOOKS_SUCCESS, payload: res.data.ebooks });
+      const res = await fetchPage(state.searchQuery);
+      if (request !== listRequest.current) return;
+      dispatch({
+        type: BOOK_ACTIONS.FETCH_BOOKS_SUCCESS,
+        payload: { books: res.data.ebooks, nextCursor: res.data.next_cursor }
+      });
     } catch (err) {
+      if (request !== listRequest.current) return;
       dispatch({
         type: BOOK_ACTIONS.SET_ERROR,
         payload: err.response?.data?.msg || 'Erreur lors du chargement des livres'
       });
     }
-  }, []);
+  }, [state.searchQuery]);
+
+  const loadMoreBooks = useCallback(async () => {
+    if (!state.nextCursor || state.isLoadingMore) return;
+    const request = listRequest.current;
+    dispatch({ type: BOOK_ACTIONS.SET_LOADING_MORE, payload: true });
+    try {
+      const res = await fetchPage(state.searchQuery, state.nextCursor);
+      if (request !== listRequest.current) return;
+      dispatch({
+        type: BOOK_ACTIONS.FETCH_MORE_BOOKS_SUCCESS,
+        payload: { books: res.data.ebooks, nextCursor: res.data.next_cursor }
+      });
+    } catch (err) {
+      if (request !== listRequest.current) return;
+      dispatch({
+        type: BOOK_ACTIONS.SET_ERROR,
+        payload: err.response?.data?.msg || 'Erreur lors du chargement des livres'
+      });
+    }
+  }, [state.searchQuery, state.nextCursor, state.isLoadingMore]);
 
   const fetchCategories = useCallback(async () => {
     try {
@@ -189,14 +248,9 @@ export const BookProvider = ({ children }) => {
     dispatch({ type: BOOK_ACTIONS.CLEAR_ERROR }), []
   );
 
+  // la recherche est faite par le serveur ; restent les filtres sur les pages chargées
   const getFilteredBooks = useCallback(() => {
     let filtered = Array.isArray(state.books) ? [...state.books] : [];
-    if (state.searchQuery) {
-      filtered = filtered.filter(b =>
-        b.title.toLowerCase().includes(state.searchQuery.toLowerCase()) ||
-        b.author.toLowerCase().includes(state.searchQuery.toLowerCase())
-      );
-    }
     if (state.selectedCategory) {
       filtered = filtered.filter(b =>
         b.categories?.some(c => c.id === state.selectedCategory)
@@ -206,16 +260,22 @@ export const BookProvider = ({ children }) => {
       filtered = filtered.filter(b => b.available_copies > 0);
     }
     return filtered;
-  }, [state.books, state.searchQuery, state.selectedCategory, state.filters.available]);
+  }, [state.books, state.selectedCategory, state.filters.available]);
 
+  // première page, rechargée à chaque nouvelle recherche
   useEffect(() => {
     fetchBooks();
+  }, [fetchBooks]);
+
+  useEffect(() => {
     fetchCategories();
-  }, [fetchBooks, fetchCategories]);
+  }, [fetchCategories]);
 
   const value = {
     ...state,
+    hasMoreBooks: Boolean(state.nextCursor),
     fetchBooks,
+    loadMoreBooks,
     fetchCategories,
     fetchBook,
     addBook,
@@ -1,7 +1,7 @@
 import React, { createContext, useContext, useReducer, useEffect, useCallback } from 'react';
 import { useAuth } from './AuthContext';
 import {
-  getLoans as fetchAllLoans,
+  getAllUserLoans,
   getLoanById,
   createLoan as createNewLoan,
   returnLoan,
@@ -10,7 +10,11 @@ import {
 
 // État initial
 const initialState = {
+  // prêts de l'utilisateur connecté : en cours et rendus, chargés
+  // séparément (status=active / status=returned) et en entier
   loans: [],
+  activeLoans: [],
+  returnedLoans: [],
   currentLoan: null,
   isLoading: false,
   error: null,
@@ -35,6 +39,13 @@ const LOAN_ACTIONS = {
   SET_STATS: 'SET_STATS'
 };
 
+// Listes dérivées des prêts chargés
+const splitLoans = (loans) => ({
+  loans,
+  activeLoans: loans.filter(l => !l.is_returned),
+  returnedLoans: loans.filter(l => l.is_returned)
+});
+
 // Reducer pour gérer l'état
 const loanReducer = (state, action) => {
   switch (action.type) {
@@ -45,22 +56,22 @@ const loanReducer = (state, action) => {
     case LOAN_ACTIONS.CLEAR_ERROR:
       return { ...state, error: null };
     case LOAN_ACTIONS.FETCH_LOANS_SUCCESS:
-      return { ...state, loans: action.payload, isLoading: false, error: null };
+      return { ...state, ...splitLoans(action.payload), isLoading: false, error: null };
     case LOAN_ACTIONS.FETCH_LOAN_SUCCESS:
       return { ...state, currentLoan: action.payload, isLoading: false, error: null };
     case LOAN_ACTIONS.CREATE_LOAN_SUCCESS:
-      return { ...state, loans: [...state.loans, action.payload], isLoading: false };
+      return { ...state, ...splitLoans([...state.loans, action.payload]), isLoading: false };
     case LOAN_ACTIONS.UPDATE_LOAN_SUCCESS:
       return {
         ...state,
-        loans: state.loans.map(l => (l.id === action.payload.id ? action.payload : l)),
+        ...splitLoans(state.loans.map(l => (l.id === action.payload.id ? { ...l, ...action.payload } : l))),
         currentLoan: state.currentLoan?.id === action.payload.id ? action.payload : state.currentLoan,
         isLoading: false
       };
     case LOAN_ACTIONS.DELETE_LOAN_SUCCESS:
       return {
         ...state,
-        loans: state.loans.filter(l => l.id !== action.payload),
+        ...splitLoans(state.loans.filter(l => l.id !== action.payload)),
         currentLoan: state.currentLoan?.id === action.payload ? null : state.currentLoan,
         isLoading: false
       };
@@ -77,21 +88,29 @@ const LoanContext = createContext();
 // Provider
 export const LoanProvider = ({ children }) => {
   const [state, dispatch] = useReducer(loanReducer, initialState);
-  const { isAuthenticated } = useAuth();
+  const { isAuthenticated, user } = useAuth();
+  const userId = user?.id;
 
-  // Récupérer tous les emprunts
+  // Récupérer les emprunts de l'utilisateur connecté
   const fetchLoans = useCallback(async () => {
+    if (!userId) return;
     dispatch({ type: LOAN_ACTIONS.SET_LOADING, payload: true });
     try {
-      const { data } = await fetchAllLoans();
-      dispatch({ type: LOAN_ACTIONS.FETCH_LOANS_SUCCESS, payload: data.loans || data });
+      // filtrés côté serveur et suivis jusqu'à la dernière page ; titre et
+      // auteur intégrés à chaque prêt (LoansPage), sans liste des ebooks
+      const params = { include: 'ebook', 'fields[ebook]': 'id,title,author' };
+      const [active, returned] = await Promise.all([
+        getAllUserLoans(userId, { ...params, status: 'active' }),
+        getAllUserLoans(userId, { ...params, status: 'returned', sort: '-loan_date' })
+      ]);
+      dispatch({ type: LOAN_ACTIONS.FETCH_LOANS_SUCCESS, payload: [...active, ...returned] });
     } catch (error) {
       dispatch({
         type: LOAN_ACTIONS.SET_ERROR,
         payload: error.response?.data?.msg || 'Erreur lors du chargement des emprunts'
       });
     }
-  }, []);
+  }, [userId]);
 
   // Récupérer un emprunt spécifique
   const fetchLoan = useCallback(async (loanId) => {
@@ -154,39 +173,39 @@ export const LoanProvider = ({ children }) => {
     dispatch({ type: LOAN_ACTIONS.CLEAR_ERROR });
   }, []);
 
-  // Méthodes utilitaires
+  // Méthodes utilitaires (listes complètes : voir fetchLoans)
   const getUserActiveLoans = useCallback(
-    (userId) => state.loans.filter(l => l.user_id === userId && !l.is_returned),
-    [state.loans]
+    (id) => state.activeLoans.filter(l => l.user_id === id),
+    [state.activeLoans]
   );
 
   const getUserLoanHistory = useCallback(
-    (userId) => state.loans.filter(l => l.user_id === userId),
+    (id) => state.loans.filter(l => l.user_id === id),
     [state.loans]
   );
 
   const getOverdueLoans = useCallback(() => {
     const now = new Date();
-    return state.loans.filter(l => !l.is_returned && new Date(l.due_date) < now);
-  }, [state.loans]);
+    return state.activeLoans.filter(l => new Date(l.due_date) < now);
+  }, [state.activeLoans]);
 
   const isBookLoanedByUser = useCallback(
-    (bookId, userId) => state.loans.some(l => l.ebook_id === bookId && l.user_id === userId && !l.is_returned),
-    [state.loans]
+    (bookId, id) => state.activeLoans.some(l => l.ebook_id === bookId && l.user_id === id),
+    [state.activeLoans]
   );
 
   const calculateStats = useCallback(() => {
-    const totalLoans = state.loans.length;
-    const activeLoans = state.loans.filter(l => !l.is_returned).length;
     const now = new Date();
-    const overdueLoans = state.loans.filter(l => !l.is_returned && new Date(l.due_date) < now).length;
-    const returnedLoans = state.loans.filter(l => l.is_returned).length;
-
     dispatch({
       type: LOAN_ACTIONS.SET_STATS,
-      payload: { totalLoans, activeLoans, overdueLoans, returnedLoans }
+      payload: {
+        totalLoans: state.loans.length,
+        activeLoans: state.activeLoans.length,
+        overdueLoans: state.activeLoans.filter(l => new Date(l.due_date) < now).length,
+        returnedLoans: state.returnedLoans.length
+      }
     });
-  }, [state.loans]);
+  }, [state.loans, state.activeLoans, state.returnedLoans]);
 
   // Charger les emprunts après login
   useEffect(() => {
@@ -24,7 +24,7 @@ import EditCategoryModal from "../components/books/EditCategoryModal";
 const AdminPage = () => {
   const navigate = useNavigate();
   const { logout } = useAuth();
-  const { books, deleteBook } = useBooks();
+  const { books, deleteBook, hasMoreBooks, isLoadingMore, loadMoreBooks } = useBooks();
   const {
     users,
     categories,
@@ -241,6 +241,17 @@ const AdminPage = () => {
                 </tbody>
               </table>
             </div>
+            {hasMoreBooks && (
+              <div className="flex justify-center mt-4">
+                <button
+                  onClick={loadMoreBooks}
+                  disabled={isLoadingMore}
+                  className="px-4 py-2 text-sm font-medium text-gray-700 bg-gray-100 hover:bg-gray-200 rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {isLoadingMore ? "Chargement..." : "Afficher plus de livres"}
+                </button>
+              </div>
+            )}
           </>
         )}
 
@@ -25,7 +25,10 @@ const BooksPage = () => {
     applyFilters,
     clearFilters,
     getFilteredBooks,
-    fetchBooks
+    fetchBooks,
+    hasMoreBooks,
+    isLoadingMore,
+    loadMoreBooks
   } = useBooks();
   const { createLoan, isBookLoanedByUser } = useLoans();
   const { success, error } = useToast();
@@ -136,7 +139,7 @@ const BooksPage = () => {
                 </button>
               </div>
 
-              <span className="text-sm text-gray-600">{filteredBooks.length} books found</span>
+              <span className="text-sm text-gray-600">{filteredBooks.length}{hasMoreBooks ? '+' : ''} books found</span>
             </div>
           </div>
 
@@ -205,6 +208,19 @@ const BooksPage = () => {
           </div>
         )}
 
+        {/* Page suivante (liste ou résultats de recherche) */}
+        {!isLoading && hasMoreBooks && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={loadMoreBooks}
+              disabled={isLoadingMore}
+              className="px-6 py-2 text-sm font-medium text-gray-700 bg-gray-100 hover:bg-gray-200 rounded-lg transition-colors disabled:opacity-50"
+            >
+              {isLoadingMore ? 'Loading...' : 'Load more books'}
+            </button>
+          </div>
+        )}
+
         {/* Modals */}
         {selectedBook && (
           <BookDetailModal